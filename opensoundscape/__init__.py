@@ -1 +1,3 @@
 __version__ = "0.4.6"
+
+from opensoundscape.precision import set_default_dtype, get_default_dtype
@@ -7,7 +7,9 @@ import soundfile
 import numpy as np
 import pandas as pd
 import warnings
-from math import ceil
+from math import ceil, gcd
+from opensoundscape.precision import resolve_dtype
+from opensoundscape.helpers import sliding_windows
 
 
 class OpsoLoadAudioInputError(Exception):
@@ -75,13 +77,25 @@ class Audio:
 
     @classmethod
     def from_file(
-        cls, path, sample_rate=None, resample_type="kaiser_fast", max_duration=None
+        cls,
+        path,
+        sample_rate=None,
+        resample_type="kaiser_fast",
+        max_duration=None,
+        offset=0,
+        duration=None,
+        dtype=None,
     ):
         """ Load audio from files
 
         Deal with the various possible input types to load an audio
         file and generate a spectrogram
 
+        To load part of a file, use `offset` and `duration`. For formats
+        supported by soundfile (e.g. WAV and FLAC) only the requested frames
+        are read from disk; other formats (e.g. MP3) are decoded up to the
+        end of the requested segment.
+
         Args:
             path (str, Path): path to an audio file
             sample_rate (int, None): resample audio with value and resample_type,
@@ -89,6 +103,11 @@ class Audio:
             resample_type: method used to resample_type (default: kaiser_fast)
             max_duration: the maximum length of an input file,
                 None is no maximum (default: None)
+            offset: start reading this many seconds into the file (default: 0)
+            duration: only load this many seconds of audio,
+                None loads to the end of the file (default: None)
+            dtype: floating point dtype of the samples, None uses
+                opensoundscape.get_default_dtype() (default: None)
 
         Returns:
             Audio: attributes samples and sample_rate
@@ -100,7 +119,13 @@ class Audio:
 
         warnings.filterwarnings("ignore")
         samples, sr = librosa.load(
-            path, sr=sample_rate, res_type=resample_type, mono=True
+            path,
+            sr=sample_rate,
+            res_type=resample_type,
+            mono=True,
+            offset=offset,
+            duration=duration,
+            dtype=resolve_dtype(dtype),
         )
         warnings.resetwarnings()
 
@@ -108,7 +133,12 @@ class Audio:
 
     @classmethod
     def from_bytesio(
-        cls, bytesio, sample_rate=None, max_duration=None, resample_type="kaiser_fast"
+        cls,
+        bytesio,
+        sample_rate=None,
+        max_duration=None,
+        resample_type="kaiser_fast",
+        dtype=None,
     ):
         """ Read from bytesio object
 
@@ -123,17 +153,117 @@ class Audio:
             sample_rate: The final sampling rate of Audio object [default: None]
             max_duration: The maximum duration of the audio file [default: None]
             resample_type: The librosa method to do resampling [default: "kaiser_fast"]
+            dtype: floating point dtype of the samples, None uses
+                opensoundscape.get_default_dtype() [default: None]
 
         Returns:
             An initialized Audio object
         """
-        samples, sr = soundfile.read(bytesio)
+        dtype = resolve_dtype(dtype)
+        samples, sr = soundfile.read(bytesio, dtype=dtype.name)
         if sample_rate:
             samples = librosa.resample(samples, sr, sample_rate, res_type=resample_type)
+            samples = samples.astype(dtype, copy=False)
             sr = sample_rate
 
         return cls(samples, sr, resample_type=resample_type, max_duration=max_duration)
 
+    @classmethod
+    def stream(
+        cls,
+        path,
+        chunk_duration,
+        chunk_overlap=0,
+        sample_rate=None,
+        resample_type="kaiser_fast",
+        dtype=None,
+    ):
+        """ Stream an audio file in fixed-length chunks
+
+        Read an audio file one block at a time rather than decoding the whole
+        file into memory. Peak memory depends only on `chunk_duration`, so
+        this can be used on recordings that are many hours or days long.
+
+        When resampling, each block is read with some extra context on both
+        sides which is discarded after resampling, so that chunk boundaries
+        do not introduce filter edge artifacts.
+
+        Args:
+            path (str, Path): path to an audio file readable by soundfile
+            chunk_duration: The duration in seconds of each chunk
+            chunk_overlap: The overlap in seconds of consecutive chunks [default: 0]
+            sample_rate (int, None): resample audio with value and resample_type,
+                if None use source sample_rate (default: None)
+            resample_type: method used to resample_type (default: kaiser_fast)
+            dtype: floating point dtype of the samples, None uses
+                opensoundscape.get_default_dtype() (default: None)
+
+        Yields:
+            dictionaries with keys: ["clip", "clip_duration", "begin_time", "end_time"]
+            where begin_time and end_time are offsets in seconds from the
+            start of the file. The final chunk contains the remainder of the
+            file and may be shorter than chunk_duration.
+        """
+        if chunk_overlap >= chunk_duration:
+            raise ValueError("chunk_overlap must be less than chunk_duration")
+        dtype = resolve_dtype(dtype)
+
+        try:
+            sf = soundfile.SoundFile(str(path))
+        except RuntimeError as e:
+            raise OpsoLoadAudioInputError(f"Unable to stream {path}: {e}")
+
+        with sf:
+            native_sr = sf.samplerate
+            total_frames = sf.frames
+            out_sr = sample_rate if sample_rate else native_sr
+            ratio = out_sr / native_sr
+
+            chunk_frames = int(round(chunk_duration * native_sr))
+            hop_frames = chunk_frames - int(round(chunk_overlap * native_sr))
+
+            # context (in native samples) read on each side of a block so that
+            # the resampling filter has real signal rather than an edge.
+            # Blocks are read starting on multiples of `step` native samples,
+            # which map onto whole output samples, so that every block is
+            # resampled on the same sample grid as the whole file would be
+            step = native_sr // gcd(native_sr, out_sr)
+            padding = 0 if out_sr == native_sr else ceil(1024 / step) * step
+
+            start = 0
+            while start < total_frames:
+                end = min(start + chunk_frames, total_frames)
+                read_start = max(0, (start - padding) // step * step)
+                read_end = min(total_frames, end + padding)
+
+                sf.seek(read_start)
+                samples = sf.read(read_end - read_start, dtype=dtype.name)
+                if samples.ndim > 1:
+                    samples = samples.mean(axis=1)
+
+                if out_sr != native_sr:
+                    samples = librosa.resample(
+                        samples,
+                        orig_sr=native_sr,
+                        target_sr=out_sr,
+                        res_type=resample_type,
+                    ).astype(dtype, copy=False)
+                    out_start = int(round((start - read_start) * ratio))
+                    out_length = int(round(end * ratio)) - int(round(start * ratio))
+                    samples = samples[out_start : out_start + out_length]
+
+                clip = cls(samples, out_sr, resample_type=resample_type)
+                yield {
+                    "clip": clip,
+                    "clip_duration": clip.duration(),
+                    "begin_time": start / native_sr,
+                    "end_time": end / native_sr,
+                }
+
+                if end == total_frames:
+                    break
+                start += hop_frames
+
     def __repr__(self):
         return f"<Audio(samples={self.samples.shape}, sample_rate={self.sample_rate})>"
 
@@ -339,6 +469,85 @@ class Audio:
 
         return to_return
 
+    def split_samples(self, clip_duration, clip_overlap=0, final_clip=None):
+        """ Split Audio into a 2-d array of equal-length clips
+
+        A vectorized alternative to `split`: rather than one Audio object per
+        clip, returns a single array with one row per clip. When no padding is
+        needed the array is a read-only strided view of `self.samples`, so no
+        samples are copied regardless of the overlap.
+
+        Arguments:
+            clip_duration:  The duration in seconds of the clips
+            clip_overlap:   The overlap of the clips in seconds [default: 0]
+            final_clip:     Possible options (any other input will ignore the final clip entirely),
+                                - "full":               Increase the overlap to yield a clip with clip_duration
+                                - "extend":             Extend the remainder of the Audio to clip_duration by looping it
+                            ("remainder" is not supported because all clips have the same length)
+        Results:
+            clips: array of shape (n_clips, clip_samples)
+            times: array of shape (n_clips, 2) with the begin and end time of each clip
+        """
+        if final_clip == "remainder":
+            raise ValueError(
+                "final_clip='remainder' yields clips of different lengths, use split() instead"
+            )
+
+        duration = self.duration()
+        clip_samples = round(clip_duration * self.sample_rate)
+
+        if clip_duration > duration:
+            if final_clip in ["full", "extend"]:
+                clips = self.extend(clip_duration).samples[np.newaxis, :]
+                return clips, np.array([[0, duration]])
+            warnings.warn(
+                f"Given Audio object with duration of `{duration}` seconds and `clip_duration={clip_duration}` but `final_clip={final_clip}` produces no clips. Returning empty array."
+            )
+            return (
+                np.empty((0, clip_samples), dtype=self.samples.dtype),
+                np.empty((0, 2)),
+            )
+
+        # begin and end times are computed as in split()
+        num_clips = ceil((duration - clip_overlap) / (clip_duration - clip_overlap))
+        idx = np.arange(num_clips, dtype=float)
+        begin_times = clip_duration * idx - clip_overlap * idx
+        end_times = begin_times + clip_duration
+        samples = self.samples
+
+        if end_times[-1] > duration:
+            if final_clip == "full":
+                # the final clip_samples samples (unlike split(), which starts
+                # the final clip at a whole second and makes it longer)
+                begin_times[-1] = duration - clip_duration
+                end_times[-1] = duration
+            elif final_clip == "extend":
+                # pad only the samples after the final clip, by looping it
+                end_times[-1] = duration
+                final_samples = samples[self.time_to_sample(begin_times[-1]) :]
+                padding = np.resize(final_samples, clip_samples)[len(final_samples) :]
+                samples = np.concatenate([samples, padding])
+            else:
+                begin_times = begin_times[:-1]
+                end_times = end_times[:-1]
+
+        # never index past the last full window (possible due to rounding)
+        begin_samples = np.minimum(
+            (begin_times * self.sample_rate).astype(int), len(samples) - clip_samples
+        )
+        windows = sliding_windows(samples, clip_samples)
+
+        # evenly spaced clips can be taken as a strided view without copying
+        hop_samples = begin_samples[1] if len(begin_samples) > 1 else 1
+        if hop_samples > 0 and np.array_equal(
+            begin_samples, np.arange(len(begin_samples)) * hop_samples
+        ):
+            clips = windows[::hop_samples][: len(begin_samples)]
+        else:
+            clips = windows[begin_samples]
+
+        return clips, np.stack([begin_times, end_times], axis=1)
+
 
 def split_and_save(
     audio,
@@ -348,8 +557,9 @@ def split_and_save(
     clip_overlap=0,
     final_clip=None,
     dry_run=False,
+    clip_store=None,
 ):
-    """ Split audio into clips and save them to a folder
+    """ Split audio into clips and save them to a folder or a clip store
 
     Arguments:
         audio:          The input Audio to split
@@ -363,22 +573,32 @@ def split_and_save(
                             - "full":               Increase the overlap to yield a clip with clip_duration
                             - "extend":             Similar to remainder but extend the clip to clip_duration
         dry_run:        If True, skip writing audio and just return clip DataFrame [default: False]
+        clip_store:     A ClipStore to write the clips to as a shard named `prefix`, instead
+                            of writing WAV files to `destination` [default: None]
     
     Returns:
-        pandas.DataFrame containing begin and end times for each clip from the source audio
+        pandas.DataFrame containing begin and end times for each clip from the source audio,
+        and the clip id of each clip if clip_store was given
     """
 
     clips = audio.split(
         clip_duration=clip_duration, clip_overlap=clip_overlap, final_clip=final_clip
     )
-    for clip in clips:
-        clip_name = (
-            f"{destination}/{prefix}_{clip['begin_time']}s_{clip['end_time']}s.wav"
-        )
+    if clip_store is not None:
         if not dry_run:
-            clip["clip"].save(clip_name)
+            clip_ids = clip_store.write(prefix, clips).index.values
+    else:
+        for clip in clips:
+            clip_name = (
+                f"{destination}/{prefix}_{clip['begin_time']}s_{clip['end_time']}s.wav"
+            )
+            if not dry_run:
+                clip["clip"].save(clip_name)
 
     # Convert [{k: v}] -> {k: [v]}
-    return pd.DataFrame(
+    clip_df = pd.DataFrame(
         {key: [clip[key] for clip in clips] for key in clips[0].keys() if key != "clip"}
     )
+    if clip_store is not None and not dry_run:
+        clip_df["clip_id"] = clip_ids
+    return clip_df
@@ -4,6 +4,7 @@ from librosa import load
 import numpy as np
 from scipy.signal import butter, sosfiltfilt
 from opensoundscape.commands import run_command
+from opensoundscape.precision import resolve_dtype
 
 
 def butter_bandpass(low_f, high_f, sample_rate, order=9):
@@ -25,7 +26,7 @@ def butter_bandpass(low_f, high_f, sample_rate, order=9):
     return sos
 
 
-def bandpass_filter(signal, low_f, high_f, sample_rate, order=9):
+def bandpass_filter(signal, low_f, high_f, sample_rate, order=9, dtype=None):
     """perform a butterworth bandpass filter on a discrete time signal
     using scipy.signal's butter and solfiltfilt (phase-preserving version of sosfilt)
     
@@ -35,12 +36,14 @@ def bandpass_filter(signal, low_f, high_f, sample_rate, order=9):
         high_f: -3db point (?) for highpass filter (Hz)
         sample_rate: samples per second (Hz)
         order=9: higher values -> steeper dropoff
+        dtype=None: floating point dtype of the output, None uses
+            opensoundscape.get_default_dtype()
     
     Returns: 
         filtered time signal 
     """
     sos = butter_bandpass(low_f, high_f, sample_rate, order=order)
-    return sosfiltfilt(sos, signal)
+    return sosfiltfilt(sos, signal).astype(resolve_dtype(dtype), copy=False)
 
 
 def clipping_detector(samples, threshold=0.6):
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+""" clip_store.py: Packed storage for many short audio clips
+
+Writing every clip as its own WAV file means that splitting and training
+on large datasets performs millions of small-file operations, which is slow
+on network filesystems. A ClipStore instead packs the samples of many clips
+into a few large binary shards, and describes them with one index CSV per
+shard. The index contains the clip's id, the source file, its begin and end
+times, and the offset and length of its samples in the shard.
+
+Shards are read with np.memmap, so clips stored as float32 are returned as
+views into the shard without copying. Clips stored as int16 take half the
+space, and are converted to float32 when read.
+
+The samples of each version of a shard are written to a new data file
+(`<shard>.<version>.bin`) that its index refers to. Replacing the index is
+then the single step that commits a rewritten shard: readers see either
+the old index and data or the new ones, never a mix.
+"""
+
+import os
+import tempfile
+import uuid
+from hashlib import md5
+from pathlib import Path
+import numpy as np
+import pandas as pd
+
+from opensoundscape.audio import Audio
+
+INDEX_COLUMNS = [
+    "clip_id",
+    "shard",
+    "source",
+    "begin_time",
+    "end_time",
+    "data_file",
+    "offset",
+    "length",
+    "sample_rate",
+    "dtype",
+    "labels",
+]
+INT16_SCALE = 32767
+
+
+class ClipStore:
+    """ A directory of packed audio clips
+
+    Each shard consists of two files in the directory: `<shard>.index.csv`
+    describing its clips, and the data file `<shard>.<version>.bin` with
+    their samples that the index refers to.
+
+    Args:
+        directory: directory containing the shards (created if needed)
+        dtype: dtype of samples in new shards, "float32" or "int16"
+            [default: "float32"]
+    """
+
+    def __init__(self, directory, dtype="float32"):
+        self.directory = Path(directory)
+        self.dtype = np.dtype(dtype)
+        if self.dtype not in (np.float32, np.int16):
+            raise ValueError(f"dtype should be float32 or int16. Got {self.dtype.name}")
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._index = None
+        self._clips = None
+        self._shards = {}
+
+    @property
+    def index(self):
+        """ DataFrame describing all clips in the store, indexed by clip_id
+        """
+        if self._index is None:
+            self._index = self._read_index()
+        return self._index
+
+    @property
+    def clips(self):
+        """ Dictionary of clip_id: (data_file, dtype, offset, length, sample_rate)
+
+        Built once from the index, so reading a clip does not search the
+        DataFrame.
+        """
+        if self._clips is None:
+            index = self.index
+            data_files = [
+                f"{shard}.bin" if pd.isna(data_file) else data_file
+                for shard, data_file in zip(index["shard"], index["data_file"])
+            ]
+            self._clips = dict(
+                zip(
+                    index.index,
+                    zip(
+                        data_files,
+                        index["dtype"],
+                        index["offset"].astype(int),
+                        index["length"].astype(int),
+                        index["sample_rate"].astype(int),
+                    ),
+                )
+            )
+        return self._clips
+
+    def _read_index(self):
+        index_paths = sorted(self.directory.glob("*.index.csv"))
+        if len(index_paths) == 0:
+            return pd.DataFrame(columns=INDEX_COLUMNS).set_index("clip_id")
+        dtypes = {"clip_id": str, "shard": str, "data_file": str, "labels": str}
+        index = pd.concat([pd.read_csv(path, dtype=dtypes) for path in index_paths])
+        # shards written before data files were versioned are <shard>.bin
+        if "data_file" not in index.columns:
+            index["data_file"] = None
+        return index.set_index("clip_id")
+
+    def __len__(self):
+        return self.index.shape[0]
+
+    def __contains__(self, clip_id):
+        return clip_id in self.clips
+
+    def write(self, shard, clips, source=None):
+        """ Write clips to a new shard, replacing any shard with the same name
+
+        Args:
+            shard: name of the shard
+            clips: iterable of dictionaries with keys "clip" (an Audio object),
+                "begin_time" and "end_time", like the output of Audio.split.
+                Optional keys are "source", "labels" and "clip_id", which
+                default to the `source` argument, no labels and an md5 hash
+                of "<source>-<begin_time>-<end_time>"
+            source: source of the clips, used when a clip has no "source" key
+                [default: None, uses the shard name]
+
+        Returns:
+            DataFrame of the index rows of the written clips, indexed by clip_id
+        """
+        source = shard if source is None else source
+        data_file = f"{shard}.{uuid.uuid4().hex[:16]}.bin"
+        rows = []
+        samples = []
+        offset = 0
+        for clip in clips:
+            clip_source = clip.get("source", source)
+            clip_id = clip.get("clip_id")
+            if clip_id is None:
+                unique_string = f"{clip_source}-{clip['begin_time']}-{clip['end_time']}"
+                clip_id = md5(unique_string.encode("utf-8")).hexdigest()
+            clip_samples = self._encode(clip["clip"].samples)
+            rows.append(
+                {
+                    "clip_id": clip_id,
+                    "shard": shard,
+                    "data_file": data_file,
+                    "source": clip_source,
+                    "begin_time": clip["begin_time"],
+                    "end_time": clip["end_time"],
+                    "offset": offset,
+                    "length": len(clip_samples),
+                    "sample_rate": clip["clip"].sample_rate,
+                    "dtype": self.dtype.name,
+                    "labels": clip.get("labels"),
+                }
+            )
+            samples.append(clip_samples)
+            offset += len(clip_samples)
+
+        # the samples are written to a new data file, and replacing the index
+        # commits the shard. The replaced data file is deleted afterwards.
+        replaced_data_files = self._data_files(shard)
+        self._atomic_write(
+            data_file,
+            lambda f: f.write(np.concatenate(samples).tobytes() if samples else b""),
+        )
+        index = pd.DataFrame(rows, columns=INDEX_COLUMNS)
+        self._atomic_write(f"{shard}.index.csv", lambda f: index.to_csv(f, index=False))
+        for replaced in replaced_data_files:
+            self._shards.pop(replaced, None)
+            try:
+                os.remove(self.directory / replaced)
+            except FileNotFoundError:
+                pass
+
+        self._index = None
+        self._clips = None
+        return index.set_index("clip_id")
+
+    def _data_files(self, shard):
+        """ Names of the data files referred to by the index of a shard
+        """
+        index_path = self.directory / f"{shard}.index.csv"
+        try:
+            index = pd.read_csv(index_path, dtype={"data_file": str})
+        except FileNotFoundError:
+            return []
+        if "data_file" not in index.columns:
+            return [f"{shard}.bin"]
+        return list(index["data_file"].dropna().unique())
+
+    def _encode(self, samples):
+        if self.dtype == np.int16:
+            return np.round(np.clip(samples, -1, 1) * INT16_SCALE).astype(np.int16)
+        return np.asarray(samples, dtype=self.dtype)
+
+    def _atomic_write(self, name, write):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb" if name.endswith(".bin") else "w") as f:
+                write(f)
+            os.replace(tmp_path, self.directory / name)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _shard(self, data_file, dtype):
+        if data_file not in self._shards:
+            self._shards[data_file] = np.memmap(
+                self.directory / data_file, dtype=dtype, mode="r"
+            )
+        return self._shards[data_file]
+
+    def _clip(self, clip_id):
+        try:
+            return self.clips[clip_id]
+        except KeyError:
+            raise KeyError(f"clip {clip_id} is not in the clip store {self.directory}")
+
+    def read(self, clip_id):
+        """ Read a clip from the store
+
+        Args:
+            clip_id: id of the clip, as in the index
+
+        Returns:
+            Audio object. For float32 shards, its samples are a read-only
+            view of the memory-mapped shard.
+        """
+        data_file, dtype, offset, length, sample_rate = self._clip(clip_id)
+        try:
+            shard = self._shard(data_file, dtype)
+        except FileNotFoundError:
+            # the shard was rewritten by another store since the index was read
+            self._index = None
+            self._clips = None
+            data_file, dtype, offset, length, sample_rate = self._clip(clip_id)
+            shard = self._shard(data_file, dtype)
+        samples = shard[offset : offset + length]
+        if samples.dtype == np.int16:
+            samples = samples.astype(np.float32) / INT16_SCALE
+        return Audio(samples, sample_rate)
+
+    def duration(self, clip_id):
+        """ Get the duration of a clip in seconds without reading it
+
+        Args:
+            clip_id: id of the clip, as in the index
+
+        Returns:
+            duration in seconds
+        """
+        _, _, _, length, sample_rate = self._clip(clip_id)
+        return length / sample_rate
+
+    def __getstate__(self):
+        # memory maps are reopened in each process (e.g. DataLoader workers)
+        state = self.__dict__.copy()
+        state["_shards"] = {}
+        return state
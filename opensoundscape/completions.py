@@ -13,6 +13,7 @@ COMPLETIONS = """all_commands=(
   split_audio
   predict_from_directory
   split_and_save
+  ribbit
 )
 
 split_audio_options=(
@@ -29,10 +30,18 @@ split_audio_options=(
 predict_from_directory_options=(
   -i
   --input_directory
+  -m
+  --manifest
   -d
   --state_dict
+  -e
+  --exported_model
   -c
   --config
+  -k
+  --shard
+  -n
+  --num_shards
 )
 
 split_and_save_options=(
@@ -46,6 +55,17 @@ split_and_save_options=(
   --config
 )
 
+ribbit_options=(
+  -i
+  --input_directory
+  -t
+  --species_table
+  -r
+  --results
+  -c
+  --config
+)
+
 commands_accepting_dir=(
   raven_annotation_check
   raven_lowercase_annotations
@@ -66,6 +86,14 @@ commands_accepting_file_or_dir=(
   --audio_file
   -d
   --state_dict
+  -t
+  --species_table
+  -r
+  --results
+  -m
+  --manifest
+  -e
+  --exported_model
 )
 
 _opensoundscape_complete() {
@@ -87,6 +115,8 @@ _opensoundscape_complete() {
     COMPREPLY=( $(compgen -W "$(echo ${predict_from_directory_options[@]})" -- ${cur_word} ) )
   elif [[ ${subcommand} == "split_and_save" ]]; then
     COMPREPLY=( $(compgen -W "$(echo ${split_audio_options[@]})" -- ${cur_word} ) )
+  elif [[ ${subcommand} == "ribbit" ]]; then
+    COMPREPLY=( $(compgen -W "$(echo ${ribbit_options[@]})" -- ${cur_word} ) )
   fi
 
   return 0
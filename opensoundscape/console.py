@@ -18,7 +18,9 @@ from opensoundscape.config import validate_file, get_default_config, DEFAULT_CON
 import opensoundscape.console_checks as checks
 import opensoundscape.datasets as datasets
 from opensoundscape.audio import split_and_save, Audio
-from tempfile import TemporaryDirectory
+from opensoundscape.ribbit import ribbit_batch
+from opensoundscape.torch.predict import predict_parallel, shard
+from opensoundscape.torch.export import load_exported_model
 import pandas as pd
 
 
@@ -32,8 +34,9 @@ Usage:
     opensoundscape raven_generate_class_corrections <directory> <output.csv>
     opensoundscape raven_query_annotations <directory> <class>
     opensoundscape split_audio (-i <directory>) (-o <directory>) (-s <segments.csv>) [-c <opensoundscape.yaml>]
-    opensoundscape predict_from_directory (-i <directory>) (-d <state_dict.pth>) [-c <opensoundscape.yaml>]
+    opensoundscape predict_from_directory (-i <directory> | -m <manifest.txt>) (-d <state_dict.pth> | -e <model.pt>) [-c <opensoundscape.yaml>] [-k <shard> -n <num_shards>]
     opensoundscape split_and_save (-a <audio.wav>) (-o <directory>) (-s <segments.csv) [-c <opensoundscape.yaml>]
+    opensoundscape ribbit (-i <directory>) (-t <species.csv>) (-r <results.csv>) [-c <opensoundscape.yaml>]
 
 Options:
     -h --help                           Print this screen and exit
@@ -44,7 +47,13 @@ Options:
     -c --config <opensoundscape.yaml>   The opensoundscape.yaml config file
     -d --state_dict <state_dict.pth>    A PyTorch state dictionary for ResNet18
                                             e.g. `torch.save(model.state_dict(), "state_dict.pth")`
+    -e --exported_model <model.pt>      A model exported to TorchScript or ONNX (.onnx) with torch.export.export_model
     -a --audio_file <audio.wav>         An audio file
+    -t --species_table <species.csv>    A CSV file describing species by their pulsed calls
+    -r --results <results.csv>          Write results to (or resume from) this file
+    -m --manifest <manifest.txt>        A text file listing one audio file per line
+    -k --shard <shard>                  Only process this shard of the files, from 1 to <num_shards>
+    -n --num_shards <num_shards>        The number of shards the files are split into, e.g. one per node
 
 Positional Arguments:
     <directory>                         A path to a directory
@@ -58,7 +67,8 @@ Descriptions:
     raven_generate_class_corrections    Given a directory of Raven annotation files, generate a CSV file to check classes and correct any issues
     raven_query_annotations             Given a directory of Raven annotation files, search for rows matching a specific class
     split_audio                         Given a directory of WAV files, generate splits of the audio
-    predict_from_directory              Given a directory of WAV files, run a PyTorch model prediction on 5 second segments
+    predict_from_directory              Given a directory (or manifest) of WAV files, run a PyTorch model prediction on 5 second segments
+    ribbit                              Given a directory of WAV files, score each species in a species table with RIBBIT
 """
 
 
@@ -139,48 +149,40 @@ def entrypoint():
         if args["--config"]:
             config = validate_file(args["--config"])
 
-        input_p = checks.directory_exists(args, "--input_directory")
-
-        wavs = chain(
-            input_p.rglob("**/*.WAV"),
-            input_p.rglob("**/*.wav"),
-            input_p.rglob("**/*.mp3"),
-            input_p.rglob("**/*.MP3"),
-        )
-
-        with TemporaryDirectory() as segments_dir:
-            dataset = datasets.SplitterDataset(
-                wavs,
-                overlap=config["audio"]["overlap"],
-                duration=config["audio"]["duration"],
-                output_directory=segments_dir,
-            )
-
-            dataloader = DataLoader(
-                dataset,
-                batch_size=config["runtime"]["batch_size"],
-                shuffle=False,
-                num_workers=config["runtime"]["cores_per_node"],
-                collate_fn=datasets.SplitterDataset.collate_fn,
+        if args["--manifest"]:
+            with open(args["--manifest"]) as f:
+                wavs = [line.strip() for line in f if line.strip()]
+        else:
+            input_p = checks.directory_exists(args, "--input_directory")
+            # sorted, so every node sees the files in the same order
+            wavs = sorted(
+                chain(
+                    input_p.rglob("**/*.WAV"),
+                    input_p.rglob("**/*.wav"),
+                    input_p.rglob("**/*.mp3"),
+                    input_p.rglob("**/*.MP3"),
+                )
             )
 
-            segments_csv = f"{segments_dir}/segments.csv"
-            with open(segments_csv, "w") as f:
-                f.write("Source,Begin (s),End (s),Destination\n")
-                for idx, data in enumerate(dataloader):
-                    for output in data:
-                        f.write(f"{output}\n")
-
-            input_df = pd.read_csv(segments_csv)
-            dataset = datasets.SingleTargetAudioDataset(input_df)
-
-            dataloader = DataLoader(
-                dataset,
-                batch_size=config["runtime"]["batch_size"],
-                shuffle=False,
-                num_workers=config["runtime"]["cores_per_node"],
-            )
+        if args["--num_shards"]:
+            num_shards = checks.positive_integer(args, "--num_shards")
+            shard_number = checks.positive_integer(args, "--shard")
+            if shard_number > num_shards:
+                exit(
+                    f"Error: `--shard` should be at most `--num_shards` ({num_shards}), got `{shard_number}`"
+                )
+            wavs = shard(wavs, shard_number - 1, num_shards)
 
+        image_shape = {}
+        if args["--exported_model"]:
+            # exported models are loaded by each prediction process
+            model = args["--exported_model"]
+            try:
+                _, metadata = load_exported_model(model)
+            except:
+                exit(f"I was unable to load the exported model from `{model}`")
+            image_shape = {"height": metadata["height"], "width": metadata["width"]}
+        else:
             try:
                 model = resnet18(pretrained=False)
                 model.fc = nn.Linear(in_features=model.fc.in_features, out_features=2)
@@ -190,18 +192,21 @@ def entrypoint():
                     f"I was unable to load the state dictionary from `{args['--state_dict']}`"
                 )
 
-            model.eval()
-            with torch.no_grad():
-                for idx, data in enumerate(dataloader):
-                    X = data["X"]
-                    outputs = model(X)
-                    predictions = outputs.clone().detach().argmax(dim=1)
-                    start = config["runtime"]["batch_size"] * idx
-                    end = start + config["runtime"]["batch_size"]
-                    for fname, pred in zip(
-                        input_df["Destination"][start:end], predictions
-                    ):
-                        print(f"{fname},{pred}")
+        predictions = predict_parallel(
+            model,
+            wavs,
+            num_processes=config["runtime"]["cores_per_node"],
+            batch_size=config["runtime"]["batch_size"],
+            clip_duration=config["split_and_save"]["clip_duration"],
+            clip_overlap=config["split_and_save"]["clip_overlap"],
+            final_clip=config["split_and_save"]["final_clip"],
+            audio_sample_rate=config["audio"]["sample_rate"],
+            **image_shape,
+        )
+        for (source, begin_time, end_time), prediction in zip(
+            predictions.index, predictions.values.argmax(axis=1)
+        ):
+            print(f"{source},{begin_time},{end_time},{prediction}")
 
     elif args["split_and_save"]:
         config = get_default_config()
@@ -216,6 +221,22 @@ def entrypoint():
 
         clip_df.to_csv(args["--segments"], index=None)
 
+    elif args["ribbit"]:
+        config = get_default_config()
+        if args["--config"]:
+            config = validate_file(args["--config"])
+
+        input_p = checks.directory_exists(args, "--input_directory")
+        species_df = pd.read_csv(args["--species_table"])
+
+        ribbit_batch(
+            input_p,
+            species_df,
+            args["--results"],
+            num_workers=config["runtime"]["cores_per_node"],
+            audio_kwargs=config["audio"],
+        )
+
     else:
         raise NotImplementedError(
             "The requested command is not implemented. Please submit an issue."
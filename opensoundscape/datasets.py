@@ -6,13 +6,20 @@ from hashlib import md5
 from sys import stderr
 from pathlib import Path
 from itertools import chain
+import librosa
 import torch
 from torchvision import transforms
 from PIL import Image, ImageFilter
 from time import time
+from multiprocessing.context import get_spawning_popen
 
 from opensoundscape.audio import Audio
-from opensoundscape.spectrogram import Spectrogram
+from opensoundscape.spectrogram import Spectrogram, SpectrogramBatch
+from opensoundscape.feature_cache import FeatureCache
+from opensoundscape.clip_store import ClipStore
+from opensoundscape.overlay_pool import OverlayPool
+from opensoundscape.precision import get_default_dtype
+from opensoundscape.helpers import PackedStrings
 
 
 def get_md5_digest(input_string):
@@ -46,6 +53,93 @@ def annotations_with_overlaps_with_clip(df, begin, end):
     ]
 
 
+def annotation_overlaps_with_clips(df, begins, ends):
+    """ Determine which rows overlap with each of many segments
+
+    Gives the same rows as calling annotations_with_overlaps_with_clip for
+    each segment, but sorts the annotations by begin and end time once and
+    finds the overlaps of every segment with a binary search, rather than
+    scanning all annotations for each segment
+
+    Inputs:
+        df:     A dataframe containing a Raven annotation file
+        begins: The begin times of the segments (unit: seconds)
+        ends:   The end times of the segments (unit: seconds)
+
+    Output:
+        overlaps: A list with an array for each segment of the positions (as
+                  used by `df.iloc`) of the annotations which overlap with it,
+                  in the order of the rows of df
+    """
+    annotation_begins = df["begin time (s)"].values
+    annotation_ends = df["end time (s)"].values
+    begin_order = np.argsort(annotation_begins, kind="stable")
+    end_order = np.argsort(annotation_ends, kind="stable")
+    begins = np.asarray(begins, dtype=float)
+    ends = np.asarray(ends, dtype=float)
+
+    # annotations which begin in [begin, end)
+    sorted_begins = annotation_begins[begin_order]
+    begin_first = np.searchsorted(sorted_begins, begins, side="left")
+    begin_last = np.searchsorted(sorted_begins, ends, side="left")
+
+    # annotations which end in (begin, end]
+    sorted_ends = annotation_ends[end_order]
+    end_first = np.searchsorted(sorted_ends, begins, side="right")
+    end_last = np.searchsorted(sorted_ends, ends, side="right")
+
+    return [
+        np.union1d(begin_order[b_first:b_last], end_order[e_first:e_last])
+        for b_first, b_last, e_first, e_last in zip(
+            begin_first, begin_last, end_first, end_last
+        )
+    ]
+
+
+def gaussian_blur(tensor, radius, passes=3):
+    """ Blur a tensor like PIL's ImageFilter.GaussianBlur
+
+    PIL approximates a Gaussian blur with `passes` box blurs of a fractional
+    radius in each direction, extending the edge pixels. The same box blurs
+    are applied here as convolutions, without rounding to integers.
+
+    Inputs:
+        tensor: tensor of shape (C, H, W)
+        radius: standard deviation of the Gaussian, in pixels
+        passes: number of box blurs [default: 3]
+
+    Outputs:
+        the blurred tensor
+    """
+    # fractional box radius with the variance of the Gaussian (as in PIL)
+    sigma2 = radius * radius / passes
+    box_l = np.floor((np.sqrt(12 * sigma2 + 1) - 1) / 2)
+    box_a = (2 * box_l + 1) * (box_l * (box_l + 1) - 3 * sigma2)
+    box_a /= 6 * (sigma2 - (box_l + 1) ** 2)
+    if box_l == 0 and box_a == 0:
+        return tensor
+
+    # box of 2 * box_l + 1 full pixels plus a fraction of one pixel on each side
+    box_l = int(box_l)
+    box = np.ones(2 * box_l + 3, dtype=np.float32)
+    box[[0, -1]] = box_a
+    box /= box.sum()
+    box = torch.from_numpy(box).to(tensor.device, tensor.dtype)
+
+    blurred = tensor[:, None]
+    for _ in range(passes):
+        blurred = torch.nn.functional.pad(
+            blurred, (0, 0, box_l + 1, box_l + 1), mode="replicate"
+        )
+        blurred = torch.nn.functional.conv2d(blurred, box.view(1, 1, -1, 1))
+    for _ in range(passes):
+        blurred = torch.nn.functional.pad(
+            blurred, (box_l + 1, box_l + 1, 0, 0), mode="replicate"
+        )
+        blurred = torch.nn.functional.conv2d(blurred, box.view(1, 1, 1, -1))
+    return blurred[:, 0]
+
+
 class SplitterDataset(torch.utils.data.Dataset):
     """ A PyTorch Dataset for splitting a WAV files
 
@@ -59,9 +153,12 @@ class SplitterDataset(torch.utils.data.Dataset):
         include_last_segment:   Do you want to include the last segment? (default: False)
         column_separator:       What character should we use to separate columns (default: "\t")
         species_separator:      What character should we use to separate species (default: "|")
+        clip_store:             A ClipStore to write segments to instead of WAV files in
+                                `output_directory`, one shard per WAV file (default: None)
 
     Effects:
-        - Segments will be written to the `output_directory`
+        - Segments will be written to the `output_directory`, or to `clip_store`
+          with the segment's clip id as destination
 
     Outputs:
         output: A list of CSV rows (separated by `column_separator`) containing
@@ -81,6 +178,7 @@ class SplitterDataset(torch.utils.data.Dataset):
         include_last_segment=False,
         column_separator="\t",
         species_separator="|",
+        clip_store=None,
     ):
         self.wavs = list(wavs)
 
@@ -88,6 +186,10 @@ class SplitterDataset(torch.utils.data.Dataset):
         self.label_corrections = label_corrections
         if self.label_corrections:
             self.labels_df = pd.read_csv(label_corrections)
+            first_corrections = self.labels_df.drop_duplicates(subset="raw")
+            self.corrections = dict(
+                zip(first_corrections["raw"], first_corrections["corrected"])
+            )
 
         self.overlap = overlap
         self.duration = duration
@@ -95,6 +197,7 @@ class SplitterDataset(torch.utils.data.Dataset):
         self.include_last_segment = include_last_segment
         self.column_separator = column_separator
         self.species_separator = species_separator
+        self.clip_store = clip_store
 
     def __len__(self):
         return len(self.wavs)
@@ -122,17 +225,18 @@ class SplitterDataset(torch.utils.data.Dataset):
 
         if self.label_corrections:
             annotation_df["class"] = annotation_df["class"].fillna("unknown")
-            annotation_df["class"] = annotation_df["class"].apply(
-                lambda cls: self.labels_df[self.labels_df["raw"] == cls][
-                    "corrected"
-                ].values[0]
-            )
+            uncorrected = ~annotation_df["class"].isin(self.corrections.keys())
+            if uncorrected.any():
+                raise ValueError(
+                    f"Classes {list(annotation_df['class'][uncorrected].unique())} in {annotation_file} are not in the label corrections {self.label_corrections}"
+                )
+            annotation_df["class"] = annotation_df["class"].map(self.corrections)
 
         num_segments = ceil(
             (wav_duration - self.overlap) / (self.duration - self.overlap)
         )
 
-        outputs = []
+        segments = []
         for idx in range(num_segments):
             if idx == num_segments - 1:
                 if self.include_last_segment:
@@ -143,70 +247,100 @@ class SplitterDataset(torch.utils.data.Dataset):
             else:
                 begin = self.duration * idx - self.overlap * idx
                 end = begin + self.duration
+            segments.append((idx, begin, end))
 
-            if self.annotations:
-                overlaps = annotations_with_overlaps_with_clip(
-                    annotation_df, begin, end
-                )
+        if self.annotations:
+            classes = annotation_df["class"].values
+            segment_overlaps = annotation_overlaps_with_clips(
+                annotation_df,
+                [begin for _, begin, _ in segments],
+                [end for _, _, end in segments],
+            )
+
+        outputs = []
+        clips_to_store = []
+        for segment_idx, (idx, begin, end) in enumerate(segments):
 
             unique_string = f"{wav}-{begin}-{end}"
-            destination = f"{self.output_directory}/{get_md5_digest(unique_string)}"
+            if self.clip_store is None:
+                destination = (
+                    f"{self.output_directory}/{get_md5_digest(unique_string)}.wav"
+                )
+            else:
+                destination = get_md5_digest(unique_string)
+
+            segment_sample_begin = audio_obj.time_to_sample(begin)
+            segment_sample_end = audio_obj.time_to_sample(end)
+            segment_begin_time = wav_times[segment_sample_begin]
+            if idx == num_segments - 1:
+                segment_end_time = wav_times[-1]
+            else:
+                segment_end_time = wav_times[segment_sample_end]
 
             if self.annotations:
-                if overlaps.shape[0] > 0:
-                    segment_sample_begin = audio_obj.time_to_sample(begin)
-                    segment_sample_end = audio_obj.time_to_sample(end)
-                    audio_to_write = audio_obj.trim(begin, end)
-                    audio_to_write.save(f"{destination}.wav")
-
-                    if idx == num_segments - 1:
-                        to_append = [
-                            wav,
-                            annotation_file,
-                            wav_times[segment_sample_begin],
-                            wav_times[-1],
-                            f"{destination}.wav",
-                        ]
-                    else:
-                        to_append = [
-                            wav,
-                            annotation_file,
-                            wav_times[segment_sample_begin],
-                            wav_times[segment_sample_end],
-                            f"{destination}.wav",
-                        ]
-                    to_append.append(
-                        self.species_separator.join(overlaps["class"].unique())
+                overlaps = segment_overlaps[segment_idx]
+                if len(overlaps) > 0:
+                    labels = self.species_separator.join(pd.unique(classes[overlaps]))
+                    self._write_segment(
+                        audio_obj.trim(begin, end),
+                        destination,
+                        segment_begin_time,
+                        segment_end_time,
+                        labels,
+                        clips_to_store,
                     )
-
+                    to_append = [
+                        wav,
+                        annotation_file,
+                        segment_begin_time,
+                        segment_end_time,
+                        destination,
+                        labels,
+                    ]
                     outputs.append(
                         self.column_separator.join([str(x) for x in to_append])
                     )
             else:
-                segment_sample_begin = audio_obj.time_to_sample(begin)
-                segment_sample_end = audio_obj.time_to_sample(end)
-                audio_to_write = audio_obj.trim(begin, end)
-                audio_to_write.save(f"{destination}.wav")
-
-                if idx == num_segments - 1:
-                    to_append = [
-                        wav,
-                        wav_times[segment_sample_begin],
-                        wav_times[-1],
-                        f"{destination}.wav",
-                    ]
-                else:
-                    to_append = [
-                        wav,
-                        wav_times[segment_sample_begin],
-                        wav_times[segment_sample_end],
-                        f"{destination}.wav",
-                    ]
-
+                self._write_segment(
+                    audio_obj.trim(begin, end),
+                    destination,
+                    segment_begin_time,
+                    segment_end_time,
+                    None,
+                    clips_to_store,
+                )
+                to_append = [wav, segment_begin_time, segment_end_time, destination]
                 outputs.append(self.column_separator.join([str(x) for x in to_append]))
 
+        if self.clip_store is not None:
+            self.clip_store.write(get_md5_digest(str(wav)), clips_to_store, source=wav)
+
         return {"data": outputs}
 
+    def _write_segment(self, audio, destination, begin, end, labels, clips_to_store):
+        """ Save a segment as a WAV file, or queue it for the clip store
+
+        Inputs:
+            audio:          Audio of the segment
+            destination:    The segment's file path or clip id
+            begin:          The begin time of the segment (unit: seconds)
+            end:            The end time of the segment (unit: seconds)
+            labels:         The classes present in the segment, or None
+            clips_to_store: A list of clips to write to the clip store
+        """
+        if self.clip_store is None:
+            audio.save(destination)
+        else:
+            clips_to_store.append(
+                {
+                    "clip": audio,
+                    "clip_id": destination,
+                    "begin_time": begin,
+                    "end_time": end,
+                    "labels": labels,
+                }
+            )
+
     @classmethod
     def collate_fn(*batch):
         return chain.from_iterable([x["data"] for x in batch[1]])
@@ -264,11 +398,41 @@ class SingleTargetAudioDataset(torch.utils.data.Dataset):
             set to a class label, draws overlays from that class. When creating
             a presence/absence classifier, set overlay_class equal to the
             absence class label [default: None]
+        overlay_sample_weight_column: The column with relative probabilities
+            of drawing each row as an overlay. When None, overlays are drawn
+            uniformly from the rows of the overlay class [default: None]
+        overlay_pool_size: Number of decoded clips to keep in an overlay pool
+            (see opensoundscape.overlay_pool). Overlays are then drawn from
+            the pool instead of decoding a file for each overlay, or from a
+            file when the pool has no clip with a different label. Requires
+            random_trim_length and audio_sample_rate. When None, no pool is
+            used [default: None]
+        overlay_pool_refresh: Fraction of the overlay pool replaced with new
+            clips by `refresh_overlay_pool()`, which `train()` calls before
+            each epoch after the first [default: 0.25]
         audio_sample_rate: resample audio to this sample rate; specify None to
             use original audio sample rate [default: 22050]
+        cache_dir: directory for an on-disk cache of decoded and resampled
+            audio (see opensoundscape.feature_cache). Later epochs read the
+            cached samples instead of decoding each file again. When None,
+            no cache is used [default: None]
+        cache_max_bytes: maximum size of the cache in bytes, least recently
+            used files are removed when it is exceeded. None for no limit
+            [default: None]
+        clip_store: a ClipStore (see opensoundscape.clip_store) to read
+            audio from. When given, the filename_column contains clip ids
+            instead of paths to audio files [default: None]
         debug: path to save img files, images are created from the tensor
             immediately before it is returned. When None, does not save images.
             [default: None]
+        tensor_pipeline: compute X from the spectrogram with tensor operations
+            instead of PIL images. X is then equivalent to the PIL pipeline's
+            up to its rounding to 8-bit integers, and its 3 channels are an
+            expanded view of a single channel [default: False]
+        batch_augment: return X as a 1-channel tensor with values in [0, 1],
+            without overlays, noise or normalization, to be augmented and
+            normalized per batch by `opensoundscape.torch.batch_augment`
+            (e.g. with `train(batch_augment=...)`) [default: False]
 
     Output:
         Dictionary:
@@ -294,14 +458,22 @@ class SingleTargetAudioDataset(torch.utils.data.Dataset):
         overlay_prob=0.2,
         overlay_weight="random",
         overlay_class=None,
+        overlay_sample_weight_column=None,
+        overlay_pool_size=None,
+        overlay_pool_refresh=0.25,
         audio_sample_rate=22050,
         debug=None,
+        cache_dir=None,
+        cache_max_bytes=None,
+        clip_store=None,
+        tensor_pipeline=False,
+        batch_augment=False,
     ):
-        self.df = df
         self.label_dict = label_dict
         self.filename_column = filename_column
         self.from_audio = from_audio
         self.label_column = label_column
+        self.df = df
         self.height = height
         self.width = width
         self.add_noise = add_noise
@@ -312,8 +484,16 @@ class SingleTargetAudioDataset(torch.utils.data.Dataset):
         self.overlay_prob = overlay_prob
         self.overlay_weight = overlay_weight
         self.overlay_class = overlay_class
+        self.overlay_sample_weight_column = overlay_sample_weight_column
+        self.overlay_pool_refresh = overlay_pool_refresh
         self.audio_sample_rate = audio_sample_rate
         self.debug = debug
+        self.feature_cache = None
+        if cache_dir is not None:
+            self.feature_cache = FeatureCache(cache_dir, max_bytes=cache_max_bytes)
+        self.clip_store = clip_store
+        self.tensor_pipeline = tensor_pipeline
+        self.batch_augment = batch_augment
 
         # Check inputs
         if (overlay_weight != "random") and (not 0 < overlay_weight < 1):
@@ -333,6 +513,24 @@ class SingleTargetAudioDataset(torch.utils.data.Dataset):
                 f"overlay_class must either be 'different' or a value in the label_column (got overlay_class {self.overlay_class} but labels {df[self.label_column].unique()})"
             )
 
+        if overlay_pool_size is not None and (
+            random_trim_length is None or audio_sample_rate is None
+        ):
+            raise ValueError(
+                "random_trim_length and audio_sample_rate must be specified to use an overlay pool"
+            )
+
+        if self.max_overlay_num > 0:
+            self.build_overlay_index()
+
+        # Pre-decode clips to draw overlays from
+        self.overlay_pool = None
+        if self.max_overlay_num > 0 and overlay_pool_size is not None:
+            self.overlay_pool = OverlayPool(
+                overlay_pool_size, random_trim_length, audio_sample_rate
+            )
+            self.refresh_overlay_pool(fraction=1)
+
         # Set up transform, including needed normalization variables
         self.mean = torch.tensor([0.5 for _ in range(3)])  # [0.8013 for _ in range(3)])
         self.std_dev = [0.5 for _ in range(3)]  # 0.1576 for _ in range(3)])
@@ -357,18 +555,318 @@ class SingleTargetAudioDataset(torch.utils.data.Dataset):
 
         return transforms.Compose(transform_list)
 
-    def random_audio_trim(self, audio, audio_length, audio_path):
-        audio_length = len(audio.samples) / audio.sample_rate
-        if self.random_trim_length > audio_length:
-            if not self.extend_short_clips:
+    @property
+    def df(self):
+        """ The DataFrame of the dataset
+
+        Setting it also sets `filenames` and `labels`, the columns that
+        __getitem__ reads. The DataFrame is not pickled when the dataset is
+        sent to a new process (e.g. spawned DataLoader workers), so it is
+        None there. Other copies, like copy.deepcopy, keep it.
+        """
+        return self._df
+
+    @df.setter
+    def df(self, df):
+        self._df = df
+        self.filenames = PackedStrings(df[self.filename_column].values)
+        self.labels = None
+        if self.label_column:
+            self.labels = df[self.label_column].values
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        # only spawned processes get a copy without df
+        if get_spawning_popen() is not None:
+            state["_df"] = None
+        return state
+
+    def build_overlay_index(self):
+        """ Index the rows of df by label for drawing overlays
+
+        Filenames are sorted by label, so the rows of each label are a
+        contiguous range of `overlay_filenames`. The rows of all labels but
+        one are the two ranges around it, and a file is drawn from them with
+        a single random number instead of filtering df for each overlay.
+        With sample weights, cumulative weights are searched instead.
+        Rows without a label (NaN) are never drawn as overlays.
+        """
+        codes, labels = pd.factorize(self.df[self.label_column])
+        # factorize gives NaN labels the code -1, leave those rows out
+        labeled = np.flatnonzero(codes >= 0)
+        order = labeled[np.argsort(codes[labeled], kind="stable")]
+        counts = np.bincount(codes[labeled], minlength=len(labels))
+        self.overlay_label_codes = {label: code for code, label in enumerate(labels)}
+        self.overlay_filenames = PackedStrings(
+            self.df[self.filename_column].values[order]
+        )
+        self.overlay_codes = codes[order]
+        self.overlay_starts = np.concatenate([[0], np.cumsum(counts)])
+
+        self.overlay_cumulative_weights = None
+        if self.overlay_sample_weight_column is not None:
+            weights = self.df[self.overlay_sample_weight_column].values[order]
+            weights = weights.astype(np.float64)
+            if (weights < 0).any():
                 raise ValueError(
-                    f"the length of the original file ({audio_length} sec) was less than the length to extract ({self.random_trim_length} sec) for the file {audio_path}. . To extend short clips, use extend_short_clips=True"
+                    f"overlay sample weights must not be negative (column {self.overlay_sample_weight_column})"
+                )
+            self.overlay_cumulative_weights = np.concatenate([[0], np.cumsum(weights)])
+
+    def random_overlay_path(self, original_class):
+        """ Draw the filename of an overlay for a file of original_class
+
+        Inputs:
+            original_class: label of the file to overlay
+
+        Outputs:
+            a filename from filename_column of a row in the overlay class
+            (or of a different class), drawn with overlay_sample_weight_column
+        """
+        return self.overlay_filenames[self.random_overlay_position(original_class)]
+
+    def random_overlay_position(self, original_class):
+        """ Draw the position of an overlay in overlay_filenames
+
+        See `random_overlay_path`
+        """
+        starts = self.overlay_starts
+        if self.overlay_class == "different":
+            # rows before and after the range of original_class
+            code = self.overlay_label_codes.get(original_class)
+            skip_start = 0 if code is None else starts[code]
+            skip_end = 0 if code is None else starts[code + 1]
+            first, last = 0, starts[-1]
+        else:
+            code = self.overlay_label_codes[self.overlay_class]
+            skip_start = skip_end = 0
+            first, last = starts[code], starts[code + 1]
+        return self._draw_overlay_position(
+            first, last, skip_start, skip_end, original_class
+        )
+
+    def _draw_overlay_position(self, first, last, skip_start, skip_end, label):
+        """ Draw a position in [first, last) but outside [skip_start, skip_end)
+        """
+        cumulative = self.overlay_cumulative_weights
+        if cumulative is None:
+            size = last - first - (skip_end - skip_start)
+            if size <= 0:
+                raise ValueError(f"no files to draw overlays from for class {label}")
+            position = first + np.random.randint(size)
+            if position >= skip_start:
+                position += skip_end - skip_start
+            return position
+
+        skipped = cumulative[skip_end] - cumulative[skip_start]
+        total = cumulative[last] - cumulative[first] - skipped
+        if total <= 0:
+            raise ValueError(
+                f"no files with positive weight to draw overlays from for class {label}"
+            )
+        target = cumulative[first] + np.random.uniform() * total
+        if target >= cumulative[skip_start]:
+            target += skipped
+        position = np.searchsorted(cumulative, target, side="right") - 1
+        return min(position, last - 1)
+
+    def refresh_overlay_pool(self, fraction=None):
+        """ Replace clips of the overlay pool with newly drawn clips
+
+        Slots are replaced with random clips of random files of the overlay
+        class, so overlays stay diverse across epochs. When overlay_class is
+        'different', the labels of the replaced slots are chosen to keep the
+        labels of the pool balanced, so each label has overlays from others.
+        Call from the main process.
+
+        Inputs:
+            fraction: fraction of slots to replace. When None, uses
+                overlay_pool_refresh [default: None]
+        """
+        if fraction is None:
+            fraction = self.overlay_pool_refresh
+        pool = self.overlay_pool
+        num_slots = int(round(fraction * len(pool)))
+        slots = np.random.choice(len(pool), num_slots, replace=False)
+
+        if self.overlay_class == "different":
+            # labels with files that can be drawn, in a random order for ties
+            starts = self.overlay_starts
+            if self.overlay_cumulative_weights is None:
+                available = np.diff(starts) > 0
+            else:
+                available = np.diff(self.overlay_cumulative_weights[starts]) > 0
+            codes = np.random.permutation(np.flatnonzero(available))
+            if len(codes) == 0:
+                raise ValueError("no files to draw overlays from")
+
+            # counts of the labels in the slots that are kept
+            kept = np.ones(len(pool), dtype=bool)
+            kept[slots] = False
+            kept_labels = pool.labels.numpy()[kept]
+            counts = np.bincount(
+                kept_labels[kept_labels >= 0], minlength=len(starts) - 1
+            )[codes]
+
+        for slot in slots:
+            if self.overlay_class == "different":
+                # the least common label in the pool
+                least = np.argmin(counts)
+                counts[least] += 1
+                code = codes[least]
+                position = self._draw_overlay_position(
+                    starts[code], starts[code + 1], 0, 0, code
                 )
             else:
-                return audio.extend(self.random_trim_length)
-        extra_time = audio_length - self.random_trim_length
-        start_time = np.random.uniform() * extra_time
-        return audio.trim(start_time, start_time + self.random_trim_length)
+                position = self.random_overlay_position(None)
+            overlay_path = self.overlay_filenames[position]
+            overlay_audio_length = self.audio_duration(overlay_path)
+            self.check_overlay_length(overlay_audio_length, pool.clip_length)
+            audio = self.random_audio_clip(
+                overlay_path, pool.clip_length, overlay_audio_length
+            )
+            pool.put(slot, audio.samples, self.overlay_codes[position])
+
+    def check_overlay_length(
+        self, overlay_audio_length, original_length, original_path=None
+    ):
+        """ Raise a ValueError if an overlay file is shorter than the original
+
+        Short overlay files are allowed when extend_short_clips is True
+
+        Inputs:
+            overlay_audio_length: length in seconds of the overlay file
+            original_length: length in seconds of the clip to overlay
+            original_path: path of the original file, or None for the clips
+                of the overlay pool [default: None]
+        """
+        if overlay_audio_length < original_length and not self.extend_short_clips:
+            if original_path is None:
+                original = f"the clips of the overlay pool ({original_length} sec)"
+            else:
+                original = f"the file {original_path} ({original_length} sec)"
+            raise ValueError(
+                f"the length of the overlay file ({overlay_audio_length} sec) was less than the length of {original}. To extend short clips, use extend_short_clips=True"
+            )
+
+    def tensor_noise(self, X):
+        """ Add the noise of set_transform to a 1-channel tensor
+
+        Translate X by up to 20% of its width and 3% of its height, filling
+        with gray, then jitter its brightness and contrast by up to 30% in a
+        random order (saturation and hue have no effect on grayscale images)
+
+        Inputs:
+            X: tensor of shape (1, H, W) with values in [0, 1]
+        """
+        _, height, width = X.shape
+        dx = int(round(np.random.uniform(-0.2 * width, 0.2 * width)))
+        dy = int(round(np.random.uniform(-0.03 * height, 0.03 * height)))
+        translated = torch.full_like(X, 50 / 255)
+        translated[
+            :, max(dy, 0) : height + min(dy, 0), max(dx, 0) : width + min(dx, 0)
+        ] = X[:, max(-dy, 0) : height - max(dy, 0), max(-dx, 0) : width - max(dx, 0)]
+        X = translated
+
+        brightness = np.random.uniform(0.7, 1.3)
+        contrast = np.random.uniform(0.7, 1.3)
+        for jitter in np.random.permutation(2):
+            if jitter == 0:
+                X = (X * brightness).clamp_(0, 1)
+            else:
+                X = torch.lerp(X.mean(), X, contrast).clamp_(0, 1)
+        return X
+
+    def load_audio(self, audio_path, offset=0, duration=None):
+        """ Load audio from a file, the clip store or the feature cache
+
+        Inputs:
+            audio_path: path to an audio file, or a clip id if using a clip store
+            offset: start time in seconds of the audio to load [default: 0]
+            duration: length in seconds of the audio to load, None loads to
+                the end of the file [default: None]
+
+        Outputs:
+            Audio object resampled to audio_sample_rate
+        """
+        if self.clip_store is not None:
+            audio = self.clip_store.read(str(audio_path))
+            if self.audio_sample_rate and audio.sample_rate != self.audio_sample_rate:
+                audio = Audio(
+                    librosa.resample(
+                        audio.samples,
+                        orig_sr=audio.sample_rate,
+                        target_sr=self.audio_sample_rate,
+                    ),
+                    self.audio_sample_rate,
+                )
+        elif self.feature_cache is None:
+            return Audio.from_file(
+                audio_path,
+                sample_rate=self.audio_sample_rate,
+                offset=offset,
+                duration=duration,
+            )
+        else:
+            key = self.feature_cache.key(
+                audio_path,
+                sample_rate=self.audio_sample_rate,
+                dtype=get_default_dtype(),
+            )
+            samples = self.feature_cache.get(key)
+            if samples is None:
+                samples = Audio.from_file(
+                    audio_path, sample_rate=self.audio_sample_rate
+                ).samples
+                self.feature_cache.put(key, samples)
+            sample_rate = self.audio_sample_rate or librosa.get_samplerate(
+                str(audio_path)
+            )
+            audio = Audio(samples, sample_rate)
+
+        if offset == 0 and duration is None:
+            return audio
+        end_time = audio.duration() if duration is None else offset + duration
+        return audio.trim(offset, end_time)
+
+    def audio_duration(self, audio_path):
+        """ Get the duration of a file or clip without loading its audio
+
+        Inputs:
+            audio_path: path to an audio file, or a clip id if using a clip store
+
+        Outputs:
+            duration in seconds
+        """
+        if self.clip_store is not None:
+            return self.clip_store.duration(str(audio_path))
+        return librosa.get_duration(filename=str(audio_path))
+
+    def random_audio_clip(self, audio_path, clip_length, audio_length=None):
+        """ Load a clip of clip_length seconds from a random time in a file
+
+        The start time is chosen using the duration from the file's header,
+        and only the selected clip is decoded rather than the whole file.
+
+        Inputs:
+            audio_path: path to an audio file
+            clip_length: length in seconds of the clip to load
+            audio_length: duration of the file in seconds, if already known
+                from `audio_duration` [default: None]
+
+        Outputs:
+            Audio object of length clip_length
+        """
+        if audio_length is None:
+            audio_length = self.audio_duration(audio_path)
+        if clip_length > audio_length:
+            if not self.extend_short_clips:
+                raise ValueError(
+                    f"the length of the original file ({audio_length} sec) was less than the length to extract ({clip_length} sec) for the file {audio_path}. . To extend short clips, use extend_short_clips=True"
+                )
+            return self.load_audio(audio_path).extend(clip_length)
+        start_time = np.random.uniform() * (audio_length - clip_length)
+        return self.load_audio(audio_path, offset=start_time, duration=clip_length)
 
     def image_from_audio(self, audio, mode="RGB"):
         """ Create a PIL image from audio
@@ -380,41 +878,43 @@ class SingleTargetAudioDataset(torch.utils.data.Dataset):
         spectrogram = Spectrogram.from_audio(audio)
         return spectrogram.to_image(shape=(self.width, self.height), mode=mode)
 
-    def overlay_random_image(
-        self, original_image, original_length, original_class, original_path
-    ):
-        """ Overlay an image from another class
+    def random_overlay(self, original_length, original_class, original_path):
+        """ Select and load a random overlay for an image
 
-        Select a random file from a different class. Trim if necessary to the
-        same length as the given image. Overlay the images on top of each other
-        with a weight
+        Select a random file from a different class (or from overlay_class),
+        and load a random clip of it with the same length as the original.
+        Also select the blur radius and weight of the overlay.
+
+        Outputs:
+            overlay_audio: Audio object of length original_length
+            blur_r: radius of the Gaussian blur applied to the overlay image
+            weight: weight of the overlay image in the blend
         """
-        # Select a random file from a different class
-        if self.overlay_class == "different":
-            choose_from = self.df[self.df[self.label_column] != original_class]
-        # Select a random file from a class of choice
+        pool_slots = []
+        if self.overlay_pool is not None:
+            # the pool only contains clips of overlay_class if it is a label
+            exclude_label = None
+            if self.overlay_class == "different":
+                exclude_label = self.overlay_label_codes.get(original_class)
+            pool_slots = self.overlay_pool.slots(exclude_label=exclude_label)
+
+        if len(pool_slots) > 0:
+            overlay_audio = self.overlay_pool.get(np.random.choice(pool_slots))
         else:
-            choose_from = self.df[self.df[self.label_column] == self.overlay_class]
-        overlay_path = np.random.choice(choose_from[self.filename_column].values)
-        overlay_audio = Audio.from_file(
-            overlay_path, sample_rate=self.audio_sample_rate
-        )
-
-        # trim to same length as main clip
-        overlay_audio_length = len(overlay_audio.samples) / overlay_audio.sample_rate
-        if overlay_audio_length < original_length and not self.extend_short_clips:
-            raise ValueError(
-                f"the length of the overlay file ({overlay_audio_length} sec) was less than the length of the file {original_path} ({original_length} sec). To extend short clips, use extend_short_clips=True"
+            # Select a random file from a different class or a class of choice
+            # (also when the pool has no clip for original_class)
+            overlay_path = self.random_overlay_path(original_class)
+
+            # load a random clip with the same length as main clip
+            overlay_audio_length = self.audio_duration(overlay_path)
+            self.check_overlay_length(
+                overlay_audio_length, original_length, original_path
             )
-        elif overlay_audio_length != original_length:
-            overlay_audio = self.random_audio_trim(
-                overlay_audio, original_length, overlay_path
+            overlay_audio = self.random_audio_clip(
+                overlay_path, original_length, overlay_audio_length
             )
-        overlay_image = self.image_from_audio(overlay_audio, mode="L")
 
-        # create an image and add blur
         blur_r = np.random.randint(0, 8) / 10
-        overlay_image = overlay_image.filter(ImageFilter.GaussianBlur(radius=blur_r))
 
         # Select weight; <0.5 means more emphasis on original image
         if self.overlay_weight == "random":
@@ -422,27 +922,100 @@ class SingleTargetAudioDataset(torch.utils.data.Dataset):
         else:
             weight = self.overlay_weight
 
+        return overlay_audio, blur_r, weight
+
+    def overlay_random_image(
+        self, original_image, original_length, original_class, original_path
+    ):
+        """ Overlay an image from another class
+
+        Select a random file from a different class. Trim if necessary to the
+        same length as the given image. Overlay the images on top of each other
+        with a weight
+        """
+        overlay_audio, blur_r, weight = self.random_overlay(
+            original_length, original_class, original_path
+        )
+
+        # create an image and add blur
+        overlay_image = self.image_from_audio(overlay_audio, mode="L")
+        overlay_image = overlay_image.filter(ImageFilter.GaussianBlur(radius=blur_r))
+
         # use a weighted sum to overlay (blend) the images
         return Image.blend(original_image, overlay_image, weight)
 
+    def tensor_from_audio(self, audio):
+        """ Create a 1-channel tensor with values in [0, 1] from audio
+
+        Equivalent to ToTensor() of `image_from_audio(audio, mode="L")`
+
+        Inputs:
+            audio: audio object
+        """
+        spectrogram = Spectrogram.from_audio(audio)
+        return spectrogram.to_tensor(shape=(self.width, self.height))
+
+    def overlay_random_tensor(
+        self, original_tensor, original_length, original_class, original_path
+    ):
+        """ Overlay the tensor of a clip from another class
+
+        Equivalent to `overlay_random_image` for tensors from
+        `tensor_from_audio`, using the same random choices
+        """
+        overlay_audio, blur_r, weight = self.random_overlay(
+            original_length, original_class, original_path
+        )
+        overlay_tensor = gaussian_blur(self.tensor_from_audio(overlay_audio), blur_r)
+        return torch.lerp(original_tensor, overlay_tensor, weight)
+
     def upsample(self):
         raise NotImplementedError("Upsampling is not implemented yet")
 
     def __len__(self):
-        return self.df.shape[0]
+        return len(self.filenames)
 
     def __getitem__(self, item_idx):
 
-        row = self.df.iloc[item_idx]
-        audio_path = Path(row[self.filename_column])
-        audio = Audio.from_file(audio_path, sample_rate=self.audio_sample_rate)
+        audio_path = Path(self.filenames[item_idx])
+        label = None if self.labels is None else self.labels[item_idx]
 
         # trim to desired length if needed
         # (if self.random_trim_length is specified, select a clip of that length at random from the original file)
-        audio_length = len(audio.samples) / audio.sample_rate
         if self.random_trim_length is not None:
-            audio = self.random_audio_trim(audio, audio_length, audio_path)
+            audio = self.random_audio_clip(audio_path, self.random_trim_length)
             audio_length = self.random_trim_length
+        else:
+            audio = self.load_audio(audio_path)
+            audio_length = len(audio.samples) / audio.sample_rate
+
+        if self.batch_augment:
+            X = self.tensor_from_audio(audio)
+            return self.make_item(X, label, audio_path)
+
+        if self.tensor_pipeline:
+            X = self.tensor_from_audio(audio)
+            for _ in range(self.max_overlay_num):
+                if self.overlay_prob > np.random.uniform():
+                    X = self.overlay_random_tensor(
+                        original_tensor=X,
+                        original_length=audio_length,
+                        original_class=label,
+                        original_path=audio_path,
+                    )
+                else:
+                    break
+
+            if self.save_dir:
+                image = Image.fromarray((X[0] * 255).byte().numpy())
+                image.save(f"{self.save_dir}/{audio_path.stem}_{time()}.png")
+
+            if self.add_noise:
+                X = self.tensor_noise(X)
+            X = (X - self.mean[0]) / self.std_dev[0]
+            X = X.expand(3, -1, -1)
+            return self.make_item(X, label, audio_path)
+
         image = self.image_from_audio(audio, mode="L")
 
         # add a blended/overlayed image from another class directly on top
@@ -451,7 +1024,7 @@ class SingleTargetAudioDataset(torch.utils.data.Dataset):
                 image = self.overlay_random_image(
                     original_image=image,
                     original_length=audio_length,
-                    original_class=row[self.label_column],
+                    original_class=label,
                     original_path=audio_path,
                 )
             else:
@@ -463,7 +1036,11 @@ class SingleTargetAudioDataset(torch.utils.data.Dataset):
         # apply desired random transformations to image and convert to tensor
         image = image.convert("RGB")
         X = self.transform(image)
+        return self.make_item(X, label, audio_path)
 
+    def make_item(self, X, label, audio_path):
+        """ The item returned by __getitem__ for a tensor and its label
+        """
         if self.debug:
             from torchvision.utils import save_image
 
@@ -471,8 +1048,106 @@ class SingleTargetAudioDataset(torch.utils.data.Dataset):
 
         # Return data : label pairs (training/validation)
         if self.label_column:
-            labels = np.array([row[self.label_column]])
+            labels = np.array([label])
             return {"X": X, "y": torch.from_numpy(labels)}
 
         # Return data only (prediction)
         return {"X": X}
+
+
+class SplitAudioDataset(torch.utils.data.IterableDataset):
+    """ Iterable dataset of spectrogram images of clips of audio files
+
+    Each audio file is decoded once and split into clips in memory, and the
+    spectrograms of its clips are computed together with SpectrogramBatch.
+    Unlike splitting with SplitterDataset and then loading the clips with
+    SingleTargetAudioDataset, no intermediate audio files are written.
+
+    When used with a DataLoader with several workers, each worker processes
+    a different subset of the files. Clips of different files may then be
+    interleaved, so each item includes the clip's source and times.
+
+    Input:
+        files: A list of audio files
+        clip_duration: The duration of each clip in seconds [default: 5]
+        clip_overlap: The overlap of consecutive clips in seconds [default: 0]
+        final_clip: How to treat the end of the audio, see
+            Audio.split_samples [default: None]
+        audio_sample_rate: resample audio to this sample rate; specify None to
+            use original audio sample rate [default: 22050]
+        height: Height for resulting Tensor [default: 224]
+        width: Width for resulting Tensor [default: 224]
+        clips_per_block: The number of clips whose spectrograms are computed
+            at once, which limits memory use for long files [default: 32]
+
+    Output:
+        Dictionary:
+            { "X": (3, H, W)
+            , "source": path of the audio file
+            , "begin_time": begin time of the clip in seconds
+            , "end_time": end time of the clip in seconds
+            }
+    """
+
+    def __init__(
+        self,
+        files,
+        clip_duration=5,
+        clip_overlap=0,
+        final_clip=None,
+        audio_sample_rate=22050,
+        height=224,
+        width=224,
+        clips_per_block=32,
+    ):
+        self.files = [str(f) for f in files]
+        self.clip_duration = clip_duration
+        self.clip_overlap = clip_overlap
+        self.final_clip = final_clip
+        self.audio_sample_rate = audio_sample_rate
+        self.height = height
+        self.width = width
+        self.clips_per_block = clips_per_block
+
+        # same transform as SingleTargetAudioDataset without noise
+        self.mean = torch.tensor([0.5 for _ in range(3)])
+        self.std_dev = [0.5 for _ in range(3)]
+        self.transform = transforms.Compose(
+            [
+                transforms.Resize((self.height, self.width)),
+                transforms.ToTensor(),
+                transforms.Normalize(self.mean, self.std_dev),
+            ]
+        )
+
+    def worker_files(self):
+        """ The files processed by the current DataLoader worker
+        """
+        worker_info = torch.utils.data.get_worker_info()
+        if worker_info is None:
+            return self.files
+        return self.files[worker_info.id :: worker_info.num_workers]
+
+    def __iter__(self):
+        for path in self.worker_files():
+            audio = Audio.from_file(path, sample_rate=self.audio_sample_rate)
+            clips, times = audio.split_samples(
+                self.clip_duration, self.clip_overlap, self.final_clip
+            )
+            for block_start in range(0, len(clips), self.clips_per_block):
+                block = slice(block_start, block_start + self.clips_per_block)
+                spectrograms = SpectrogramBatch.from_samples(
+                    clips[block], audio.sample_rate
+                )
+                for spectrogram, (begin_time, end_time) in zip(
+                    spectrograms, times[block]
+                ):
+                    image = spectrogram.to_image(
+                        shape=(self.width, self.height), mode="L"
+                    )
+                    yield {
+                        "X": self.transform(image.convert("RGB")),
+                        "source": path,
+                        "begin_time": float(begin_time),
+                        "end_time": float(end_time),
+                    }
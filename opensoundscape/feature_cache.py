@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+""" feature_cache.py: An on-disk cache of preprocessed arrays
+
+Decoding and resampling audio is usually the most expensive part of
+preparing a training sample, and its result is the same every epoch.
+FeatureCache stores such arrays as .npy files and serves them back as
+read-only memory-mapped arrays.
+
+Entries are keyed by the source file's path, modification time and size
+plus any preprocessing parameters, so changing the file or the parameters
+produces a new entry. Files are written to a temporary name and then
+atomically renamed, so several processes (e.g. DataLoader workers) can
+share one cache directory safely. When `max_bytes` is set, the least
+recently used entries are deleted to keep the cache below that size.
+
+The total size is tracked in memory, and the directory is only scanned
+when it goes over max_bytes. Each process only counts its own writes, so
+with several processes the cache can exceed max_bytes until one of them
+scans it. Reads mark entries as recently used at most once every
+TOUCH_INTERVAL seconds per process, and only when max_bytes is set.
+"""
+
+import os
+import tempfile
+import time
+from hashlib import md5
+from pathlib import Path
+import numpy as np
+
+TOUCH_INTERVAL = 60
+
+
+class FeatureCache:
+    """ On-disk cache of numpy arrays
+
+    Args:
+        directory: directory to store cached arrays in (created if needed)
+        max_bytes: maximum total size of cached arrays in bytes,
+            or None for no limit [default: None]
+    """
+
+    def __init__(self, directory, max_bytes=None):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.directory.mkdir(parents=True, exist_ok=True)
+        # total size in bytes of cached arrays, scanned when first needed
+        self._total_bytes = None
+        # time each key was last marked as recently used by this process
+        self._touched = {}
+
+    def key(self, path, **params):
+        """ Generate a key for the features of a file
+
+        Args:
+            path: path to the source file of the features
+            **params: preprocessing parameters that the features depend on
+
+        Returns:
+            a string key
+        """
+        stat = os.stat(path)
+        params = ",".join(f"{k}={params[k]}" for k in sorted(params))
+        unique_string = (
+            f"{Path(path).resolve()}-{stat.st_mtime_ns}-{stat.st_size}-{params}"
+        )
+        return md5(unique_string.encode("utf-8")).hexdigest()
+
+    def _path(self, key):
+        return self.directory / f"{key}.npy"
+
+    def get(self, key):
+        """ Get a cached array
+
+        Args:
+            key: a key generated by FeatureCache.key()
+
+        Returns:
+            read-only memory-mapped array, or None if the key is not cached
+        """
+        path = self._path(key)
+        try:
+            array = np.load(path, mmap_mode="r")
+            if self.max_bytes is not None:
+                self._touch(key, path)
+        except (FileNotFoundError, ValueError):
+            # missing, or removed by another process while loading
+            return None
+        return array
+
+    def _touch(self, key, path):
+        """ Mark an entry as recently used, unless it was marked recently
+        """
+        now = time.monotonic()
+        if now - self._touched.get(key, -TOUCH_INTERVAL) >= TOUCH_INTERVAL:
+            os.utime(path)
+            self._touched[key] = now
+
+    def put(self, key, array):
+        """ Add an array to the cache
+
+        Args:
+            key: a key generated by FeatureCache.key()
+            array: numpy array to store
+        """
+        path = self._path(key)
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, np.asarray(array))
+                size = f.tell()
+            try:
+                replaced_size = os.stat(path).st_size
+            except FileNotFoundError:
+                replaced_size = 0
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        self._touched[key] = time.monotonic()
+
+        if self.max_bytes is not None:
+            if self._total_bytes is None:
+                self._total_bytes = self._scan_total_bytes()
+            else:
+                self._total_bytes += size - replaced_size
+            if self._total_bytes > self.max_bytes:
+                self.evict(self.max_bytes)
+
+    def _entries(self):
+        """ (modification time, size, path) of each cached array
+        """
+        entries = []
+        for entry in os.scandir(self.directory):
+            if not entry.name.endswith(".npy"):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def _scan_total_bytes(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self, max_bytes):
+        """ Delete least recently used entries until the cache is below max_bytes
+
+        Args:
+            max_bytes: the maximum total size in bytes of cached arrays
+        """
+        entries = self._entries()
+        total_bytes = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_bytes <= max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                # already evicted by another process
+                pass
+            total_bytes -= size
+        self._total_bytes = total_bytes
+
+    def clear(self):
+        """ Delete all cached arrays
+        """
+        self.evict(0)
@@ -109,3 +109,66 @@ def jitter(x, width, distribution="gaussian"):
     raise ValueError(
         f"distribution must be 'gaussian' or 'uniform'. Got {distribution}."
     )
+
+
+class PackedStrings:
+    """ Immutable array of strings packed into one buffer
+
+    A numpy object array or pandas column of strings holds one Python object
+    per string. Reading them from forked processes (e.g. DataLoader workers)
+    updates their reference counts, which copies the memory pages they are on
+    into every process. PackedStrings instead stores the UTF-8 bytes of all
+    strings in one uint8 array, with the offset of each string in another.
+
+    Args:
+        strings: iterable of strings (other values are converted with str())
+    """
+
+    def __init__(self, strings):
+        encoded = [str(s).encode("utf-8") for s in strings]
+        self.offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        self.offsets[1:] = np.cumsum([len(e) for e in encoded])
+        self.buffer = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        """ Get one string, or a list of strings for an array of indices"""
+        if isinstance(index, slice) or np.ndim(index) > 0:
+            return [self[i] for i in np.arange(len(self))[index]]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(f"index {index} out of range for {len(self)} strings")
+        start, end = self.offsets[index], self.offsets[index + 1]
+        return self.buffer[start:end].tobytes().decode("utf-8")
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+
+
+def sliding_windows(array, window_length):
+    """ Read-only view of every window of window_length along the last axis
+
+    Equivalent to np.lib.stride_tricks.sliding_window_view(array, window_length)
+    (numpy >= 1.20): the windows are strided views, so no samples are copied.
+
+    Args:
+        array: array with at least window_length values along its last axis
+        window_length: number of values in each window
+
+    Returns:
+        array of shape (..., array.shape[-1] - window_length + 1, window_length)
+    """
+    array = np.asarray(array)
+    length = array.shape[-1]
+    if not 0 < window_length <= length:
+        raise ValueError(
+            f"window_length should be between 1 and {length}. Got {window_length}"
+        )
+    shape = array.shape[:-1] + (length - window_length + 1, window_length)
+    strides = array.strides + (array.strides[-1],)
+    return np.lib.stride_tricks.as_strided(
+        array, shape=shape, strides=strides, writeable=False
+    )
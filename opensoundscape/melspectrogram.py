@@ -3,10 +3,12 @@
 """
 
 from opensoundscape.audio import Audio
-from librosa.feature import melspectrogram
-from librosa import pcen
+import numpy as np
+from librosa import pcen, stft
 from PIL import Image
 from opensoundscape.helpers import linear_scale
+from opensoundscape.stft_cache import get_window, get_mel_filterbank
+from opensoundscape.precision import resolve_dtype
 
 
 class MelSpectrogram:
@@ -34,6 +36,7 @@ class MelSpectrogram:
         htk=True,
         fmin=None,
         fmax=None,
+        dtype=None,
     ):
         """ Create a MelSpectrogram object from an Audio object
 
@@ -53,6 +56,7 @@ class MelSpectrogram:
             htk: use HTK formula instead of Slaney [default: True]
             fmin: lowest frequency (in Hz) [default: None]
             fmax: highest frequency (in Hz). If None, use `fmax = sr / 2.0` [default: None]
+            dtype: floating point dtype of S, None uses opensoundscape.get_default_dtype() [default: None]
 
         Returns:
             opensoundscape.melspectrogram.MelSpectrogram object
@@ -63,19 +67,26 @@ class MelSpectrogram:
 
         process_fmin = fmin if fmin else 0
         process_fmax = fmax if fmax else audio.sample_rate / 2
-
-        S = melspectrogram(
-            y=audio.samples,
-            sr=audio.sample_rate,
-            n_fft=n_fft,
-            win_length=win_length,
-            hop_length=hop_length,
-            window=window,
-            n_mels=n_mels,
-            htk=htk,
-            fmin=process_fmin,
-            fmax=process_fmax,
+        dtype = resolve_dtype(dtype)
+
+        # equivalent to librosa.feature.melspectrogram, but with the window
+        # and mel filterbank taken from opensoundscape.stft_cache
+        S = (
+            np.abs(
+                stft(
+                    y=audio.samples.astype(dtype, copy=False),
+                    n_fft=n_fft,
+                    hop_length=hop_length,
+                    win_length=win_length,
+                    window=get_window(window, win_length or n_fft),
+                )
+            )
+            ** 2
+        )
+        mel_filterbank = get_mel_filterbank(
+            audio.sample_rate, n_fft, n_mels, process_fmin, process_fmax, htk
         )
+        S = np.dot(mel_filterbank, S).astype(dtype, copy=False)
 
         # Make spectrogram "right-side up"
         S = S[::-1]
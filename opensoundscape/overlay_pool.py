@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+""" overlay_pool.py: A pool of pre-decoded clips shared between processes
+
+Overlaying clips from other files during augmentation means decoding and
+resampling one or more extra files for every training sample. An OverlayPool
+instead holds a fixed number of decoded clips of the same length, and
+overlays are drawn from it with a memory read.
+
+The samples and labels of the pool are torch tensors in shared memory, so
+DataLoader workers read the pool created in the main process without
+copying it, whether they are started by forking or spawning. Refilling
+slots in the main process (e.g. between epochs) is seen by all workers.
+"""
+
+import numpy as np
+import torch
+
+from opensoundscape.audio import Audio
+
+
+class OverlayPool:
+    """ Fixed-size pool of equal-length audio clips in shared memory
+
+    Each slot holds the samples of one clip and an integer label. Slots
+    that have not been filled yet have the label -1 and are never drawn.
+
+    Args:
+        size: number of clips in the pool
+        clip_length: length of each clip in seconds
+        sample_rate: sample rate of the clips
+    """
+
+    def __init__(self, size, clip_length, sample_rate):
+        if size < 1:
+            raise ValueError(f"size should be at least 1. Got {size}")
+        self.size = size
+        self.clip_length = clip_length
+        self.sample_rate = sample_rate
+        self.num_samples = int(round(clip_length * sample_rate))
+        self.samples = torch.zeros(
+            (size, self.num_samples), dtype=torch.float32
+        ).share_memory_()
+        self.labels = torch.full((size,), -1, dtype=torch.int64).share_memory_()
+
+    def __len__(self):
+        return self.size
+
+    def put(self, slot, samples, label):
+        """ Store a clip in a slot of the pool
+
+        Samples are truncated or zero-padded to the clip length of the pool
+
+        Args:
+            slot: index of the slot to replace
+            samples: 1d array of samples, at the sample rate of the pool
+            label: non-negative integer label of the clip
+        """
+        samples = torch.as_tensor(np.asarray(samples)[: self.num_samples])
+        self.samples[slot, : len(samples)] = samples
+        self.samples[slot, len(samples) :] = 0
+        self.labels[slot] = label
+
+    def get(self, slot):
+        """ Get the clip of a slot as an Audio object
+
+        The samples are a view of the pool's shared memory, and change if
+        the slot is replaced.
+
+        Args:
+            slot: index of the slot
+
+        Returns:
+            Audio object of length clip_length
+        """
+        return Audio(self.samples[slot].numpy(), self.sample_rate)
+
+    def slots(self, exclude_label=None, label=None):
+        """ Indices of the filled slots with matching labels
+
+        Args:
+            exclude_label: only slots without this label [default: None]
+            label: only slots with this label [default: None]
+
+        Returns:
+            array of slot indices, which may be empty
+        """
+        labels = self.labels.numpy()
+        allowed = labels >= 0
+        if exclude_label is not None:
+            allowed &= labels != exclude_label
+        if label is not None:
+            allowed &= labels == label
+        return np.flatnonzero(allowed)
+
+    def draw(self, exclude_label=None, label=None):
+        """ Get a random clip from the filled slots of the pool
+
+        Args:
+            exclude_label: only draw clips without this label [default: None]
+            label: only draw clips with this label [default: None]
+
+        Returns:
+            Audio object of length clip_length
+        """
+        slots = self.slots(exclude_label=exclude_label, label=label)
+        if len(slots) == 0:
+            raise ValueError("no clips in the overlay pool match the given labels")
+        return self.get(np.random.choice(slots))
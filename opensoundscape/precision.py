@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+""" precision.py: Floating point precision used for audio and spectrograms
+
+Audio samples, spectrograms and mel spectrograms are created with the
+default dtype (float32 unless changed with `set_default_dtype`). Functions
+that create these arrays also take a `dtype` argument, which overrides the
+default for that call.
+"""
+
+import numpy as np
+
+_default_dtype = np.dtype(np.float32)
+
+
+def set_default_dtype(dtype):
+    """ Set the default floating point dtype for audio and spectrograms
+
+    Args:
+        dtype: a numpy floating point dtype, e.g. np.float32 or "float64"
+    """
+    global _default_dtype
+    _default_dtype = _floating_dtype(dtype)
+
+
+def get_default_dtype():
+    """ Get the default floating point dtype for audio and spectrograms
+
+    Returns:
+        numpy.dtype
+    """
+    return _default_dtype
+
+
+def resolve_dtype(dtype=None):
+    """ Get the dtype to use for a call with a `dtype` argument
+
+    Args:
+        dtype: a numpy floating point dtype, or None for the default dtype
+
+    Returns:
+        numpy.dtype
+    """
+    if dtype is None:
+        return _default_dtype
+    return _floating_dtype(dtype)
+
+
+def _floating_dtype(dtype):
+    dtype = np.dtype(dtype)
+    if dtype.kind != "f":
+        raise ValueError(f"dtype should be a floating point type. Got {dtype}")
+    return dtype
@@ -14,7 +14,7 @@ from torchvision import transforms
 
 from PIL import Image
 
-from opensoundscape.helpers import binarize
+from opensoundscape.helpers import binarize, PackedStrings
 
 
 def predict(
@@ -33,7 +33,7 @@ def predict(
 
     class PredictionDataset(torch.utils.data.Dataset):
         def __init__(self, df, height=img_shape[0], width=img_shape[1]):
-            self.data = df
+            self.filenames = PackedStrings(df["filename"].values)
 
             self.height = height
             self.width = width
@@ -46,11 +46,10 @@ def predict(
             )
 
         def __len__(self):
-            return self.data.shape[0]
+            return len(self.filenames)
 
         def __getitem__(self, idx):
-            row = self.data.iloc[idx, :]
-            image = Image.open(row["filename"])
+            image = Image.open(self.filenames[idx])
             image = image.convert("RGB")
             image = image.resize((self.width, self.height))
 
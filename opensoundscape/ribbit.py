@@ -3,11 +3,23 @@
 This module provides functionality to search audio for periodically fluctuating vocalizations.
 """
 
+from collections import defaultdict
+from functools import partial
+from multiprocessing import Pool
+from pathlib import Path
+import warnings
 from scipy import signal
 import numpy as np
+import pandas as pd
 
 # local imports
-from opensoundscape.helpers import isNan, bound
+from opensoundscape.helpers import isNan, bound, sliding_windows
+from opensoundscape.audio import Audio
+from opensoundscape.spectrogram import Spectrogram
+
+FINAL_WINDOW_OPTIONS = ["drop", "pad", "shift"]
+RIBBIT_BATCH_COLUMNS = ["file", "species", "max_score", "time_of_max_score"]
+AUDIO_EXTENSIONS = ["wav", "WAV", "mp3", "MP3"]
 
 
 def calculate_pulse_score(
@@ -38,7 +50,7 @@ def calculate_pulse_score(
     # look for the highest peak of power spectral density within pulse_rate_range
     min_rate = pulse_rate_range[0]
     max_rate = pulse_rate_range[1]
-    psd_bandpassed = [psd[i] for i in range(len(psd)) if min_rate < f[i] < max_rate]
+    psd_bandpassed = psd[(min_rate < f) & (f < max_rate)]
 
     if len(psd_bandpassed) < 1:
         return 0
@@ -68,8 +80,176 @@ def calculate_pulse_score(
     return max_psd
 
 
+def calculate_pulse_scores(windows, amplitude_sample_rate, pulse_rate_range, nfft=1024):
+    """Score many windows of an amplitude signal at once
+
+    Vectorized version of calculate_pulse_score: the power spectral densities
+    of all windows are computed in one call to scipy.signal.welch, and each
+    window is scored by the highest value of its power spectral density
+    in the PRR range
+
+    Inputs:
+        windows: 2d array (n_windows, window length) of amplitude signals
+        amplitude_sample_rate: sample rate in Hz of amplitude signal, normally ~20-200 Hz
+        pulse_rate_range: [min, max] values for amplitude modulation in Hz
+        nfft=1024: controls the resolution of the power spectral density (see scipy.signal.welch)
+
+    Outputs:
+        array of pulse rate scores, one for each window
+    """
+    windows = np.asarray(windows)
+    if windows.ndim != 2:
+        raise ValueError(f"windows should be a 2d array. Got shape {windows.shape}")
+    if windows.shape[0] == 0:
+        return np.zeros(0)
+    if windows.shape[1] < 1:
+        raise ValueError("windows do not have length > 0")
+
+    f, psd = signal.welch(windows, fs=amplitude_sample_rate, nfft=nfft, axis=-1)
+
+    in_pulse_rate_range = (pulse_rate_range[0] < f) & (f < pulse_rate_range[1])
+    if not in_pulse_rate_range.any():
+        return np.zeros(windows.shape[0])
+
+    return psd[:, in_pulse_rate_range].max(axis=1)
+
+
+def _spectrogram_sample_rate(spectrogram):
+    # in Hz, ie delta-t between consecutive pixels
+    return (len(spectrogram.times) - 1) / (spectrogram.times[-1] - spectrogram.times[0])
+
+
+def _samples_per_window(window_len, sample_rate, name="window_len"):
+    n_samples_per_window = int(window_len * sample_rate)
+    if n_samples_per_window < 1:
+        raise ValueError(
+            f"{name} ({window_len} sec) is shorter than one spectrogram column"
+        )
+    return n_samples_per_window
+
+
+def _window_start_samples(
+    signal_len, n_samples_per_window, n_samples_per_hop, final_window
+):
+    """ first sample of each window of a signal
+
+    windows start every n_samples_per_hop samples. With final_window "drop",
+    only windows that fit in the signal are used. Otherwise, if the end of
+    the signal is not covered, one more window is added: the next window
+    (which runs past the end of the signal) for "pad", or a window ending at
+    the end of the signal for "shift" (or the next window, if the signal is
+    shorter than one window).
+    """
+    if final_window not in FINAL_WINDOW_OPTIONS:
+        raise ValueError(
+            f"final_window should be one of {FINAL_WINDOW_OPTIONS}. Got {final_window}"
+        )
+    start_samples = np.arange(
+        0, signal_len - n_samples_per_window + 1, n_samples_per_hop
+    )
+    if final_window == "drop" or signal_len == 0:
+        return start_samples
+
+    if len(start_samples) == 0:
+        return np.array([0])
+    if start_samples[-1] + n_samples_per_window >= signal_len:
+        return start_samples
+    if final_window == "pad":
+        final_start = start_samples[-1] + n_samples_per_hop
+    else:
+        final_start = signal_len - n_samples_per_window
+    return np.append(start_samples, final_start)
+
+
+def _windows(amplitude, n_samples_per_window, n_samples_per_hop, final_window):
+    """ view windows of the last axis of amplitude as a matrix
+
+    Windows are strided views of the amplitude signal, so overlapping
+    windows are not copied. A signal that doesn't fill its final window is
+    padded with zeros.
+
+    Returns:
+        windows: array of shape (..., n_windows, n_samples_per_window)
+        start_samples: array of the first sample of each window
+    """
+    signal_len = amplitude.shape[-1]
+    start_samples = _window_start_samples(
+        signal_len, n_samples_per_window, n_samples_per_hop, final_window
+    )
+    if len(start_samples) == 0:
+        windows = np.zeros(amplitude.shape[:-1] + (0, n_samples_per_window))
+        return windows, start_samples
+
+    padding = start_samples[-1] + n_samples_per_window - signal_len
+    if padding > 0:
+        pad_width = [(0, 0)] * (amplitude.ndim - 1) + [(0, padding)]
+        amplitude = np.pad(amplitude, pad_width)
+
+    all_windows = sliding_windows(amplitude, n_samples_per_window)
+    regular_starts = np.arange(len(start_samples)) * n_samples_per_hop
+    if np.array_equal(start_samples, regular_starts):
+        windows = all_windows[..., : regular_starts[-1] + 1 : n_samples_per_hop, :]
+    else:
+        # the final window was shifted back
+        windows = all_windows[..., start_samples, :]
+    return windows, start_samples
+
+
+class BandAmplitudes:
+    """ Amplitude signals of any frequency band of a spectrogram
+
+    Builds a cumulative sum of the spectrogram over the frequency axis once,
+    so that the amplitude of a band is the difference of two rows rather than
+    a sum over a copy of the band. Gives the same results as
+    Spectrogram.amplitude and Spectrogram.net_amplitude.
+
+    Args:
+        spectrogram: opensoundscape.Spectrogram object
+    """
+
+    def __init__(self, spectrogram):
+        self.frequencies = spectrogram.frequencies
+        self.cumulative = np.zeros(
+            (len(spectrogram.frequencies) + 1, len(spectrogram.times))
+        )
+        np.cumsum(spectrogram.spectrogram, axis=0, out=self.cumulative[1:])
+
+    def amplitude(self, freq_range):
+        """ time-series array of the sum of the spectrogram in a [low, high] band in Hz
+        """
+        # same band edges as Spectrogram.bandpass
+        lowest_index = np.abs(self.frequencies - freq_range[0]).argmin()
+        highest_index = np.abs(self.frequencies - freq_range[1]).argmin()
+        return self.cumulative[highest_index + 1] - self.cumulative[lowest_index]
+
+    def net_amplitude(self, signal_band, reject_bands=None):
+        """ amplitude in signal_band minus amplitude in reject_bands
+
+        see Spectrogram.net_amplitude
+        """
+        net_amplitude = self.amplitude(signal_band) / (signal_band[1] - signal_band[0])
+
+        if not (reject_bands is None):
+            reject_bands = np.array(reject_bands)
+            reject_bands_total_bandwidth = sum(reject_bands[:, 1] - reject_bands[:, 0])
+            for reject_band in reject_bands:
+                net_amplitude = net_amplitude - (
+                    self.amplitude(reject_band) / reject_bands_total_bandwidth
+                )
+            net_amplitude = np.maximum(net_amplitude, 0)
+
+        return net_amplitude
+
+
 def ribbit(
-    spectrogram, signal_band, pulse_rate_range, window_len, noise_bands=None, plot=False
+    spectrogram,
+    signal_band,
+    pulse_rate_range,
+    window_len,
+    noise_bands=None,
+    plot=False,
+    window_hop=None,
+    final_window="drop",
 ):
     """Run RIBBIT detector to search for periodic calls in audio
     
@@ -86,10 +266,21 @@ def ribbit(
                     - if `None`, no noise bands are used
                     - default: None
         plot=False : if True, plot the power spectral density for each window
+        window_hop: time (in seconds) between the starts of consecutive windows
+                    - windows overlap if window_hop < window_len
+                    - if `None`, window_hop is window_len (no overlap)
+                    - default: None
+        final_window: what to do when the last window would extend past the end of the audio
+                    - "drop": don't score it (default)
+                    - "pad": score it with the missing amplitude set to 0
+                    - "shift": move it back to end at the end of the audio
     
     Outputs:
         array of pulse_score: pulse score (float) for each time window
         array of time: start time of each window
+
+    Raises:
+        ValueError if window_len or window_hop is shorter than one spectrogram column
         
     Notes
     -----
@@ -120,50 +311,258 @@ def ribbit(
     # Make a 1d amplitude signal in a frequency range, subtracting energy in noise bands
     amplitude = spectrogram.net_amplitude(signal_band, noise_bands)
 
-    # next we split the spec into "windows" to analyze separately: (no overlap for now)
-    sample_frequency_of_spec = (len(spectrogram.times) - 1) / (
-        spectrogram.times[-1] - spectrogram.times[0]
-    )  # in Hz, ie delta-t between consecutive pixels
-    n_samples_per_window = int(window_len * sample_frequency_of_spec)
-    signal_len = len(amplitude)
+    # next we split the spec into "windows" to analyze separately
+    sample_frequency_of_spec = _spectrogram_sample_rate(spectrogram)
+    n_samples_per_window = _samples_per_window(window_len, sample_frequency_of_spec)
+    n_samples_per_hop = n_samples_per_window
+    if window_hop is not None:
+        n_samples_per_hop = _samples_per_window(
+            window_hop, sample_frequency_of_spec, name="window_hop"
+        )
+    windows, start_samples = _windows(
+        amplitude, n_samples_per_window, n_samples_per_hop, final_window
+    )
+    window_start_times = start_samples / sample_frequency_of_spec
+
+    if plot:
+        pulse_scores = np.zeros(len(windows))
+        for i, (start_time, window) in enumerate(zip(window_start_times, windows)):
+            end_time = start_time + n_samples_per_window / sample_frequency_of_spec
+            print(f"window: {start_time:.4f} sec to {end_time:.4f} sec")
+            pulse_scores[i] = calculate_pulse_score(
+                window, sample_frequency_of_spec, pulse_rate_range, plot
+            )
+        return pulse_scores, window_start_times
+
+    # Make psd (Power spectral density or power spectrum of x) of every window and find max
+    pulse_scores = calculate_pulse_scores(
+        windows, sample_frequency_of_spec, pulse_rate_range
+    )
 
-    start_sample = 0
-    pulse_scores = []
-    window_start_times = []
+    return pulse_scores, window_start_times
 
-    # step through the file, analyzing in pieces that are window_len long, saving scores and start times for each window
-    while start_sample + n_samples_per_window < signal_len - 1:
-        end_sample = start_sample + n_samples_per_window
-        if end_sample < signal_len:
-            window = amplitude[start_sample:end_sample]
-        else:
-            final_start_sample = max(0, signal_len - n_samples_per_window)
-            window = amplitude[final_start_sample:signal_len]
 
-        if plot:
-            print(
-                f"window: {'{:.4f}'.format(start_sample/sample_frequency_of_spec)} sec to {'{:.4f}'.format(end_sample/sample_frequency_of_spec)} sec"
+class RibbitStream:
+    """ Run RIBBIT on audio that arrives in chunks, using bounded memory
+
+    Instead of a spectrogram of the whole recording, RibbitStream keeps only
+    the audio samples that don't yet fill a spectrogram column and the
+    net amplitude of the columns that are still needed for unscored
+    windows. Memory use is therefore independent of the recording's length.
+
+    Pass consecutive chunks of audio to push(), which returns the scores of
+    the windows completed by each chunk, then call flush() once at the end
+    of the audio to score the final window. The scores and times are the
+    same as running ribbit() on the spectrogram of the whole recording.
+
+    Args:
+        sample_rate: sample rate of the audio in Hz
+        signal_band, pulse_rate_range, window_len, noise_bands, window_hop,
+            final_window: see ribbit()
+        window_type, window_samples, overlap_samples, decibel_limits: see
+            Spectrogram.from_audio()
+    """
+
+    def __init__(
+        self,
+        sample_rate,
+        signal_band,
+        pulse_rate_range,
+        window_len,
+        noise_bands=None,
+        window_hop=None,
+        final_window="drop",
+        window_type="hann",
+        window_samples=512,
+        overlap_samples=256,
+        decibel_limits=(-100, -20),
+    ):
+        if final_window not in FINAL_WINDOW_OPTIONS:
+            raise ValueError(
+                f"final_window should be one of {FINAL_WINDOW_OPTIONS}. Got {final_window}"
             )
-        # Make psd (Power spectral density or power spectrum of x) and find max
-        pulse_score = calculate_pulse_score(
-            window, sample_frequency_of_spec, pulse_rate_range, plot
+        self.sample_rate = sample_rate
+        self.signal_band = signal_band
+        self.pulse_rate_range = pulse_rate_range
+        self.noise_bands = noise_bands
+        self.final_window = final_window
+        self.spectrogram_kwargs = dict(
+            window_type=window_type,
+            window_samples=window_samples,
+            overlap_samples=overlap_samples,
+            decibel_limits=decibel_limits,
         )
 
-        # save results
-        pulse_scores.append(pulse_score)
-        window_start_times.append(start_sample / sample_frequency_of_spec)
-
-        # update start_sample
-        start_sample = (
-            end_sample
-        )  # end sample was excluded so use it as first sample in next window
+        self.column_hop = window_samples - overlap_samples
+        self.column_rate = sample_rate / self.column_hop
+        self.n_samples_per_window = _samples_per_window(window_len, self.column_rate)
+        self.n_samples_per_hop = self.n_samples_per_window
+        if window_hop is not None:
+            self.n_samples_per_hop = _samples_per_window(
+                window_hop, self.column_rate, name="window_hop"
+            )
 
-    return pulse_scores, window_start_times
+        # audio samples from the start of the next spectrogram column
+        self._samples = np.zeros(0)
+        # net amplitude from spectrogram column self._amplitude_start
+        self._amplitude = np.zeros(0)
+        self._amplitude_start = 0
+        self._n_columns = 0
+        self._n_windows = 0
+
+    def push(self, samples):
+        """ Add a chunk of audio
+
+        Args:
+            samples: array of audio samples following the previous chunk
+
+        Returns:
+            array of pulse scores for the windows completed by this chunk
+            array of start times (in seconds) of these windows
+        """
+        self._samples = np.concatenate([self._samples, samples])
+
+        window_samples = self.spectrogram_kwargs["window_samples"]
+        n_columns = max(0, (len(self._samples) - window_samples) // self.column_hop + 1)
+        if n_columns > 0:
+            used_samples = (n_columns - 1) * self.column_hop + window_samples
+            spectrogram = Spectrogram.from_audio(
+                Audio(self._samples[:used_samples], self.sample_rate),
+                **self.spectrogram_kwargs,
+            )
+            amplitude = spectrogram.net_amplitude(self.signal_band, self.noise_bands)
+            self._amplitude = np.concatenate([self._amplitude, amplitude])
+            self._samples = self._samples[n_columns * self.column_hop :]
+            self._n_columns += n_columns
+
+        # score the windows that are now complete
+        n_complete_windows = 0
+        if self._n_columns >= self.n_samples_per_window:
+            n_complete_windows = (
+                self._n_columns - self.n_samples_per_window
+            ) // self.n_samples_per_hop + 1
+        window_indices = np.arange(self._n_windows, n_complete_windows)
+        start_samples = window_indices * self.n_samples_per_hop
+        pulse_scores = self._score(start_samples)
+        self._n_windows = n_complete_windows
+
+        # keep the amplitude needed for the next window, or for a final
+        # window ending at the last column
+        keep_from = min(
+            self._n_windows * self.n_samples_per_hop,
+            max(0, self._n_columns - self.n_samples_per_window),
+        )
+        self._amplitude = self._amplitude[keep_from - self._amplitude_start :]
+        self._amplitude_start = keep_from
+
+        return pulse_scores, start_samples / self.column_rate
+
+    def flush(self):
+        """ Score the final window at the end of the audio
+
+        Returns:
+            array of pulse scores of the final window (empty, unless
+            final_window is "pad" or "shift" and the audio doesn't end at
+            the end of a window)
+            array of start times (in seconds) of the final window
+        """
+        start_samples = _window_start_samples(
+            self._n_columns,
+            self.n_samples_per_window,
+            self.n_samples_per_hop,
+            self.final_window,
+        )[self._n_windows :]
+        pulse_scores = self._score(start_samples)
+        self._n_windows += len(start_samples)
+        return pulse_scores, start_samples / self.column_rate
+
+    def _score(self, start_samples):
+        """ score windows starting at start_samples (in spectrogram columns)
+        """
+        if len(start_samples) == 0:
+            return np.zeros(0)
+        offsets = start_samples - self._amplitude_start
+        # a padded final window extends past the last column
+        padding = max(0, offsets[-1] + self.n_samples_per_window - len(self._amplitude))
+        amplitude = np.pad(self._amplitude, (0, padding))
+        windows = sliding_windows(amplitude, self.n_samples_per_window)[offsets]
+        return calculate_pulse_scores(windows, self.column_rate, self.pulse_rate_range)
+
+
+def ribbit_stream(
+    path,
+    signal_band,
+    pulse_rate_range,
+    window_len,
+    noise_bands=None,
+    window_hop=None,
+    final_window="drop",
+    chunk_duration=60,
+    sample_rate=None,
+    spectrogram_kwargs=None,
+):
+    """ Run RIBBIT on an audio file without loading the whole file
 
+    Reads the file in chunks with Audio.stream and scores them with
+    RibbitStream, so memory use doesn't depend on the length of the file.
 
-def pulse_finder_species_set(spec, species_df, window_len="from_df", plot=False):
+    Args:
+        path: path to an audio file readable by soundfile
+        signal_band, pulse_rate_range, window_len, noise_bands, window_hop,
+            final_window: see ribbit()
+        chunk_duration: duration in seconds of audio read at a time [default: 60]
+        sample_rate: resample audio to this sample rate, or None to use the
+            file's sample rate [default: None]
+        spectrogram_kwargs: dictionary of arguments to Spectrogram.from_audio
+            (window_type, window_samples, overlap_samples, decibel_limits)
+            [default: None]
+
+    Returns:
+        array of pulse_score: pulse score (float) for each time window
+        array of time: start time of each window
+    """
+    stream = None
+    pulse_scores = []
+    window_start_times = []
+    for chunk in Audio.stream(path, chunk_duration, sample_rate=sample_rate):
+        if stream is None:
+            stream = RibbitStream(
+                chunk["clip"].sample_rate,
+                signal_band,
+                pulse_rate_range,
+                window_len,
+                noise_bands=noise_bands,
+                window_hop=window_hop,
+                final_window=final_window,
+                **(spectrogram_kwargs or {}),
+            )
+        scores, times = stream.push(chunk["clip"].samples)
+        pulse_scores.append(scores)
+        window_start_times.append(times)
+
+    if stream is None:
+        return np.zeros(0), np.zeros(0)
+    scores, times = stream.flush()
+    pulse_scores.append(scores)
+    window_start_times.append(times)
+    return np.concatenate(pulse_scores), np.concatenate(window_start_times)
+
+
+def pulse_finder_species_set(
+    spec,
+    species_df,
+    window_len="from_df",
+    plot=False,
+    window_hop=None,
+    final_window="drop",
+):
     """ perform windowed pulse finding (ribbit) on one file for each species in a set
 
+    All species are scored together: band amplitudes are computed from one
+    cumulative sum of the spectrogram over frequency (see BandAmplitudes),
+    and species with the same window length share batched PSD computations.
+    With plot=True, each species is scored separately with ribbit().
+
     Args:
         spec: opensoundscape.Spectrogram object
         species_df: a dataframe describing species by their pulsed calls. 
@@ -172,6 +571,9 @@ def pulse_finder_species_set(spec, species_df, window_len="from_df", plot=False)
         window_len: length of analysis window, in seconds. 
                     Or 'from_df' (default): read from dataframe. 
                     or 'dynamic': adjust window size based on pulse_rate
+        window_hop: time in seconds between the starts of consecutive windows,
+                    or None (default) for each species' window length (no overlap)
+        final_window: "drop" (default), "pad" or "shift", see ribbit()
     
     Returns: 
         the same dataframe with a "score" (max score) column and "time_of_score" column
@@ -180,11 +582,9 @@ def pulse_finder_species_set(spec, species_df, window_len="from_df", plot=False)
     species_df = species_df.copy()
     species_df = species_df.set_index(species_df.columns[0], drop=True)
 
-    species_df["score"] = [[] for i in range(len(species_df))]
-    species_df["t"] = [[] for i in range(len(species_df))]
-    species_df["max_score"] = [np.nan for i in range(len(species_df))]
-
-    for i, row in species_df.iterrows():
+    # collect the parameters of each species that can be analyzed
+    species_params = {}
+    for position, (_, row) in enumerate(species_df.iterrows()):
 
         # we can't analyze pulse rates of 0 or NaN
         if isNan(row.pulse_rate_low) or row.pulse_rate_low == 0:
@@ -194,17 +594,19 @@ def pulse_finder_species_set(spec, species_df, window_len="from_df", plot=False)
         pulse_rate_range = [row.pulse_rate_low, row.pulse_rate_high]
 
         if window_len == "from_df":
-            window_len = row.window_length
+            species_window_len = row.window_length
         elif window_len == "dynamic":
             # dynamically choose the window length based on the species pulse-rate
             # try to capture ~4-10 pulses
             min_len = 0.5  # sec
             max_len = 10  # sec
             target_n_pulses = 5
-            window_len = bound(
+            species_window_len = bound(
                 target_n_pulses / pulse_rate_range[0], [min_len, max_len]
             )
-        # otherwise, use the numerical value provided for window length
+        else:
+            # otherwise, use the numerical value provided for window length
+            species_window_len = window_len
 
         signal_band = [row.low_f, row.high_f]  # changed from low_f, high_f
 
@@ -214,28 +616,107 @@ def pulse_finder_species_set(spec, species_df, window_len="from_df", plot=False)
             if "reject_low2" in species_df.columns and not isNan(row.reject_low2):
                 noise_bands.append([row.reject_low2, row.reject_high2])
 
-        # score this species for each window using ribbit
-        if plot:
-            print(f"{row.name}")
-        pulse_scores, window_start_times = ribbit(
-            spec, signal_band, pulse_rate_range, window_len, noise_bands, plot
+        species_params[position] = (
+            signal_band,
+            pulse_rate_range,
+            species_window_len,
+            noise_bands,
         )
 
-        # add the scores to the species df
-        species_df.at[i, "score"] = pulse_scores
-        species_df.at[i, "t"] = window_start_times
-        species_df.at[i, "max_score"] = (
-            max(pulse_scores) if len(pulse_scores) > 0 else np.nan
-        )
-        species_df.at[i, "time_of_max_score"] = (
-            window_start_times[np.argmax(pulse_scores)]
-            if len(pulse_scores) > 0
-            else np.nan
+    scores = [np.array([]) for _ in range(len(species_df))]
+    times = [np.array([]) for _ in range(len(species_df))]
+
+    if plot:
+        # score each species for each window using ribbit
+        for position, params in species_params.items():
+            print(f"{species_df.index[position]}")
+            scores[position], times[position] = ribbit(
+                spec,
+                *params,
+                plot=plot,
+                window_hop=window_hop,
+                final_window=final_window,
+            )
+    else:
+        _score_species_set(
+            spec, species_params, scores, times, window_hop, final_window
         )
 
+    # add the scores to the species df
+    species_df["score"] = pd.Series(scores, index=species_df.index, dtype=object)
+    species_df["t"] = pd.Series(times, index=species_df.index, dtype=object)
+    species_df["max_score"] = [np.max(s) if len(s) > 0 else np.nan for s in scores]
+    species_df["time_of_max_score"] = [
+        t[np.argmax(s)] if len(s) > 0 else np.nan for s, t in zip(scores, times)
+    ]
+
     return species_df
 
 
+def _score_species_set(
+    spec, species_params, scores, times, window_hop, final_window, max_psd_bytes=2 ** 27
+):
+    """ score many species in a batch, filling in lists of scores and times
+
+    band amplitudes come from one cumulative sum over frequency, and the
+    species sharing a window length and hop are scored with one call to
+    scipy.signal.welch per batch of at most max_psd_bytes of PSD values
+    """
+    band_amplitudes = BandAmplitudes(spec)
+    sample_rate = _spectrogram_sample_rate(spec)
+    nfft = 1024
+
+    positions_by_window = defaultdict(list)
+    for position, (_, _, window_len, _) in species_params.items():
+        n_samples_per_window = _samples_per_window(window_len, sample_rate)
+        n_samples_per_hop = n_samples_per_window
+        if window_hop is not None:
+            n_samples_per_hop = _samples_per_window(
+                window_hop, sample_rate, name="window_hop"
+            )
+        positions_by_window[n_samples_per_window, n_samples_per_hop].append(position)
+
+    for window_samples, positions in positions_by_window.items():
+        n_samples_per_window, n_samples_per_hop = window_samples
+        start_samples = _window_start_samples(
+            len(spec.times), n_samples_per_window, n_samples_per_hop, final_window
+        )
+        start_times = start_samples / sample_rate
+        for position in positions:
+            times[position] = start_times
+        if len(start_samples) == 0:
+            continue
+
+        psd_bytes_per_species = len(start_samples) * (nfft // 2 + 1) * 8
+        batch_size = max(1, max_psd_bytes // psd_bytes_per_species)
+        for batch_start in range(0, len(positions), batch_size):
+            batch = positions[batch_start : batch_start + batch_size]
+            amplitudes = np.stack(
+                [
+                    band_amplitudes.net_amplitude(
+                        species_params[p][0], species_params[p][3]
+                    )
+                    for p in batch
+                ]
+            )
+            windows, _ = _windows(
+                amplitudes, n_samples_per_window, n_samples_per_hop, final_window
+            )
+            f, psd = signal.welch(windows, fs=sample_rate, nfft=nfft, axis=-1)
+
+            # (n_species, n_frequencies) mask of each species' pulse rate range
+            pulse_rate_ranges = np.array([species_params[p][1] for p in batch])
+            in_pulse_rate_range = (pulse_rate_ranges[:, [0]] < f) & (
+                f < pulse_rate_ranges[:, [1]]
+            )
+            # psd is non-negative, so species with an empty range score 0
+            batch_scores = np.where(in_pulse_rate_range[:, np.newaxis, :], psd, 0).max(
+                axis=-1
+            )
+            for p, species_scores in zip(batch, batch_scores):
+                scores[p] = species_scores
+
+
 def summarize_top_scores(audio_files, list_of_result_dfs, scale_factor=1.0):
     """ find the highest score for each file and each species, and put them in a dataframe 
     
@@ -255,19 +736,178 @@ def summarize_top_scores(audio_files, list_of_result_dfs, scale_factor=1.0):
             "The length of audio_files must match the length of list_of_results_dfs"
         )
 
-    import pandas as pd
+    species = pd.Index(list_of_result_dfs[0].iloc[:, 0])
+    top_scores = np.empty((len(audio_files), len(species)))
+    for i, results_df in enumerate(list_of_result_dfs):
+        results_df = results_df.set_index(results_df.columns[0])
+        top_scores[i] = results_df["max_score"].reindex(species).values
 
     top_species_scores_df = pd.DataFrame(
-        index=audio_files, columns=list_of_result_dfs[0].iloc[:, 0]
+        top_scores * scale_factor, index=audio_files, columns=species
     )
     top_species_scores_df.index.name = "file"
 
-    for i, f in enumerate(audio_files):
-        results_df = list_of_result_dfs[i]
-        results_df = results_df.set_index(results_df.columns[0])
-        for sp in results_df.index:
-            top_species_scores_df.at[f, sp] = (
-                results_df.at[sp, "max_score"] * scale_factor
+    return top_species_scores_df
+
+
+def _ribbit_file(
+    path,
+    species_df,
+    window_len,
+    window_hop,
+    final_window,
+    audio_kwargs,
+    spectrogram_kwargs,
+):
+    """ run pulse_finder_species_set on one file for ribbit_batch
+
+    Returns:
+        path and a dictionary of columns, or path and the error raised
+    """
+    try:
+        audio = Audio.from_file(path, **audio_kwargs)
+        spec = Spectrogram.from_audio(audio, **spectrogram_kwargs)
+        results = pulse_finder_species_set(
+            spec,
+            species_df,
+            window_len=window_len,
+            window_hop=window_hop,
+            final_window=final_window,
+        )
+    except Exception as e:
+        return path, e
+    return (
+        path,
+        {
+            "file": [str(path)] * len(results),
+            "species": results.index.values,
+            "max_score": results["max_score"].values,
+            "time_of_max_score": results["time_of_max_score"].values,
+        },
+    )
+
+
+def _completed_files(output_path, n_species):
+    """ read the results of files that were completely written to output_path
+
+    rows of incompletely written files are removed from output_path
+    """
+    results = pd.read_csv(output_path, dtype={"file": str, "species": str})
+    rows_per_file = results["file"].value_counts()
+    completed = set(rows_per_file.index[rows_per_file == n_species])
+    is_completed = results["file"].isin(completed).values
+    if not is_completed.all():
+        results[is_completed].to_csv(output_path, index=False)
+    return completed
+
+
+def ribbit_batch(
+    audio_files,
+    species_df,
+    output_path,
+    window_len="from_df",
+    window_hop=None,
+    final_window="drop",
+    num_workers=1,
+    audio_kwargs=None,
+    spectrogram_kwargs=None,
+    resume=True,
+):
+    """ run RIBBIT for a set of species on many audio files in parallel
+
+    Each file is loaded, converted to a spectrogram and scored with
+    pulse_finder_species_set in a pool of worker processes. As each file
+    finishes, its results are appended to a CSV file with the columns
+    file | species | max_score | time_of_max_score, so that an interrupted
+    run can be resumed: files already in output_path are skipped.
+
+    Files that can't be analyzed (for instance, because they can't be loaded)
+    raise a warning and are not written to output_path, so they are retried
+    when resuming.
+
+    Args:
+        audio_files: a list of paths to audio files, or a directory to search
+            recursively for wav and mp3 files
+        species_df: a dataframe describing species by their pulsed calls,
+            see pulse_finder_species_set
+        output_path: path of the CSV file to write results to
+        window_len: length of analysis window, see pulse_finder_species_set
+            [default: 'from_df']
+        window_hop: time between the starts of consecutive windows, see
+            pulse_finder_species_set [default: None]
+        final_window: "drop", "pad" or "shift", see ribbit() [default: "drop"]
+        num_workers: number of worker processes [default: 1]
+        audio_kwargs: dictionary of arguments to Audio.from_file [default: None]
+        spectrogram_kwargs: dictionary of arguments to Spectrogram.from_audio
+            [default: None]
+        resume: if True, skip files that are already in output_path.
+            If False, overwrite output_path [default: True]
+
+    Returns:
+        a dataframe of the highest score for each species (columns)
+        in each file (rows), like summarize_top_scores
+    """
+    if isinstance(audio_files, (str, Path)) and Path(audio_files).is_dir():
+        directory = Path(audio_files)
+        audio_files = sorted(
+            set(
+                path
+                for extension in AUDIO_EXTENSIONS
+                for path in directory.rglob(f"*.{extension}")
             )
+        )
+    audio_files = [str(path) for path in audio_files]
+    output_path = Path(output_path)
+    species = species_df.iloc[:, 0].astype(str).values
+
+    completed = set()
+    if resume and output_path.exists():
+        completed = _completed_files(output_path, len(species))
+    else:
+        pd.DataFrame(columns=RIBBIT_BATCH_COLUMNS).to_csv(output_path, index=False)
+    to_analyze = [path for path in audio_files if path not in completed]
+
+    analyze = partial(
+        _ribbit_file,
+        species_df=species_df,
+        window_len=window_len,
+        window_hop=window_hop,
+        final_window=final_window,
+        audio_kwargs=audio_kwargs or {},
+        spectrogram_kwargs=spectrogram_kwargs or {},
+    )
 
+    with open(output_path, "a") as f:
+        if num_workers > 1:
+            with Pool(num_workers) as pool:
+                for path, result in pool.imap_unordered(analyze, to_analyze):
+                    _write_ribbit_result(f, path, result)
+        else:
+            for path, result in map(analyze, to_analyze):
+                _write_ribbit_result(f, path, result)
+
+    # build the summary table from the columns of all results
+    results = pd.read_csv(output_path, dtype={"file": str, "species": str})
+    file_index = pd.Index(audio_files)
+    species_index = pd.Index(species)
+    rows = file_index.get_indexer(results["file"])
+    columns = species_index.get_indexer(results["species"])
+    keep = (rows >= 0) & (columns >= 0)
+    top_scores = np.full((len(file_index), len(species_index)), np.nan)
+    top_scores[rows[keep], columns[keep]] = results["max_score"].values[keep]
+
+    top_species_scores_df = pd.DataFrame(
+        top_scores, index=file_index, columns=species_index
+    )
+    top_species_scores_df.index.name = "file"
     return top_species_scores_df
+
+
+def _write_ribbit_result(f, path, result):
+    if isinstance(result, Exception):
+        warnings.warn(f"RIBBIT failed on {path}: {result}")
+        return
+    pd.DataFrame(result, columns=RIBBIT_BATCH_COLUMNS).to_csv(
+        f, header=False, index=False
+    )
+    f.flush()
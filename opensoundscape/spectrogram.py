@@ -6,9 +6,36 @@ from scipy import signal
 import numpy as np
 from opensoundscape.audio import Audio
 from opensoundscape.helpers import min_max_scale, linear_scale
+from opensoundscape.stft_cache import get_window, get_frequencies
+from opensoundscape.precision import resolve_dtype
 import warnings
 
 
+def _to_limited_decibels(spectrogram, decibel_limits):
+    """ Convert a power spectrogram to decibels and limit the decibel range
+
+    Operates in place on `spectrogram`, which can have any number of dimensions
+
+    Args:
+        spectrogram: array of (non-negative) spectrogram values
+        decibel_limits: (min,max) dB values; lower values are set to min,
+            higher values are set to max
+
+    Returns:
+        the same array, converted to limited decibel values
+    """
+    # convert to decibels
+    # -> zeros become -np.inf, which are mapped to min_db by the clipping below
+    with np.errstate(divide="ignore"):
+        np.log10(spectrogram, out=spectrogram)
+    spectrogram *= 10
+
+    # limit the decibel range (-100 to -20 dB by default)
+    # values below lower limit set to lower limit, values above upper limit set to uper limit
+    min_db, max_db = decibel_limits
+    return np.clip(spectrogram, min_db, max_db, out=spectrogram)
+
+
 class Spectrogram:
     """ Immutable spectrogram container
     """
@@ -60,6 +87,7 @@ class Spectrogram:
         window_samples=512,
         overlap_samples=256,
         decibel_limits=(-100, -20),
+        dtype=None,
     ):
         """
         create a Spectrogram object from an Audio object
@@ -69,6 +97,7 @@ class Spectrogram:
             window_samples=512: number of audio samples per spectrogram window (pixel)
             overlap_samples=256: number of samples shared by consecutive windows
             decibel_limits = (-100,-20) : limit the dB values to (min,max) (lower values set to min, higher values set to max)
+            dtype=None: floating point dtype of the spectrogram, None uses opensoundscape.get_default_dtype()
 
         Returns:
             opensoundscape.spectrogram.Spectrogram object
@@ -76,26 +105,17 @@ class Spectrogram:
         if not isinstance(audio, Audio):
             raise TypeError("Class method expects Audio class as input")
 
-        frequencies, times, spectrogram = signal.spectrogram(
-            audio.samples,
+        _, times, spectrogram = signal.spectrogram(
+            audio.samples.astype(resolve_dtype(dtype), copy=False),
             audio.sample_rate,
-            window=window_type,
+            window=get_window(window_type, window_samples),
             nperseg=window_samples,
             noverlap=overlap_samples,
             scaling="spectrum",
         )
+        frequencies = get_frequencies(audio.sample_rate, window_samples)
 
-        # convert to decibels
-        # -> avoid RuntimeWarning by setting negative values to -np.inf (mapped to min_db later)
-        spectrogram = 10 * np.log10(
-            spectrogram, where=spectrogram > 0, out=np.full(spectrogram.shape, -np.inf)
-        )
-
-        # limit the decibel range (-100 to -20 dB by default)
-        # values below lower limit set to lower limit, values above upper limit set to uper limit
-        min_db, max_db = decibel_limits
-        spectrogram[spectrogram > max_db] = max_db
-        spectrogram[spectrogram < min_db] = min_db
+        spectrogram = _to_limited_decibels(spectrogram, decibel_limits)
 
         new_obj = cls(spectrogram, frequencies, times)
         super(Spectrogram, new_obj).__setattr__("decibel_limits", decibel_limits)
@@ -193,8 +213,7 @@ class Spectrogram:
         """
         _spec = self.spectrogram
 
-        _spec[_spec > max_db] = max_db
-        _spec[_spec < min_db] = min_db
+        np.clip(_spec, min_db, max_db, out=_spec)
 
         return Spectrogram(_spec, self.frequencies, self.times)
 
@@ -332,7 +351,7 @@ class Spectrogram:
                 )
 
             # negative signal shouldn't be kept, because it means reject was stronger than signal. Zero it:
-            net_amplitude = [max(0, s) for s in net_amplitude]
+            net_amplitude = np.maximum(net_amplitude, 0)
 
         return net_amplitude
 
@@ -368,3 +387,142 @@ class Spectrogram:
             image = image.resize(shape)
 
         return image
+
+    def to_tensor(self, shape=None, spec_range=(-100, -20)):
+        """
+        create a 1-channel float tensor from spectrogram
+        equivalent to `torchvision.transforms.ToTensor()(self.to_image(shape, mode="L"))`,
+        without the conversion to a PIL image and its rounding to integers:
+        values are linearly rescaled from db_range to [1, 0] and clipped
+
+        Args:
+            shape=None: tuple of image dimensions (width, height), eg (224,224)
+            spec_range=(-100, -20): the lowest and highest possible values in the spectrogram
+
+        Returns:
+            torch.Tensor of shape (1, height, width)
+        """
+        import torch
+
+        # rescale spec_range to [1, 0], upside-down like to_image
+        array = linear_scale(self.spectrogram, in_range=spec_range, out_range=(1, 0))
+        array = np.clip(array[::-1], 0, 1).astype(np.float32)
+        if shape is not None and not _interpolate_supports_antialias():
+            # PyTorch < 1.11: resize with PIL, as a 32-bit float image
+            from PIL import Image
+
+            image = Image.fromarray(array, mode="F")
+            array = np.asarray(image.resize(shape, resample=Image.BICUBIC))
+            return torch.from_numpy(np.clip(array, 0, 1))[None]
+
+        tensor = torch.from_numpy(np.ascontiguousarray(array))[None]
+        if shape is not None:
+            # antialiased bicubic interpolation, as used by PIL's resize
+            tensor = torch.nn.functional.interpolate(
+                tensor[None],
+                size=(shape[1], shape[0]),
+                mode="bicubic",
+                align_corners=False,
+                antialias=True,
+            )[0].clamp_(0, 1)
+
+        return tensor
+
+
+def _interpolate_supports_antialias():
+    """ Whether torch.nn.functional.interpolate has antialias (PyTorch >= 1.11)
+    """
+    import inspect
+    import torch
+
+    parameters = inspect.signature(torch.nn.functional.interpolate).parameters
+    return "antialias" in parameters
+
+
+class SpectrogramBatch:
+    """ Immutable container for spectrograms of many equal-length clips
+
+    Stores the spectrograms of a batch of clips in a single 3-d array, sharing
+    one frequency and one time axis. Indexing a SpectrogramBatch returns a
+    Spectrogram for one clip (a view of the batch array, not a copy).
+    """
+
+    __slots__ = ("frequencies", "times", "spectrograms", "decibel_limits")
+
+    def __init__(self, spectrograms, frequencies, times, decibel_limits=(-100, -20)):
+        if not isinstance(spectrograms, np.ndarray) or spectrograms.ndim != 3:
+            raise TypeError(
+                f"SpectrogramBatch.spectrograms should be a np.ndarray [shape=(k, n, m)]. Got {spectrograms.__class__}"
+            )
+        if spectrograms.shape[1:] != (frequencies.shape[0], times.shape[0]):
+            raise TypeError(
+                f"Dimension mismatch, spectrograms.shape: {spectrograms.shape}, frequencies.shape: {frequencies.shape}, times.shape: {times.shape}"
+            )
+
+        super(SpectrogramBatch, self).__setattr__("frequencies", frequencies)
+        super(SpectrogramBatch, self).__setattr__("times", times)
+        super(SpectrogramBatch, self).__setattr__("spectrograms", spectrograms)
+        super(SpectrogramBatch, self).__setattr__("decibel_limits", decibel_limits)
+
+    @classmethod
+    def from_samples(
+        cls,
+        samples,
+        sample_rate,
+        window_type="hann",
+        window_samples=512,
+        overlap_samples=256,
+        decibel_limits=(-100, -20),
+        dtype=None,
+    ):
+        """
+        create a SpectrogramBatch from a 2-d array of audio clips
+
+        All clips are transformed with a single call to scipy.signal.spectrogram,
+        and the decibel conversion is done in place on the whole batch.
+        The parameters and results for each clip are the same as
+        Spectrogram.from_audio.
+
+        Args:
+            samples: array of shape (n_clips, clip_samples), for instance from
+                Audio.split_samples()
+            sample_rate: sample rate of the clips in Hz
+            window_type="hann": see scipy.signal.spectrogram docs for description of window parameter
+            window_samples=512: number of audio samples per spectrogram window (pixel)
+            overlap_samples=256: number of samples shared by consecutive windows
+            decibel_limits = (-100,-20) : limit the dB values to (min,max) (lower values set to min, higher values set to max)
+            dtype=None: floating point dtype of the spectrograms, None uses opensoundscape.get_default_dtype()
+
+        Returns:
+            opensoundscape.spectrogram.SpectrogramBatch object
+        """
+        if not isinstance(samples, np.ndarray) or samples.ndim != 2:
+            raise TypeError("Class method expects a 2-d array of samples as input")
+
+        _, times, spectrograms = signal.spectrogram(
+            samples.astype(resolve_dtype(dtype), copy=False),
+            sample_rate,
+            window=get_window(window_type, window_samples),
+            nperseg=window_samples,
+            noverlap=overlap_samples,
+            scaling="spectrum",
+            axis=-1,
+        )
+        frequencies = get_frequencies(sample_rate, window_samples)
+        spectrograms = _to_limited_decibels(spectrograms, decibel_limits)
+
+        return cls(spectrograms, frequencies, times, decibel_limits)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("SpectrogramBatch's cannot be modified")
+
+    def __repr__(self):
+        return f"<SpectrogramBatch(spectrograms={self.spectrograms.shape}, frequencies={self.frequencies.shape}, times={self.times.shape})>"
+
+    def __len__(self):
+        return self.spectrograms.shape[0]
+
+    def __getitem__(self, idx):
+        new_obj = Spectrogram(self.spectrograms[idx], self.frequencies, self.times)
+        super(Spectrogram, new_obj).__setattr__("decibel_limits", self.decibel_limits)
+        return new_obj
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+""" stft_cache.py: Process-wide caches for spectrogram windows and filterbanks
+
+Spectrogram.from_audio and MelSpectrogram.from_audio are usually called many
+times with the same parameters (for instance, once per sample in a Dataset).
+The window functions, frequency vectors and mel filterbanks they need only
+depend on those parameters, so they are computed once and kept in
+least-recently-used caches of size CACHE_SIZE.
+
+The cached arrays are read-only, since they are shared between callers.
+Each process (including each DataLoader worker) has its own caches.
+"""
+
+from functools import lru_cache
+import numpy as np
+from scipy import signal
+
+CACHE_SIZE = 32
+
+
+def get_window(window, window_samples):
+    """ Get a (cached) window function
+
+    Args:
+        window: name of a window function, or a tuple of name and parameters
+            (see scipy.signal.get_window). Arrays are returned unchanged.
+        window_samples: length of the window in samples
+
+    Returns:
+        read-only array of window values
+    """
+    if isinstance(window, (str, tuple)):
+        return _window(window, window_samples)
+    return window
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def _window(window, window_samples):
+    window = signal.get_window(window, window_samples, fftbins=True)
+    window.setflags(write=False)
+    return window
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def get_frequencies(sample_rate, n_fft):
+    """ Get the (cached) frequencies in Hz of the bins of a one-sided FFT
+
+    Args:
+        sample_rate: sample rate of the signal in Hz
+        n_fft: length of the FFT
+
+    Returns:
+        read-only array of frequencies, same as scipy.signal.spectrogram returns
+    """
+    frequencies = np.fft.rfftfreq(n_fft, 1 / sample_rate)
+    frequencies.setflags(write=False)
+    return frequencies
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def get_mel_filterbank(sample_rate, n_fft, n_mels, fmin, fmax, htk):
+    """ Get a (cached) mel filterbank matrix
+
+    Args:
+        sample_rate: sample rate of the signal in Hz
+        n_fft: length of the FFT
+        n_mels: number of mel bands
+        fmin: lowest frequency (in Hz)
+        fmax: highest frequency (in Hz)
+        htk: use HTK formula instead of Slaney
+
+    Returns:
+        read-only array of shape (n_mels, 1 + n_fft/2), see librosa.filters.mel
+    """
+    from librosa.filters import mel
+
+    filterbank = mel(
+        sr=sample_rate, n_fft=n_fft, n_mels=n_mels, fmin=fmin, fmax=fmax, htk=htk
+    )
+    filterbank.setflags(write=False)
+    return filterbank
+
+
+def cache_info():
+    """ Get hit and miss counters for each cache
+
+    Returns:
+        dictionary of functools.lru_cache CacheInfo (hits, misses, maxsize, currsize)
+        with keys "window", "frequencies" and "mel_filterbank"
+    """
+    return {
+        "window": _window.cache_info(),
+        "frequencies": get_frequencies.cache_info(),
+        "mel_filterbank": get_mel_filterbank.cache_info(),
+    }
+
+
+def clear_cache():
+    """ Empty all caches and reset their counters
+    """
+    _window.cache_clear()
+    get_frequencies.cache_clear()
+    get_mel_filterbank.cache_clear()
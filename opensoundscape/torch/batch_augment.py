@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+""" batch_augment.py: Augment and normalize whole batches of spectrograms
+
+SingleTargetAudioDataset applies overlays, blur and noise to one sample at
+a time in __getitem__. When it is created with `batch_augment=True`, it
+instead returns each spectrogram as a 1-channel tensor with values in
+[0, 1], and BatchAugment applies the same augmentations to the whole
+(B, 1, H, W) batch with tensor operations, then normalizes it.
+
+Overlays are mixed from within the batch (mixup-style): the overlay of a
+sample is another sample of the batch with a different label (or with the
+label overlay_class), rather than a clip loaded from another file.
+"""
+
+import torch
+
+from opensoundscape.datasets import gaussian_blur
+
+
+class BatchAugment(torch.nn.Module):
+    """ Augment and normalize a batch of 1-channel spectrogram tensors
+
+    The parameters have the same meaning as those of SingleTargetAudioDataset.
+    In training mode, the batch is overlaid, noised and time split, then
+    normalized. In eval mode (`.eval()`), it is only normalized. The output
+    has 3 channels, which are an expanded view of the single channel.
+
+    Args:
+        max_overlay_num: The maximum number of overlays per sample, each with
+            probability overlay_prob [default: 0]
+        overlay_prob: Probability of each overlay [default: 0.2]
+        overlay_weight: The weight of the overlaid sample, 'random' for a
+            weight between 0.2 and 0.5 for each overlay [default: 'random']
+        overlay_class: Label of the samples to draw overlays from, or
+            'different' to draw them from samples with a different label.
+            Samples with no such sample in the batch are not overlaid
+            [default: 'different']
+        add_noise: Randomly translate the samples and jitter their brightness
+            and contrast, as in SingleTargetAudioDataset [default: False]
+        time_split: Rotate each sample in time from a random point, as
+            `opensoundscape.transforms.time_split` [default: False]
+        mean: mean for normalization [default: 0.5]
+        std_dev: standard deviation for normalization [default: 0.5]
+    """
+
+    def __init__(
+        self,
+        max_overlay_num=0,
+        overlay_prob=0.2,
+        overlay_weight="random",
+        overlay_class="different",
+        add_noise=False,
+        time_split=False,
+        mean=0.5,
+        std_dev=0.5,
+    ):
+        super().__init__()
+        if (overlay_weight != "random") and (not 0 < overlay_weight < 1):
+            raise ValueError(
+                f"overlay_weight not in 0<overlay_weight<1 (given overlay_weight: {overlay_weight})"
+            )
+        self.max_overlay_num = max_overlay_num
+        self.overlay_prob = overlay_prob
+        self.overlay_weight = overlay_weight
+        self.overlay_class = overlay_class
+        self.add_noise = add_noise
+        self.time_split = time_split
+        self.mean = mean
+        self.std_dev = std_dev
+
+    def forward(self, X, labels=None):
+        """ Augment and normalize a batch
+
+        Args:
+            X: tensor of shape (B, 1, H, W) with values in [0, 1]
+            labels: tensor of the B labels, required for overlays
+
+        Returns:
+            tensor of shape (B, 3, H, W)
+        """
+        if self.training:
+            if self.max_overlay_num > 0:
+                if labels is None:
+                    raise ValueError("labels must be given to use max_overlay_num > 0")
+                X = self.overlay(X, labels.reshape(-1))
+            if self.add_noise:
+                X = self.noise(X)
+            if self.time_split:
+                X = self.split_time(X)
+        X = (X - self.mean) / self.std_dev
+        return X.expand(-1, 3, -1, -1)
+
+    def overlay(self, X, labels):
+        """ Blend blurred samples of the batch onto other samples
+
+        Each sample gets up to max_overlay_num overlays, stopping at the first
+        one not drawn with probability overlay_prob.
+        """
+        batch_size = X.shape[0]
+        if self.overlay_class == "different":
+            allowed = labels[None, :] != labels[:, None]
+        else:
+            allowed = (labels == self.overlay_class)[None, :].repeat(batch_size, 1)
+            allowed.fill_diagonal_(False)
+
+        active = allowed.any(dim=1)
+        for _ in range(self.max_overlay_num):
+            active &= torch.rand(batch_size, device=X.device) < self.overlay_prob
+            num_active = int(active.sum())
+            if num_active == 0:
+                break
+            partners = torch.multinomial(allowed[active].float(), 1)[:, 0]
+
+            # blur the overlays, grouped by their radius
+            overlays = X[partners, 0]
+            radii = torch.randint(0, 8, (num_active,), device=X.device)
+            for radius in radii.unique().tolist():
+                selected = radii == radius
+                overlays[selected] = gaussian_blur(overlays[selected], radius / 10)
+
+            # Select weights; <0.5 means more emphasis on original image
+            if self.overlay_weight == "random":
+                weights = torch.randint(2, 5, (num_active,), device=X.device) / 10
+            else:
+                weights = torch.full((num_active,), self.overlay_weight)
+            weights = weights.to(X.device, X.dtype).view(-1, 1, 1, 1)
+
+            X = X.clone()
+            X[active] = torch.lerp(X[active], overlays[:, None], weights)
+        return X
+
+    def noise(self, X):
+        """ Translate samples and jitter their brightness and contrast
+
+        Each sample is translated by up to 20% of its width and 3% of its
+        height, filling with gray, then its brightness and contrast are
+        jittered by up to 30% in a random order.
+        """
+        batch_size, _, height, width = X.shape
+        device = X.device
+
+        def uniform(low, high):
+            return torch.empty(batch_size, device=device).uniform_(low, high)
+
+        dx = torch.round(uniform(-0.2 * width, 0.2 * width)).long()
+        dy = torch.round(uniform(-0.03 * height, 0.03 * height)).long()
+        rows = torch.arange(height, device=device)[None, :] - dy[:, None]
+        cols = torch.arange(width, device=device)[None, :] - dx[:, None]
+        inside = ((rows >= 0) & (rows < height))[:, :, None] & (
+            (cols >= 0) & (cols < width)
+        )[:, None, :]
+        index = (
+            rows.clamp(0, height - 1)[:, :, None] * width
+            + cols.clamp(0, width - 1)[:, None, :]
+        )
+        translated = X.reshape(batch_size, -1).gather(1, index.reshape(batch_size, -1))
+        X = torch.where(
+            inside[:, None], translated.reshape(X.shape), torch.full_like(X, 50 / 255)
+        )
+
+        brightness = uniform(0.7, 1.3).view(-1, 1, 1, 1)
+        contrast = uniform(0.7, 1.3).view(-1, 1, 1, 1)
+
+        def jitter_contrast(X):
+            mean = X.mean(dim=(1, 2, 3), keepdim=True)
+            return torch.lerp(mean.expand_as(X), X, contrast).clamp(0, 1)
+
+        brightness_first = jitter_contrast((X * brightness).clamp(0, 1))
+        contrast_first = (jitter_contrast(X) * brightness).clamp(0, 1)
+        order = torch.rand(batch_size, device=device) < 0.5
+        return torch.where(order.view(-1, 1, 1, 1), brightness_first, contrast_first)
+
+    def split_time(self, X):
+        """ Rotate each sample in time from a random point"""
+        batch_size, channels, height, width = X.shape
+        shifts = torch.randint(0, width + 1, (batch_size,), device=X.device)
+        columns = torch.arange(width, device=X.device)[None, :] + shifts[:, None]
+        columns %= width
+        index = columns[:, None, None, :].expand(-1, channels, height, -1)
+        return X.gather(3, index)
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+""" export.py: Export trained models for fast inference
+
+A model trained with `opensoundscape.torch.train.train` is saved as a state
+dictionary in `epoch-*.tar`. Predicting with it requires rebuilding the eager
+ResNet18 with torchvision. `export_model` instead writes a self-contained
+artifact, either TorchScript or ONNX, which can be loaded without
+torchvision and run with `opensoundscape.torch.predict.predict`. When
+torch.jit.freeze is available, TorchScript models are frozen, so batch
+normalization is folded into the convolutions. Otherwise they are exported
+as a plain trace.
+
+The preprocessing constants of the model (image height and width and the
+normalization mean and standard deviation) and its label dictionary are
+embedded in the artifact as metadata, and returned by `load_exported_model`.
+
+ONNX export requires the `onnx` package, and loading ONNX artifacts requires
+`onnxruntime`.
+"""
+
+import warnings
+import torch
+import yaml
+
+EXPORT_FORMATS = ["torchscript", "onnx"]
+METADATA_FILE = "metadata.yaml"
+
+
+def load_checkpoint_model(checkpoint):
+    """ Build a ResNet18 from a saved state dictionary
+
+    Input:
+        checkpoint: path to an `epoch-*.tar` file saved by `train`,
+                    or to a state dictionary saved with torch.save
+
+    Output:
+        model:      ResNet18 in eval mode, with one output per class
+        label_dict: the training dataset's label dictionary, or None if
+                    the checkpoint has no labels
+    """
+    from torchvision.models import resnet18
+
+    saved = torch.load(checkpoint, map_location="cpu")
+    if "model_state_dict" in saved:
+        state_dict = saved["model_state_dict"]
+        label_dict = yaml.safe_load(saved.get("labels_yaml", "null"))
+    else:
+        state_dict = saved
+        label_dict = None
+
+    num_classes = state_dict["fc.weight"].shape[0]
+    model = resnet18(pretrained=False)
+    model.fc = torch.nn.Linear(
+        in_features=model.fc.in_features, out_features=num_classes
+    )
+    model.load_state_dict(state_dict)
+    model.eval()
+    return model, label_dict
+
+
+def export_model(
+    checkpoint, output_path, format="torchscript", quantize=False, height=224, width=224
+):
+    """ Export a trained ResNet18 to TorchScript or ONNX
+
+    Input:
+        checkpoint:     path to an `epoch-*.tar` file saved by `train`,
+                        or to a state dictionary saved with torch.save
+        output_path:    path of the exported model, e.g. "model.pt" or "model.onnx"
+        format:         "torchscript" or "onnx" [default: "torchscript"]
+        quantize:       Quantize the weights of linear layers to int8 [default: False]
+                        - for ResNet18 this only affects the final fully connected
+                          layer, as dynamic quantization does not apply to convolutions
+                        - for ONNX, uses onnxruntime's dynamic quantization
+        height:         Height of the input images [default: 224]
+        width:          Width of the input images [default: 224]
+
+    TorchScript models are frozen with torch.jit.freeze. Versions of PyTorch
+    without it (such as 1.5) give a warning and export the unfrozen trace.
+    The "frozen" entry of the metadata records which one was exported.
+
+    Output:
+        dictionary of the metadata embedded in the exported model
+    """
+    if format not in EXPORT_FORMATS:
+        raise ValueError(f"format should be one of {EXPORT_FORMATS}. Got {format}")
+
+    model, label_dict = load_checkpoint_model(checkpoint)
+    metadata = {
+        "format": format,
+        "quantized": bool(quantize),
+        "frozen": False,
+        "height": height,
+        "width": width,
+        # the Normalize transform of SingleTargetAudioDataset
+        "mean": [0.5, 0.5, 0.5],
+        "std": [0.5, 0.5, 0.5],
+        "label_dict": label_dict,
+    }
+    example = torch.zeros(1, 3, height, width)
+
+    if format == "torchscript":
+        if quantize:
+            model = torch.quantization.quantize_dynamic(
+                model, {torch.nn.Linear}, dtype=torch.qint8
+            )
+        with torch.no_grad():
+            scripted = torch.jit.trace(model, example)
+        if hasattr(torch.jit, "freeze"):
+            scripted = torch.jit.freeze(scripted)
+            metadata["frozen"] = True
+        else:
+            warnings.warn(
+                f"torch.jit.freeze is not available in PyTorch {torch.__version__}. Exporting the model without freezing it"
+            )
+        torch.jit.save(
+            scripted,
+            str(output_path),
+            _extra_files={METADATA_FILE: yaml.dump(metadata)},
+        )
+    else:
+        _export_onnx(model, example, str(output_path), metadata, quantize)
+
+    return metadata
+
+
+def _export_onnx(model, example, output_path, metadata, quantize):
+    import onnx
+
+    torch.onnx.export(
+        model,
+        example,
+        output_path,
+        input_names=["X"],
+        output_names=["scores"],
+        dynamic_axes={"X": {0: "batch"}, "scores": {0: "batch"}},
+    )
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+
+        quantize_dynamic(output_path, output_path, weight_type=QuantType.QInt8)
+
+    onnx_model = onnx.load(output_path)
+    entry = onnx_model.metadata_props.add()
+    entry.key = METADATA_FILE
+    entry.value = yaml.dump(metadata)
+    onnx.save(onnx_model, output_path)
+
+
+class OnnxModel:
+    """ Run an ONNX model with ONNX Runtime like a torch model
+
+    Calling the model with a batch tensor returns a tensor of scores, so it
+    can be used with `opensoundscape.torch.predict.predict`. Inference always
+    runs on the CPU.
+
+    Input:
+        path:   path to an ONNX model exported by `export_model`
+    """
+
+    def __init__(self, path):
+        import onnxruntime
+
+        self.path = str(path)
+        self.session = onnxruntime.InferenceSession(
+            self.path, providers=["CPUExecutionProvider"]
+        )
+        self.input_name = self.session.get_inputs()[0].name
+        custom_metadata = self.session.get_modelmeta().custom_metadata_map
+        self.metadata = yaml.safe_load(custom_metadata.get(METADATA_FILE, "{}"))
+
+    def __call__(self, X):
+        (scores,) = self.session.run(None, {self.input_name: X.cpu().numpy()})
+        return torch.from_numpy(scores)
+
+    def eval(self):
+        return self
+
+    def to(self, device):
+        return self
+
+
+def load_exported_model(path):
+    """ Load a model exported by `export_model`
+
+    Files ending with ".onnx" are loaded with ONNX Runtime, and other files
+    with torch.jit.load. Neither requires torchvision.
+
+    Input:
+        path:       path to the exported model
+
+    Output:
+        model:      a model to pass to `opensoundscape.torch.predict.predict`
+        metadata:   dictionary of the metadata embedded by `export_model`
+    """
+    if str(path).endswith(".onnx"):
+        model = OnnxModel(path)
+        return model, model.metadata
+
+    extra_files = {METADATA_FILE: ""}
+    model = torch.jit.load(str(path), map_location="cpu", _extra_files=extra_files)
+    metadata = yaml.safe_load(extra_files[METADATA_FILE]) or {}
+    return model, metadata
@@ -1,41 +1,70 @@
 #!/usr/bin/env python3
+from functools import partial
+import inspect
+import warnings
+from multiprocessing import get_context
+from pathlib import Path
 import torch
 import torch.nn as nn
+import numpy as np
 import pandas as pd
 from torch.nn.functional import softmax
 import yaml
 
+from opensoundscape.torch.export import load_exported_model
+
 
 def predict(
     model,
     prediction_dataset,
-    batch_size=1,
+    batch_size=64,
     num_workers=1,
     apply_softmax=False,
     label_dict=None,
+    prefetch_factor=None,
+    output_path=None,
 ):
     """ Generate predictions on a dataset from a pytorch model object
 
     Input:
         model:          A binary torch model, e.g. torchvision.models.resnet18(pretrained=True)
                         - must override classes, e.g. model.fc = torch.nn.Linear(model.fc.in_features, 2)
-        prediction_dataset: 
-                        a pytorch dataset object that returns tensors, such as datasets.SingleTargetAudioDataset()                
-        batch_size:     The size of the batches (# files) [default: 1]
+                        - or the path to a model exported by torch.export.export_model
+        prediction_dataset:
+                        a pytorch dataset object that returns tensors, such as datasets.SingleTargetAudioDataset()
+                        - or an iterable dataset returning "source", "begin_time" and "end_time"
+                          with each tensor, such as datasets.SplitAudioDataset()
+        batch_size:     The size of the batches (# files) [default: 64]
         num_workers:    The number of cores to use for batch preparation [default: 1]
                         - if you want to use all the cores on your machine, set it to 0 (this could freeze your computer)
         apply_softmax:  Apply a softmax activation layer to the raw outputs of the model
         label_dict:     List of names of each class, with indices corresponding to NumericLabels [default: None]
                         - if None, the dataframe returned will have numeric column names
                         - if list of class names, returned dataframe will have class names as column names
+                        - for exported models, defaults to the label_dict embedded in the model
+        prefetch_factor: The number of batches each worker prepares in advance [default: None]
+                        - if None, use the DataLoader's default (2)
+                        - ignored with a warning if num_workers is 0 or the
+                          DataLoader has no prefetch_factor (PyTorch < 1.7)
+        output_path:    A CSV file to write predictions to, batch by batch, as they are computed [default: None]
+                        - if None, predictions are only returned
 
     Output:
         A dataframe with the CNN prediction results for each class and each file
-        
+        - for iterable datasets, indexed by source, begin_time and end_time of each clip
+
     Notes:
         if label_dict is not None, the returned dataframe's columns will be class names instead of numeric labels
+
+        Batches are loaded by `num_workers` processes while the model runs. On
+        a GPU, batches are copied from pinned memory without blocking.
     """
 
+    if isinstance(model, (str, Path)):
+        model, metadata = load_exported_model(model)
+        if label_dict is None:
+            label_dict = metadata.get("label_dict")
+
     if torch.cuda.is_available():
         device = torch.device("cuda")
     else:
@@ -43,29 +72,213 @@ def predict(
     model.eval()
     model.to(device)
 
+    dataloader_kwargs = {}
+    if prefetch_factor is not None:
+        if num_workers == 0:
+            warnings.warn("prefetch_factor is ignored when num_workers is 0")
+        elif not _dataloader_supports_prefetch_factor():
+            warnings.warn(
+                f"prefetch_factor requires PyTorch >= 1.7. Got PyTorch {torch.__version__}. Using the default prefetching"
+            )
+        else:
+            dataloader_kwargs["prefetch_factor"] = prefetch_factor
     dataloader = torch.utils.data.DataLoader(
         prediction_dataset,
         batch_size=batch_size,
         shuffle=False,
         num_workers=num_workers,
+        pin_memory=device.type == "cuda",
+        **dataloader_kwargs,
     )
 
-    # run prediction
-    all_predictions = []
-    for i, inputs in enumerate(dataloader):
-        predictions = model(inputs["X"].to(device))
-        if apply_softmax:
-            softmax_val = softmax(predictions, 1).detach().cpu().numpy()
-            for x in softmax_val:
-                all_predictions.append(x)
-        else:
-            for x in predictions.detach().cpu().numpy():
-                all_predictions.append(list(x))  # .astype('float64')
+    # the length of iterable datasets is unknown, and the index is built
+    # from the clip information of each batch
+    iterable = isinstance(prediction_dataset, torch.utils.data.IterableDataset)
+    if iterable:
+        index_parts = []
+        prediction_parts = []
+    else:
+        img_paths = prediction_dataset.df[prediction_dataset.filename_column].values
 
-    img_paths = prediction_dataset.df[prediction_dataset.filename_column].values
+    # run prediction, writing each batch into a preallocated array
+    all_predictions = None
+    start = 0
+    with torch.no_grad():
+        for i, inputs in enumerate(dataloader):
+            predictions = model(inputs["X"].to(device, non_blocking=True))
+            if apply_softmax:
+                predictions = softmax(predictions, 1)
+            predictions = predictions.cpu().numpy()
+            end = start + predictions.shape[0]
+
+            if iterable:
+                batch_index = _clip_index(inputs)
+                index_parts.append(batch_index)
+                prediction_parts.append(predictions)
+            else:
+                batch_index = img_paths[start:end]
+                if all_predictions is None:
+                    all_predictions = np.empty(
+                        (len(prediction_dataset), predictions.shape[1]),
+                        dtype=predictions.dtype,
+                    )
+                all_predictions[start:end] = predictions
+
+            if output_path is not None:
+                batch_df = pd.DataFrame(index=batch_index, data=predictions)
+                if label_dict is not None:
+                    batch_df = batch_df.rename(columns=label_dict)
+                batch_df.to_csv(output_path, mode="w" if i == 0 else "a", header=i == 0)
+
+            start = end
+
+    if iterable:
+        if len(index_parts) > 0:
+            img_paths = index_parts[0].append(index_parts[1:])
+            all_predictions = np.concatenate(prediction_parts)
+        else:
+            img_paths = _clip_index(None)
+    if all_predictions is None:
+        all_predictions = np.empty((0, 0))
     pred_df = pd.DataFrame(index=img_paths, data=all_predictions)
 
     if label_dict is not None:
         pred_df = pred_df.rename(columns=label_dict)
 
     return pred_df
+
+
+def _dataloader_supports_prefetch_factor():
+    """ Whether torch.utils.data.DataLoader has prefetch_factor (PyTorch >= 1.7)
+    """
+    parameters = inspect.signature(torch.utils.data.DataLoader).parameters
+    return "prefetch_factor" in parameters
+
+
+def _clip_index(inputs):
+    """ index of the clips in a batch from an iterable dataset
+
+    Input:
+        inputs: a batch with keys "source", "begin_time" and "end_time",
+                or None for an empty index
+    """
+    names = ["source", "begin_time", "end_time"]
+    if inputs is None:
+        return pd.MultiIndex.from_arrays([[], [], []], names=names)
+    return pd.MultiIndex.from_arrays(
+        [
+            list(inputs["source"]),
+            np.asarray(inputs["begin_time"]),
+            np.asarray(inputs["end_time"]),
+        ],
+        names=names,
+    )
+
+
+def shard(items, index, count):
+    """ Select one of `count` contiguous, nearly equal slices of a list
+
+    Independent processes or nodes can each predict on `shard(files, k, n)`
+    for k in range(n) without coordination, given the same list of files
+    (e.g. the lines of a manifest file). Concatenating the shards in order
+    gives the original list.
+
+    Input:
+        items:  A list, e.g. of audio files
+        index:  The index of the shard, from 0 to count - 1
+        count:  The number of shards
+
+    Output:
+        The items of the shard
+    """
+    if count < 1:
+        raise ValueError(f"count should be at least 1. Got {count}")
+    if not 0 <= index < count:
+        raise ValueError(f"index should be from 0 to {count - 1}. Got {index}")
+    items = list(items)
+    start = len(items) * index // count
+    end = len(items) * (index + 1) // count
+    return items[start:end]
+
+
+def predict_parallel(
+    model,
+    files,
+    num_processes=1,
+    threads_per_process=None,
+    batch_size=64,
+    apply_softmax=False,
+    label_dict=None,
+    **dataset_kwargs,
+):
+    """ Generate predictions on audio files with several processes
+
+    The list of files is split into `num_processes` contiguous shards, and each
+    process predicts on the clips of one shard with its own copy of the model
+    (see `predict`). For small models on CPUs this scales better than a single
+    process using many threads for each operation.
+
+    Input:
+        model:          A torch model, or the path to an exported model, as for `predict`
+                        - exported models are loaded by each process
+        files:          A list of audio files
+        num_processes:  The number of processes, e.g. runtime.cores_per_node
+                        from the config [default: 1]
+        threads_per_process:
+                        The number of threads used by torch in each process [default: None]
+                        - if None, divide torch.get_num_threads() between the processes
+        batch_size:     The size of the batches (# clips) [default: 64]
+        apply_softmax:  Apply a softmax activation layer to the raw outputs of the model
+        label_dict:     Names of each class, as for `predict` [default: None]
+        **dataset_kwargs:
+                        Arguments for datasets.SplitAudioDataset, e.g. clip_duration
+
+    Output:
+        A dataframe with the CNN prediction results for each clip, indexed by
+        source, begin_time and end_time, in the order of `files`
+    """
+    if num_processes < 1:
+        raise ValueError(f"num_processes should be at least 1. Got {num_processes}")
+    if threads_per_process is None:
+        threads_per_process = max(1, torch.get_num_threads() // num_processes)
+
+    predict_shard = partial(
+        _predict_files,
+        model=model,
+        threads=threads_per_process,
+        batch_size=batch_size,
+        apply_softmax=apply_softmax,
+        label_dict=label_dict,
+        dataset_kwargs=dataset_kwargs,
+    )
+    shards = [shard(files, k, num_processes) for k in range(num_processes)]
+
+    if num_processes > 1:
+        # torch's thread pools are not safe to fork, so processes are spawned
+        with get_context("spawn").Pool(num_processes) as pool:
+            results = pool.map(predict_shard, shards)
+    else:
+        results = [predict_shard(shards[0])]
+
+    results = [result for result in results if result.shape[0] > 0]
+    if len(results) == 0:
+        return predict_shard([])
+    return pd.concat(results)
+
+
+def _predict_files(
+    files, model, threads, batch_size, apply_softmax, label_dict, dataset_kwargs
+):
+    # imported here, so loading an exported model does not import torchvision
+    from opensoundscape.datasets import SplitAudioDataset
+
+    torch.set_num_threads(threads)
+    dataset = SplitAudioDataset(files, **dataset_kwargs)
+    return predict(
+        model,
+        dataset,
+        batch_size=batch_size,
+        num_workers=0,
+        apply_softmax=apply_softmax,
+        label_dict=label_dict,
+    )
@@ -4,11 +4,10 @@ These functions were implemented for PyTorch in the following repository https:/
 The original paper is available on https://arxiv.org/abs/1904.08779
 """
 
-import random
 import torch
 
 
-def time_warp(spec, W=5):
+def time_warp(spec, W=5, generator=None):
 
     batch_size = spec.shape[0]
     num_channel = spec.shape[1]
@@ -25,21 +24,21 @@ def time_warp(spec, W=5):
 
     horizontal_line_at_ctr = spec[:, y]
 
+    # draw the points and distances of all samples at once
+    point_columns = torch.randint(
+        W, spec_len - W, (batch_size,), generator=generator
+    ).to(device)
     point_to_warp = horizontal_line_at_ctr[
-        range(batch_size),
-        [random.randrange(W, spec_len - W) for _ in range(batch_size)],
-    ]
+        torch.arange(batch_size, device=device), point_columns
+    ].float()
 
     # Uniform distribution from (0,W) with chance to be up to W negative
-    dist_to_warp = [random.randrange(-W, W) for _ in range(batch_size)]
+    dist_to_warp = torch.randint(-W, W, (batch_size,), generator=generator).to(device)
 
-    src_pts = torch.tensor(
-        [[[y, point_to_warp[i]]] for i in range(batch_size)], device=device
-    )
-    dest_pts = torch.tensor(
-        [[[y, point_to_warp[i] + dist_to_warp[i]]] for i in range(batch_size)],
-        device=device,
-    )
+    y_column = torch.full_like(point_to_warp, y)
+    src_pts = torch.stack((y_column, point_to_warp), dim=1)
+    dest_pts = torch.stack((y_column, point_to_warp + dist_to_warp), dim=1)
+    src_pts, dest_pts = src_pts.unsqueeze(1), dest_pts.unsqueeze(1)
 
     warped_spectro, dense_flows = sparse_image_warp(spec, src_pts, dest_pts)
     return warped_spectro.squeeze(3).reshape(
@@ -135,7 +134,10 @@ def solve_interpolation(train_points, train_values, order, regularization_weight
     rhs = torch.cat((f, rhs_zeros), 1)  # [b, n + d + 1, k]
 
     # Then, solve the linear system and unpack the results.
-    X, LU = torch.solve(rhs, lhs)
+    if hasattr(torch, "linalg") and hasattr(torch.linalg, "solve"):
+        X = torch.linalg.solve(lhs, rhs)
+    else:
+        X, LU = torch.solve(rhs, lhs)
     w = X[:, :n, :]
     v = X[:, n:, :]
 
@@ -305,67 +307,78 @@ def interpolate_bilinear(
     return interp
 
 
-def freq_mask(spec, F=30, max_masks=3, replace_with_zero=False):
-    cloned = spec.clone()
-    batch_size = cloned.shape[0]
-    num_mel_channels = cloned.shape[2]
-
-    num_masks = random.randint(1, max_masks)
-
-    for _ in range(num_masks):
-
-        f = [random.randrange(0, F) for _ in range(batch_size)]
-        f_zero = [
-            random.randrange(0, num_mel_channels - f[i])
-            for i, _ in enumerate(range(batch_size))
-        ]
-
-        mask_end = [
-            random.randrange(f_zero[i], f_zero[i] + f[i])
-            if f_zero[i] != (f_zero[i] + f[i])
-            else (f_zero[i] + F)
-            for i, _ in enumerate(range(batch_size))
-        ]
-
+def random_masks(batch_size, length, max_width, max_masks, generator=None):
+    """ Draw random ranges of indices to mask for each sample of a batch
+
+    All bounds are drawn at once with torch's random number generator. As in
+    the original implementation, each mask has a random width below a random
+    number f < max_width, or of max_width if f is 0.
+
+    Args:
+        batch_size: number of samples
+        length: number of indices along the masked dimension
+        max_width: maximum width of each mask
+        max_masks: maximum number of masks; between 1 and max_masks masks are
+            applied to every sample
+        generator: a CPU torch.Generator, for reproducible masks. When None,
+            uses the default generator (seeded with torch.manual_seed)
+            [default: None]
+
+    Returns:
+        boolean tensor of shape (num_masks, batch_size, length), True for
+        the masked indices of each mask
+    """
+    num_masks = int(torch.randint(1, max_masks + 1, (1,), generator=generator))
+    shape = (num_masks, batch_size)
+    f = (torch.rand(shape, generator=generator) * max_width).long()
+    mask_start = (torch.rand(shape, generator=generator) * (length - f)).long()
+    mask_end = torch.where(
+        f > 0,
+        mask_start + (torch.rand(shape, generator=generator) * f).long(),
+        mask_start + max_width,
+    )
+    indices = torch.arange(length)
+    masks = (indices >= mask_start[..., None]) & (indices < mask_end[..., None])
+    return masks
+
+
+def apply_masks(spec, masks, replace_with_zero, inplace):
+    """ Replace masked values of spec, one mask at a time
+
+    Args:
+        spec: tensor of shape (batch_size, channels, height, width)
+        masks: boolean tensor of shape (num_masks, batch_size, 1 or height,
+            1 or width), broadcastable to spec for each mask
+        replace_with_zero: replace with 0 instead of the mean of each sample
+        inplace: modify spec instead of a copy of it
+    """
+    if not inplace:
+        spec = spec.clone()
+    for mask in masks.to(spec.device):
+        mask = mask.unsqueeze(1).expand_as(spec)
         if replace_with_zero:
-            mask_value = [0.0] * batch_size
+            spec[mask] = 0.0
         else:
-            mask_value = cloned.mean(dim=(1, 2, 3))
-
-        for i in range(len(cloned)):
-            cloned[i, :, f_zero[i] : mask_end[i], :] = mask_value[i]
+            mask_value = spec.mean(dim=(1, 2, 3)).view(-1, 1, 1, 1)
+            spec[mask] = mask_value.expand_as(spec)[mask]
+    return spec
 
-    return cloned
 
+def freq_mask(
+    spec, F=30, max_masks=3, replace_with_zero=False, inplace=False, generator=None
+):
+    batch_size = spec.shape[0]
+    num_mel_channels = spec.shape[2]
 
-def time_mask(spec, T=40, max_masks=3, replace_with_zero=False):
-    cloned = spec.clone()
-    batch_size = cloned.shape[0]
-    len_spectro = cloned.shape[3]
-
-    num_masks = random.randint(1, max_masks)
-
-    for _ in range(num_masks):
-
-        t = [random.randrange(0, T) for _ in range(batch_size)]
-        t_zero = [
-            random.randrange(0, len_spectro - t[i])
-            for i, _ in enumerate(range(batch_size))
-        ]
-
-        mask_end = [
-            random.randrange(t_zero[i], t_zero[i] + t[i])
-            if t_zero[i] != (t_zero[i] + t[i])
-            else (t_zero[i] + T)
-            for i, _ in enumerate(range(batch_size))
-        ]
+    masks = random_masks(batch_size, num_mel_channels, F, max_masks, generator)
+    return apply_masks(spec, masks[..., None], replace_with_zero, inplace)
 
-        if replace_with_zero:
-            mask_value = [0.0] * batch_size
-        else:
-            mask_value = cloned.mean(dim=(1, 2, 3))
 
-        for i in range(len(cloned)):
-            cloned[i, :, :, t_zero[i] : mask_end[i]] = mask_value[i]
+def time_mask(
+    spec, T=40, max_masks=3, replace_with_zero=False, inplace=False, generator=None
+):
+    batch_size = spec.shape[0]
+    len_spectro = spec.shape[3]
 
-    return cloned
+    masks = random_masks(batch_size, len_spectro, T, max_masks, generator)
+    return apply_masks(spec, masks[:, :, None, :], replace_with_zero, inplace)
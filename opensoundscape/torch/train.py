@@ -24,6 +24,9 @@ def train(
     debug=False,
     print_logging=True,
     save_scores=False,
+    channels_last=False,
+    accumulation_steps=1,
+    batch_augment=None,
 ):
     """ Train a model
 
@@ -44,6 +47,15 @@ def train(
         debug:          Whether or not to write intermediate images [default: False]
         print_logging:  Whether to print training progress to stdout [default: True]
         save_scores:    Whether to save the scores on the train/val set each epoch [default: False]
+        channels_last:  Use the channels_last memory format for the model and batches [default: False]
+        accumulation_steps: The number of batches to accumulate gradients over before each
+                        optimizer step [default: 1]
+                        - the effective batch size is batch_size * accumulation_steps
+        batch_augment:  A BatchAugment (see opensoundscape.torch.batch_augment) applied to
+                        each training batch [default: None]
+                        - requires a train_dataset created with batch_augment=True
+                        - if valid_dataset was created with batch_augment=True, its
+                          batches are normalized by batch_augment without augmentation
 
     Side Effects:
         Write a file `epoch-{epoch}.tar` containing (rate of `log_every`):
@@ -75,6 +87,9 @@ def train(
             "log_every": log_every,
             "tensor_augment": tensor_augment,
             "debug": debug,
+            "channels_last": channels_last,
+            "accumulation_steps": accumulation_steps,
+            "batch_augment": batch_augment is not None,
             "cuda_is_available:": torch.cuda.is_available(),
         }
 
@@ -96,7 +111,15 @@ def train(
         valid_dataset, batch_size=batch_size, shuffle=False, num_workers=num_workers
     )
 
+    if accumulation_steps < 1:
+        raise ValueError(
+            f"accumulation_steps should be at least 1. Got {accumulation_steps}"
+        )
+
     model.to(device)
+    memory_format = torch.channels_last if channels_last else torch.contiguous_format
+    if channels_last:
+        model.to(memory_format=memory_format)
 
     # Model training
     # Clases should be integer values
@@ -108,40 +131,57 @@ def train(
         )
 
     for epoch in range(epochs):
+        # Replace some pre-decoded overlays so they differ between epochs
+        if epoch > 0 and getattr(train_dataset, "overlay_pool", None) is not None:
+            train_dataset.refresh_overlay_pool()
+
         # Train model
         if print_logging:
             print(f"Epoch {epoch}")
             print("  Training.")
         train_metrics = Metrics(classes, len(train_dataset))
         model.train()
+        if batch_augment is not None:
+            batch_augment.train()
 
         epoch_train_scores = []
         epoch_train_targets = []
-        for t in train_loader:
+        optimizer.zero_grad()
+        for batch_idx, t in enumerate(train_loader):
             X, y = t["X"], t["y"]
             X = X.to(device)
             y = y.to(device)
             targets = y.squeeze(1)
 
+            if batch_augment is not None:
+                X = batch_augment(X, targets)
+
             if tensor_augment:
                 # X is currently shape [batch_size, 3, width, height]
                 # Take to shape [batch_size, 1, width, height] for use with `augment`
                 X = X[:, 0].unsqueeze(1)
-                X = tensaug.time_warp(X.clone(), W=10)
-                X = tensaug.time_mask(X, T=50, max_masks=5)
-                X = tensaug.freq_mask(X, F=50, max_masks=5)
+                # time_warp returns a new tensor, so the masks can modify it in place
+                X = tensaug.time_warp(X, W=10)
+                X = tensaug.time_mask(X, T=50, max_masks=5, inplace=True)
+                X = tensaug.freq_mask(X, F=50, max_masks=5, inplace=True)
 
-                # Take from 1 dimension to 3 dimensions
-                X = torch.cat([X] * 3, dim=1)
+                # Take from 1 dimension to 3 dimensions (a view, not a copy)
+                X = X.expand(-1, 3, -1, -1)
+
+            if channels_last:
+                X = X.contiguous(memory_format=memory_format)
 
             # Run model
             outputs = model(X)
-
-            # Learn from batch
             loss = loss_fn(outputs, targets)
-            optimizer.zero_grad()
-            loss.backward()
-            optimizer.step()
+
+            # Learn from batch, stepping once every accumulation_steps batches
+            (loss / accumulation_steps).backward()
+            if (batch_idx + 1) % accumulation_steps == 0 or batch_idx + 1 == len(
+                train_loader
+            ):
+                optimizer.step()
+                optimizer.zero_grad()
 
             # Update metrics with loss & class predictions for batch
             batch_scores = outputs.clone().detach()
@@ -164,6 +204,11 @@ def train(
             print("  Validating.")
         valid_metrics = Metrics(classes, len(valid_dataset))
         model.eval()
+        normalize_valid = batch_augment is not None and getattr(
+            valid_dataset, "batch_augment", False
+        )
+        if batch_augment is not None:
+            batch_augment.eval()
         epoch_val_scores = []
         epoch_val_targets = []
         with torch.no_grad():
@@ -172,6 +217,10 @@ def train(
                 X = X.to(device)
                 y = y.to(device)
                 targets = y.squeeze(1)
+                if normalize_valid:
+                    X = batch_augment(X)
+                if channels_last:
+                    X = X.contiguous(memory_format=memory_format)
 
                 # Run model
                 outputs = model(X)
@@ -241,3 +241,115 @@ def test_non_integer_split_and_save_remainder(silence_10s_mp3_pathlib):
     assert clip_df.iloc[1]["begin_time"] == 5.0
     assert abs(clip_df.iloc[1]["end_time"] - 8.2) < 0.1
     assert abs(clip_df.iloc[1]["clip_duration"] - 3.2) < 0.1
+
+
+def test_stream_chunks_cover_file():
+    chunks = list(Audio.stream("tests/1min.wav", chunk_duration=25))
+    assert len(chunks) == 3
+    assert [c["begin_time"] for c in chunks] == [0, 25, 50]
+    assert chunks[-1]["end_time"] == 60
+    assert isclose(chunks[-1]["clip_duration"], 10, abs_tol=1e-4)
+
+
+def test_stream_with_overlap():
+    chunks = list(Audio.stream("tests/1min.wav", chunk_duration=20, chunk_overlap=5))
+    assert [c["begin_time"] for c in chunks] == [0, 15, 30, 45]
+    assert chunks[-1]["end_time"] == 60
+
+
+def test_stream_matches_from_file():
+    audio = Audio.from_file("tests/1min.wav")
+    chunks = list(Audio.stream("tests/1min.wav", chunk_duration=10))
+    streamed = np.concatenate([c["clip"].samples for c in chunks])
+    np.testing.assert_allclose(streamed, audio.samples, atol=1e-7)
+
+
+def test_stream_resampled_matches_from_file():
+    audio = Audio.from_file("tests/1min.wav", sample_rate=22050)
+    chunks = list(Audio.stream("tests/1min.wav", chunk_duration=10, sample_rate=22050))
+    assert all(c["clip"].sample_rate == 22050 for c in chunks)
+    streamed = np.concatenate([c["clip"].samples for c in chunks])
+    assert streamed.shape == audio.samples.shape
+    np.testing.assert_allclose(streamed, audio.samples, atol=1e-3)
+
+
+def test_load_with_offset_and_duration():
+    s = Audio.from_file("tests/1min.wav", sample_rate=32000, offset=10, duration=5)
+    assert s.samples.shape == (160000,)
+
+
+def test_load_with_offset_matches_trim():
+    full = Audio.from_file("tests/1min.wav")
+    part = Audio.from_file("tests/1min.wav", offset=10, duration=5)
+    np.testing.assert_allclose(part.samples, full.trim(10, 15).samples)
+
+
+def test_load_mp3_with_offset_and_duration(silence_10s_mp3_str):
+    s = Audio.from_file(silence_10s_mp3_str, sample_rate=22050, offset=2, duration=3)
+    assert isclose(s.duration(), 3, abs_tol=1e-3)
+
+
+def test_split_samples_is_a_view(silence_10s_mp3_pathlib):
+    audio = Audio.from_file(silence_10s_mp3_pathlib)
+    clips, times = audio.split_samples(5.0, 1.0)
+    assert clips.shape == (2, 5 * audio.sample_rate)
+    assert np.shares_memory(clips, audio.samples)
+    np.testing.assert_array_equal(times, [[0, 5], [4, 9]])
+
+
+def test_split_samples_matches_split(silence_10s_mp3_pathlib):
+    audio = Audio.from_file(silence_10s_mp3_pathlib)
+    audio = Audio(np.random.uniform(-1, 1, len(audio.samples)), audio.sample_rate)
+    for final_clip in [None, "full", "extend"]:
+        clips, times = audio.split_samples(3.0, 0.5, final_clip=final_clip)
+        split = audio.split(3.0, 0.5, final_clip=final_clip)
+        assert len(clips) == len(split)
+        for row, begin_end, clip in zip(clips, times, split):
+            np.testing.assert_array_equal(row, clip["clip"].samples)
+            assert begin_end[0] == clip["begin_time"]
+            assert begin_end[1] == clip["end_time"]
+
+
+def test_split_samples_non_integer_duration():
+    sample_rate = 22050
+    samples = np.random.uniform(-1, 1, int(10.5 * sample_rate))
+    audio = Audio(samples, sample_rate)
+    for final_clip in [None, "extend"]:
+        clips, times = audio.split_samples(5.0, final_clip=final_clip)
+        split = audio.split(5.0, final_clip=final_clip)
+        assert len(clips) == len(split)
+        for row, begin_end, clip in zip(clips, times, split):
+            np.testing.assert_array_equal(row, clip["clip"].samples)
+            assert begin_end[0] == clip["begin_time"]
+            assert begin_end[1] == clip["end_time"]
+
+    # the final full clip is the last 5 seconds, and its times match
+    clips, times = audio.split_samples(5.0, final_clip="full")
+    np.testing.assert_array_equal(times[-1], [5.5, 10.5])
+    np.testing.assert_array_equal(clips[-1], samples[-5 * sample_rate :])
+    np.testing.assert_array_equal(clips[-1], audio.trim(5.5, 10.5).samples)
+
+
+def test_split_samples_integer_clip_duration():
+    sample_rate = 22050
+    samples = np.random.uniform(-1, 1, int(10.5 * sample_rate))
+    audio = Audio(samples, sample_rate)
+    clips, times = audio.split_samples(5, 0, final_clip="full")
+    assert times.dtype == float
+    np.testing.assert_array_equal(times[-1], [5.5, 10.5])
+    np.testing.assert_array_equal(clips[-1], samples[-5 * sample_rate :])
+
+    clips, times = audio.split_samples(5, 0, final_clip="extend")
+    np.testing.assert_array_equal(times[-1], [10, 10.5])
+
+
+def test_split_samples_remainder_raises(silence_10s_mp3_pathlib):
+    audio = Audio.from_file(silence_10s_mp3_pathlib)
+    with pytest.raises(ValueError):
+        audio.split_samples(3.0, final_clip="remainder")
+
+
+def test_split_samples_short_audio_extend(veryshort_wav_str):
+    audio = Audio.from_file(veryshort_wav_str)
+    clips, times = audio.split_samples(1.0, final_clip="extend")
+    assert clips.shape == (1, audio.sample_rate)
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+from opensoundscape.clip_store import ClipStore
+from opensoundscape.audio import Audio, split_and_save
+from opensoundscape.datasets import SplitterDataset, SingleTargetAudioDataset
+import pytest
+import numpy as np
+import pandas as pd
+from pathlib import Path
+import shutil
+
+
+@pytest.fixture()
+def store_dir(request):
+    path = Path("tests/_tmp_clip_store")
+
+    def fin():
+        shutil.rmtree(path, ignore_errors=True)
+
+    request.addfinalizer(fin)
+    return path
+
+
+@pytest.fixture()
+def silence_10s_mp3_str():
+    return "tests/silence_10s.mp3"
+
+
+@pytest.fixture()
+def one_min_audio():
+    return Audio.from_file("tests/1min.wav", sample_rate=22050)
+
+
+def test_write_and_read_float32(store_dir, one_min_audio):
+    store = ClipStore(store_dir)
+    clips = one_min_audio.split(clip_duration=5)
+    index = store.write("1min", clips)
+    assert len(store) == 12
+    assert index.index[0] in store
+    for clip_id, clip in zip(index.index, clips):
+        audio = store.read(clip_id)
+        assert audio.sample_rate == 22050
+        assert isinstance(audio.samples, np.memmap)
+        assert not audio.samples.flags.writeable
+        np.testing.assert_array_equal(audio.samples, clip["clip"].samples)
+
+
+def test_write_and_read_int16(store_dir, one_min_audio):
+    store = ClipStore(store_dir, dtype="int16")
+    clips = one_min_audio.split(clip_duration=5)
+    index = store.write("1min", clips)
+    data_file = store_dir / index["data_file"].iloc[0]
+    assert data_file.stat().st_size == len(one_min_audio.samples) * 2
+    audio = store.read(index.index[3])
+    assert audio.samples.dtype == np.float32
+    np.testing.assert_allclose(audio.samples, clips[3]["clip"].samples, atol=1 / 32767)
+
+
+def test_index_is_shared_between_stores(store_dir, one_min_audio):
+    ClipStore(store_dir).write(
+        "a", one_min_audio.split(clip_duration=30), source="1min.wav"
+    )
+    ClipStore(store_dir).write("b", one_min_audio.split(clip_duration=20))
+    index = ClipStore(store_dir).index
+    assert index.shape[0] == 5
+    assert list(index["source"]) == ["1min.wav"] * 2 + ["b"] * 3
+    assert np.isclose(ClipStore(store_dir).duration(index.index[0]), 30)
+
+
+def test_rewrite_shard_replaces_data_file(store_dir, one_min_audio):
+    store = ClipStore(store_dir)
+    old_index = store.write("1min", one_min_audio.split(clip_duration=30))
+    reader = ClipStore(store_dir)
+    old_samples = reader.read(old_index.index[0]).samples
+
+    new_index = store.write("1min", one_min_audio.split(clip_duration=20))
+    assert old_index["data_file"].iloc[0] != new_index["data_file"].iloc[0]
+    assert [p.name for p in store_dir.glob("*.bin")] == [new_index["data_file"].iloc[0]]
+    # a reader with the old index keeps its open data file
+    assert len(old_samples) == 30 * 22050
+    # and finds new clips after reloading the index
+    reader = ClipStore(store_dir)
+    assert len(reader) == 3
+    assert np.isclose(reader.read(new_index.index[2]).duration(), 20)
+
+
+def test_bad_dtype_raises(store_dir):
+    with pytest.raises(ValueError):
+        ClipStore(store_dir, dtype="float64")
+
+
+def test_read_missing_clip_raises(store_dir):
+    with pytest.raises(KeyError):
+        ClipStore(store_dir).read("missing")
+
+
+def test_split_and_save_to_clip_store(store_dir, silence_10s_mp3_str):
+    store = ClipStore(store_dir)
+    audio = Audio.from_file(silence_10s_mp3_str)
+    clip_df = split_and_save(audio, None, "prefix", 5, clip_store=store)
+    assert list(clip_df["clip_id"]) == list(store.index.index)
+    assert list(store_dir.glob("*.wav")) == []
+
+
+def test_splitter_dataset_to_clip_store(store_dir):
+    store = ClipStore(store_dir)
+    dataset = SplitterDataset([Path("tests/1min.wav")], clip_store=store)
+    rows = [row.split("\t") for row in dataset[0]["data"]]
+    assert len(rows) == 14
+    assert [row[3] for row in rows] == list(store.index.index)
+    assert list(store_dir.glob("*.wav")) == []
+    audio = store.read(rows[1][3])
+    assert np.isclose(audio.duration(), 5)
+
+
+def test_single_target_audio_dataset_from_clip_store(store_dir, one_min_audio):
+    store = ClipStore(store_dir)
+    index = store.write("1min", one_min_audio.split(clip_duration=5))
+    df = pd.DataFrame({"Destination": index.index})
+    dataset = SingleTargetAudioDataset(df, label_dict=None, clip_store=store)
+    assert dataset[0]["X"].shape == (3, 224, 224)
+
+    dataset = SingleTargetAudioDataset(
+        df, label_dict=None, clip_store=store, random_trim_length=2
+    )
+    assert dataset[1]["X"].shape == (3, 224, 224)
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+from opensoundscape.console import entrypoint
+import pytest
+import torch
+from torchvision.models import resnet18
+from pathlib import Path
+import shutil
+import sys
+
+
+@pytest.fixture()
+def predict_dir(request):
+    path = Path("tests/_tmp_console")
+    (path / "audio").mkdir(parents=True)
+    shutil.copy("tests/silence_10s.mp3", path / "audio" / "silence_10s.mp3")
+
+    def fin():
+        shutil.rmtree(path)
+
+    request.addfinalizer(fin)
+    return path
+
+
+def test_predict_from_directory(predict_dir, monkeypatch, capsys):
+    model = resnet18(pretrained=False)
+    model.fc = torch.nn.Linear(in_features=model.fc.in_features, out_features=2)
+    torch.save(model.state_dict(), predict_dir / "model.pth")
+
+    monkeypatch.setattr(
+        sys,
+        "argv",
+        [
+            "opensoundscape",
+            "predict_from_directory",
+            "-i",
+            str(predict_dir / "audio"),
+            "-d",
+            str(predict_dir / "model.pth"),
+        ],
+    )
+    entrypoint()
+    lines = capsys.readouterr().out.strip().split("\n")
+    # default config: 5 second clips overlapping by 1 second
+    times = [[float(t) for t in line.split(",")[1:3]] for line in lines]
+    assert times == [[0, 5], [4, 9]]
+    assert all(line.split(",")[3] in ["0", "1"] for line in lines)
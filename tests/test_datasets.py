@@ -1,9 +1,21 @@
 #!/usr/bin/env python3
 import pytest
 from pathlib import Path
-from opensoundscape.datasets import SplitterDataset, SingleTargetAudioDataset
+from opensoundscape.datasets import (
+    SplitterDataset,
+    SingleTargetAudioDataset,
+    SplitAudioDataset,
+    annotations_with_overlaps_with_clip,
+    annotation_overlaps_with_clips,
+    gaussian_blur,
+)
 from torch.utils.data import DataLoader
 import pandas as pd
+import numpy as np
+import shutil
+import torch
+from PIL import Image, ImageFilter
+from opensoundscape.audio import Audio
 from numpy.testing import assert_array_almost_equal, assert_array_equal
 
 
@@ -48,6 +60,29 @@ def splitter_results_last(request):
     return split0, split1
 
 
+@pytest.fixture()
+def annotated_audio_list(request):
+    path = Path("tests/_tmp_annotated")
+    path.mkdir()
+    shutil.copy("tests/1min.wav", path / "1min.wav")
+    pd.DataFrame(
+        {
+            "begin time (s)": [1.0, 7.0, 0.5, 30.0, 42.0],
+            "end time (s)": [3.0, 9.0, 20.0, 31.0, 43.0],
+            "class": ["a", "b", None, "b", "c"],
+        }
+    ).to_csv(path / "1min.Table.1.selections.txt.lower", sep="\t", index=False)
+    pd.DataFrame(
+        {"raw": ["a", "b", "c", "unknown"], "corrected": ["A", "B", "C", "unknown"]}
+    ).to_csv(path / "corrections.csv", index=False)
+
+    def fin():
+        shutil.rmtree(path)
+
+    request.addfinalizer(fin)
+    return [path / "1min.wav"]
+
+
 @pytest.fixture()
 def one_min_audio_list():
     return [Path("tests/1min.wav")]
@@ -94,6 +129,58 @@ def test_basic_splitting_operation_default(
     assert split1.exists()
 
 
+def test_annotation_overlaps_with_clips_matches_single_clip():
+    rng = np.random.RandomState(0)
+    begins = np.round(rng.uniform(0, 60, 200), 1)
+    df = pd.DataFrame(
+        {
+            "begin time (s)": begins,
+            "end time (s)": begins + np.round(rng.uniform(0, 8, 200), 1),
+        }
+    ).sort_values(by=["begin time (s)"])
+    clip_begins = np.arange(0, 60, 2.5)
+    clip_ends = clip_begins + 5
+
+    overlaps = annotation_overlaps_with_clips(df, clip_begins, clip_ends)
+    assert len(overlaps) == len(clip_begins)
+    for positions, begin, end in zip(overlaps, clip_begins, clip_ends):
+        expected = annotations_with_overlaps_with_clip(df, begin, end)
+        assert_array_equal(df.index[positions], expected.index)
+
+
+def test_splitting_with_annotations_and_label_corrections(
+    temporary_split_storage, annotated_audio_list
+):
+    dataset = SplitterDataset(
+        annotated_audio_list,
+        annotations=True,
+        label_corrections="tests/_tmp_annotated/corrections.csv",
+        duration=10,
+        overlap=0,
+        output_directory=temporary_split_storage,
+    )
+    results = [row.split("\t") for row in dataset[0]["data"]]
+    for row in results:
+        Path(row[4]).unlink()
+    assert [row[5] for row in results] == ["unknown|A|B", "unknown", "B", "C"]
+
+
+def test_splitting_with_missing_label_correction_raises(
+    temporary_split_storage, annotated_audio_list
+):
+    pd.DataFrame({"raw": ["a", "b"], "corrected": ["A", "B"]}).to_csv(
+        "tests/_tmp_annotated/corrections.csv", index=False
+    )
+    dataset = SplitterDataset(
+        annotated_audio_list,
+        annotations=True,
+        label_corrections="tests/_tmp_annotated/corrections.csv",
+        output_directory=temporary_split_storage,
+    )
+    with pytest.raises(ValueError):
+        dataset[0]
+
+
 def test_basic_splitting_operation_with_include_last_segment(
     temporary_split_storage, splitter_results_last, one_min_audio_list
 ):
@@ -176,3 +263,241 @@ def test_single_target_audio_dataset_with_noise(
     assert_array_equal(channel_0, channel_1)
     assert_array_equal(channel_0, channel_2)
     assert_array_equal(channel_1, channel_2)
+
+
+def test_single_target_audio_dataset_random_trim(
+    single_target_audio_dataset_long_audio_df,
+):
+    dataset = SingleTargetAudioDataset(
+        single_target_audio_dataset_long_audio_df, label_dict=None, random_trim_length=5
+    )
+    clip = dataset.random_audio_clip("tests/great_plains_toad.wav", 5)
+    assert abs(clip.duration() - 5) < 1e-3
+    assert dataset[0]["X"].shape == (3, 224, 224)
+
+
+def test_single_target_audio_dataset_reads_each_duration_once(monkeypatch):
+    import librosa
+
+    df = pd.DataFrame(
+        {
+            "Destination": ["tests/great_plains_toad.wav", "tests/1min.wav"],
+            "NumericLabels": [1, 0],
+        }
+    )
+    dataset = SingleTargetAudioDataset(
+        df,
+        label_dict=None,
+        label_column="NumericLabels",
+        random_trim_length=5,
+        max_overlay_num=1,
+        overlay_prob=1,
+        overlay_class="different",
+    )
+    get_duration = librosa.get_duration
+    paths = []
+
+    def counting_get_duration(filename):
+        paths.append(filename)
+        return get_duration(filename=filename)
+
+    monkeypatch.setattr(librosa, "get_duration", counting_get_duration)
+    dataset[0]
+    assert paths == ["tests/great_plains_toad.wav", "tests/1min.wav"]
+
+
+def test_single_target_audio_dataset_random_trim_too_long(
+    single_target_audio_dataset_df,
+):
+    dataset = SingleTargetAudioDataset(
+        single_target_audio_dataset_df, label_dict=None, random_trim_length=5
+    )
+    with pytest.raises(ValueError):
+        dataset[0]
+
+
+def test_split_audio_dataset_matches_single_target_audio_dataset():
+    dataset = SplitAudioDataset(
+        ["tests/great_plains_toad.wav"],
+        clip_duration=2,
+        clip_overlap=1,
+        height=32,
+        width=32,
+        clips_per_block=3,
+    )
+    items = list(dataset)
+
+    audio = Audio.from_file("tests/great_plains_toad.wav", sample_rate=22050)
+    clips = audio.split(2, 1)
+    assert len(items) == len(clips)
+
+    single_target = SingleTargetAudioDataset(
+        pd.DataFrame({"Destination": []}), label_dict=None, height=32, width=32
+    )
+    for item, clip in zip(items, clips):
+        assert item["source"] == "tests/great_plains_toad.wav"
+        assert item["begin_time"] == clip["begin_time"]
+        assert item["end_time"] == clip["end_time"]
+        image = single_target.image_from_audio(clip["clip"], mode="L")
+        expected = single_target.transform(image.convert("RGB"))
+        assert torch.allclose(item["X"], expected, atol=1e-6)
+
+
+def test_split_audio_dataset_with_workers():
+    files = ["tests/silence_10s.mp3", "tests/great_plains_toad.wav"]
+    dataset = SplitAudioDataset(files, clip_duration=5, height=32, width=32)
+    dataloader = DataLoader(dataset, batch_size=2, num_workers=2)
+    sources = [s for batch in dataloader for s in batch["source"]]
+    assert sorted(set(sources)) == sorted(files)
+    assert sources.count("tests/silence_10s.mp3") == 2
+
+
+@pytest.mark.parametrize("radius", [0, 0.3, 0.7, 2.5])
+def test_gaussian_blur_matches_pil(radius):
+    pixels = np.random.RandomState(0).randint(0, 256, size=(20, 30), dtype=np.uint8)
+    expected = Image.fromarray(pixels).filter(ImageFilter.GaussianBlur(radius=radius))
+    blurred = gaussian_blur(torch.from_numpy(pixels).float()[None], radius)
+    assert blurred.shape == (1, 20, 30)
+    # PIL rounds to integers after each of its 6 box blurs
+    assert np.abs(blurred[0].numpy() - np.array(expected)).max() <= 3
+
+
+def test_single_target_audio_dataset_tensor_pipeline(
+    single_target_audio_dataset_long_audio_df,
+):
+    kwargs = {"label_dict": None, "height": 64, "width": 96}
+    expected = SingleTargetAudioDataset(
+        single_target_audio_dataset_long_audio_df, **kwargs
+    )[0]["X"]
+    X = SingleTargetAudioDataset(
+        single_target_audio_dataset_long_audio_df, tensor_pipeline=True, **kwargs
+    )[0]["X"]
+    assert X.shape == expected.shape
+    # differences come from rounding to 8-bit integers in the PIL pipeline
+    assert (X - expected).abs().max() <= 2 * 2 / 255
+    assert_array_equal(X[0], X[2])
+
+
+def test_single_target_audio_dataset_tensor_pipeline_overlay():
+    df = pd.DataFrame(
+        {
+            "Destination": ["tests/great_plains_toad.wav", "tests/silence_10s.mp3"],
+            "NumericLabels": [1, 0],
+        }
+    )
+    kwargs = {
+        "label_dict": None,
+        "label_column": "NumericLabels",
+        "height": 64,
+        "width": 64,
+        "random_trim_length": 2,
+        "max_overlay_num": 1,
+        "overlay_prob": 1,
+        "overlay_class": "different",
+    }
+    np.random.seed(0)
+    expected = SingleTargetAudioDataset(df, **kwargs)[1]["X"]
+    np.random.seed(0)
+    X = SingleTargetAudioDataset(df, tensor_pipeline=True, **kwargs)[1]["X"]
+    assert (X - expected).abs().max() <= 4 * 2 / 255
+
+
+def overlay_index_dataset(**kwargs):
+    df = pd.DataFrame(
+        {
+            "Destination": ["a0", "b0", "a1", "c0", "b1", "c1"],
+            "NumericLabels": [0, 1, 0, 2, 1, 2],
+            "weights": [1.0, 0.0, 0.0, 2.0, 1.0, 0.0],
+        }
+    )
+    return SingleTargetAudioDataset(
+        df, label_dict=None, label_column="NumericLabels", max_overlay_num=1, **kwargs
+    )
+
+
+def test_random_overlay_path_different_class():
+    dataset = overlay_index_dataset(overlay_class="different")
+    np.random.seed(0)
+    paths = {dataset.random_overlay_path(1) for _ in range(200)}
+    assert paths == {"a0", "a1", "c0", "c1"}
+
+
+def test_random_overlay_path_overlay_class():
+    dataset = overlay_index_dataset(overlay_class=2)
+    np.random.seed(0)
+    paths = {dataset.random_overlay_path(0) for _ in range(100)}
+    assert paths == {"c0", "c1"}
+
+
+def test_random_overlay_path_with_weights():
+    dataset = overlay_index_dataset(
+        overlay_class="different", overlay_sample_weight_column="weights"
+    )
+    np.random.seed(0)
+    paths = [dataset.random_overlay_path(0) for _ in range(3000)]
+    assert set(paths) == {"c0", "b1"}
+    assert abs(paths.count("c0") / len(paths) - 2 / 3) < 0.05
+
+
+def test_random_overlay_path_raises_without_other_classes():
+    dataset = overlay_index_dataset(overlay_class="different")
+    dataset.df = dataset.df[dataset.df["NumericLabels"] == 0]
+    dataset.build_overlay_index()
+    with pytest.raises(ValueError):
+        dataset.random_overlay_path(0)
+
+
+def test_single_target_audio_dataset_pickles_without_df(
+    single_target_audio_dataset_df, monkeypatch
+):
+    import pickle
+    import opensoundscape.datasets
+
+    dataset = SingleTargetAudioDataset(
+        single_target_audio_dataset_df,
+        label_dict=None,
+        label_column="NumericLabels",
+        height=64,
+        width=64,
+    )
+    # as when pickled to start a spawned worker process
+    monkeypatch.setattr(opensoundscape.datasets, "get_spawning_popen", lambda: object())
+    unpickled = pickle.loads(pickle.dumps(dataset))
+    assert unpickled.df is None
+    assert len(unpickled) == len(dataset)
+    assert_array_equal(unpickled[0]["y"], dataset[0]["y"])
+
+
+def test_single_target_audio_dataset_copies_keep_df(single_target_audio_dataset_df):
+    import copy
+    import pickle
+
+    dataset = SingleTargetAudioDataset(
+        single_target_audio_dataset_df,
+        label_dict=None,
+        label_column="NumericLabels",
+        height=64,
+        width=64,
+    )
+    for copied in [copy.deepcopy(dataset), pickle.loads(pickle.dumps(dataset))]:
+        pd.testing.assert_frame_equal(copied.df, dataset.df)
+        assert list(copied.filenames) == list(dataset.filenames)
+
+
+def test_random_overlay_path_skips_nan_labels():
+    df = pd.DataFrame(
+        {
+            "Destination": ["n0", "a0", "b0", "n1", "b1"],
+            "NumericLabels": [np.nan, 0, 1, np.nan, 1],
+        }
+    )
+    dataset = SingleTargetAudioDataset(
+        df,
+        label_dict=None,
+        label_column="NumericLabels",
+        max_overlay_num=1,
+        overlay_class="different",
+    )
+    np.random.seed(0)
+    assert {dataset.random_overlay_path(0) for _ in range(100)} == {"b0", "b1"}
+    assert {dataset.random_overlay_path(1) for _ in range(100)} == {"a0"}
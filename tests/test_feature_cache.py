@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+from opensoundscape.feature_cache import FeatureCache
+from opensoundscape.datasets import SingleTargetAudioDataset
+import pytest
+import numpy as np
+import pandas as pd
+from pathlib import Path
+import shutil
+
+
+@pytest.fixture()
+def cache_dir(request):
+    path = Path("tests/_tmp_feature_cache")
+
+    def fin():
+        shutil.rmtree(path, ignore_errors=True)
+
+    request.addfinalizer(fin)
+    return path
+
+
+def test_put_and_get(cache_dir):
+    cache = FeatureCache(cache_dir)
+    key = cache.key("tests/veryshort.wav", sample_rate=22050)
+    assert cache.get(key) is None
+    cache.put(key, np.arange(10, dtype=np.float32))
+    array = cache.get(key)
+    np.testing.assert_array_equal(array, np.arange(10))
+    assert not array.flags.writeable
+
+
+def test_key_depends_on_params(cache_dir):
+    cache = FeatureCache(cache_dir)
+    key1 = cache.key("tests/veryshort.wav", sample_rate=22050)
+    key2 = cache.key("tests/veryshort.wav", sample_rate=32000)
+    key3 = cache.key("tests/1min.wav", sample_rate=22050)
+    assert len({key1, key2, key3}) == 3
+    assert key1 == cache.key("tests/veryshort.wav", sample_rate=22050)
+
+
+def test_eviction_removes_least_recently_used(cache_dir):
+    import os
+
+    cache = FeatureCache(cache_dir, max_bytes=2500)
+    for i, key in enumerate(["a", "b"]):
+        cache.put(key, np.zeros(1000, dtype=np.uint8))
+        os.utime(cache_dir / f"{key}.npy", (i, i))
+    cache.put("c", np.zeros(1000, dtype=np.uint8))
+    assert cache.get("a") is None
+    assert cache.get("b") is not None
+    assert cache.get("c") is not None
+
+
+def test_put_scans_directory_only_when_over_limit(cache_dir):
+    cache = FeatureCache(cache_dir, max_bytes=5000)
+    scans = []
+    entries = cache._entries
+    cache._entries = lambda: scans.append(1) or entries()
+    for key in ["a", "b", "c", "d"]:
+        cache.put(key, np.zeros(1000, dtype=np.uint8))
+    # one scan for the initial size, one to evict when "e" goes over the limit
+    assert len(scans) == 1
+    cache.put("e", np.zeros(1000, dtype=np.uint8))
+    assert len(scans) == 2
+    assert len(list(cache_dir.glob("*.npy"))) == 4
+
+
+def test_get_does_not_touch_without_limit(cache_dir):
+    import os
+
+    cache = FeatureCache(cache_dir)
+    cache.put("a", np.zeros(10))
+    os.utime(cache_dir / "a.npy", (0, 0))
+    assert cache.get("a") is not None
+    assert os.stat(cache_dir / "a.npy").st_mtime == 0
+
+
+def test_dataset_with_cache(cache_dir):
+    df = pd.DataFrame({"Destination": ["tests/great_plains_toad.wav"]})
+    dataset = SingleTargetAudioDataset(df, label_dict=None, cache_dir=cache_dir)
+    uncached = SingleTargetAudioDataset(df, label_dict=None)
+    first = dataset[0]["X"]
+    assert len(list(cache_dir.glob("*.npy"))) == 1
+    second = dataset[0]["X"]
+    np.testing.assert_array_equal(first, second)
+    np.testing.assert_array_equal(first, uncached[0]["X"])
+
+
+def test_dataset_with_cache_random_trim(cache_dir):
+    df = pd.DataFrame({"Destination": ["tests/great_plains_toad.wav"]})
+    dataset = SingleTargetAudioDataset(
+        df, label_dict=None, cache_dir=cache_dir, random_trim_length=5
+    )
+    clip = dataset.random_audio_clip("tests/great_plains_toad.wav", 5)
+    assert abs(clip.duration() - 5) < 1e-3
+    assert len(list(cache_dir.glob("*.npy"))) == 1
@@ -1,4 +1,5 @@
 from opensoundscape import helpers
+from pathlib import Path
 from numpy import nan
 import numpy as np
 import pytest
@@ -61,3 +62,27 @@ def test_jitter():
 def test_jitter_nonexistant_raises_value_error():
     with pytest.raises(ValueError):
         helpers.jitter([1, 2, 3], 1, distribution="nonexistant")
+
+
+def test_packed_strings():
+    strings = helpers.PackedStrings(["a.wav", "", "dir/ü.wav", Path("b.wav")])
+    assert len(strings) == 4
+    assert strings[0] == "a.wav"
+    assert strings[1] == ""
+    assert strings[2] == "dir/ü.wav"
+    assert strings[-1] == "b.wav"
+    assert strings[[0, 3]] == ["a.wav", "b.wav"]
+    assert list(strings) == ["a.wav", "", "dir/ü.wav", "b.wav"]
+    with pytest.raises(IndexError):
+        strings[4]
+
+
+def test_sliding_windows():
+    array = np.arange(12.0).reshape(2, 6)
+    windows = helpers.sliding_windows(array, 4)
+    assert windows.shape == (2, 3, 4)
+    np.testing.assert_array_equal(windows[1, 2], [8, 9, 10, 11])
+    assert np.shares_memory(windows, array)
+    assert not windows.flags.writeable
+    with pytest.raises(ValueError):
+        helpers.sliding_windows(array, 7)
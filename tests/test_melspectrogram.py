@@ -44,3 +44,30 @@ def test_melspectrogram_to_image_with_mode(veryshort_wav_str):
     img = mel_spec.to_image(shape=(10, 20), mode="L")
     arr = np.array(img)
     assert arr.shape == (20, 10)
+
+
+def test_melspectrogram_matches_librosa(veryshort_wav_str):
+    from librosa.feature import melspectrogram
+
+    audio = Audio.from_file(veryshort_wav_str, sample_rate=22050)
+    mel_spec = MelSpectrogram.from_audio(audio)
+    S = melspectrogram(
+        y=audio.samples,
+        sr=audio.sample_rate,
+        n_fft=1024,
+        win_length=256,
+        hop_length=32,
+        window="flattop",
+        n_mels=128,
+        htk=True,
+        fmin=0,
+        fmax=audio.sample_rate / 2,
+    )
+    np.testing.assert_allclose(mel_spec.S, S[::-1], rtol=1e-4, atol=1e-10)
+
+
+def test_melspectrogram_win_length_none(veryshort_wav_str):
+    audio = Audio.from_file(veryshort_wav_str, sample_rate=22050)
+    mel_spec = MelSpectrogram.from_audio(audio, n_fft=512, win_length=None)
+    expected = MelSpectrogram.from_audio(audio, n_fft=512, win_length=512)
+    np.testing.assert_array_equal(mel_spec.S, expected.S)
@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+from opensoundscape.overlay_pool import OverlayPool
+from opensoundscape.datasets import SingleTargetAudioDataset
+import pytest
+import numpy as np
+import pandas as pd
+
+
+@pytest.fixture()
+def overlay_df():
+    return pd.DataFrame(
+        {
+            "Destination": [
+                "tests/great_plains_toad.wav",
+                "tests/1min.wav",
+                "tests/silence_10s.mp3",
+            ],
+            "NumericLabels": [1, 0, 0],
+        }
+    )
+
+
+def test_put_and_get():
+    pool = OverlayPool(3, clip_length=1, sample_rate=10)
+    assert pool.samples.is_shared()
+    pool.put(1, np.arange(12, dtype=np.float32), label=2)
+    audio = pool.get(1)
+    assert audio.sample_rate == 10
+    np.testing.assert_array_equal(audio.samples, np.arange(10))
+    pool.put(1, np.ones(5, dtype=np.float32), label=2)
+    np.testing.assert_array_equal(audio.samples, [1] * 5 + [0] * 5)
+
+
+def test_draw_skips_empty_and_excluded_slots():
+    pool = OverlayPool(4, clip_length=1, sample_rate=10)
+    pool.put(0, np.zeros(10), label=0)
+    pool.put(2, np.ones(10), label=1)
+    for _ in range(20):
+        assert pool.draw(exclude_label=0).samples[0] == 1
+        assert pool.draw(label=0).samples[0] == 0
+    with pytest.raises(ValueError):
+        pool.draw(label=3)
+
+
+def test_dataset_with_overlay_pool(overlay_df):
+    np.random.seed(1)
+    dataset = SingleTargetAudioDataset(
+        overlay_df,
+        label_dict=None,
+        label_column="NumericLabels",
+        height=64,
+        width=64,
+        random_trim_length=1,
+        max_overlay_num=1,
+        overlay_prob=1,
+        overlay_class="different",
+        overlay_pool_size=8,
+    )
+    labels = dataset.overlay_pool.labels.numpy()
+    assert (labels >= 0).all()
+    assert (labels == dataset.overlay_label_codes[0]).any()
+    assert dataset[0]["X"].shape == (3, 64, 64)
+
+    before = dataset.overlay_pool.samples.clone()
+    dataset.refresh_overlay_pool(fraction=0.5)
+    changed = (dataset.overlay_pool.samples != before).any(dim=1)
+    assert changed.sum() <= 4
+
+
+def test_dataset_overlay_pool_requires_trim_length(overlay_df):
+    with pytest.raises(ValueError):
+        SingleTargetAudioDataset(
+            overlay_df,
+            label_dict=None,
+            label_column="NumericLabels",
+            max_overlay_num=1,
+            overlay_class="different",
+            overlay_pool_size=4,
+        )
+
+
+def test_slots_of_pool():
+    pool = OverlayPool(4, clip_length=1, sample_rate=10)
+    pool.put(0, np.zeros(10), label=0)
+    pool.put(2, np.ones(10), label=1)
+    np.testing.assert_array_equal(pool.slots(), [0, 2])
+    np.testing.assert_array_equal(pool.slots(exclude_label=0), [2])
+    assert len(pool.slots(label=3)) == 0
+
+
+def test_dataset_overlay_pool_has_every_label(overlay_df):
+    # one row of label 1 and many rows of label 0
+    df = overlay_df.iloc[[0, 1, 1, 1, 1, 2, 2, 2]].reset_index(drop=True)
+    for seed in range(5):
+        np.random.seed(seed)
+        dataset = SingleTargetAudioDataset(
+            df,
+            label_dict=None,
+            label_column="NumericLabels",
+            height=64,
+            width=64,
+            random_trim_length=1,
+            max_overlay_num=1,
+            overlay_prob=1,
+            overlay_class="different",
+            overlay_pool_size=4,
+        )
+        labels = dataset.overlay_pool.labels.numpy()
+        assert (np.bincount(labels) == 2).all()
+        dataset.refresh_overlay_pool(fraction=0.75)
+        labels = dataset.overlay_pool.labels.numpy()
+        assert (np.bincount(labels) == 2).all()
+
+
+def test_dataset_overlay_pool_falls_back_to_files(overlay_df):
+    dataset = SingleTargetAudioDataset(
+        overlay_df,
+        label_dict=None,
+        label_column="NumericLabels",
+        height=64,
+        width=64,
+        random_trim_length=1,
+        max_overlay_num=1,
+        overlay_prob=1,
+        overlay_class="different",
+        overlay_pool_size=1,
+    )
+    for i in range(len(overlay_df)):
+        assert dataset[i]["X"].shape == (3, 64, 64)
+
+
+def test_dataset_overlay_pool_raises_on_short_overlay_file(overlay_df):
+    with pytest.raises(ValueError, match="overlay file"):
+        SingleTargetAudioDataset(
+            overlay_df,
+            label_dict=None,
+            label_column="NumericLabels",
+            random_trim_length=120,
+            max_overlay_num=1,
+            overlay_class="different",
+            overlay_pool_size=4,
+        )
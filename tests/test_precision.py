@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+import opensoundscape
+from opensoundscape.audio import Audio
+from opensoundscape.audio_tools import bandpass_filter
+from opensoundscape.spectrogram import Spectrogram, SpectrogramBatch
+from opensoundscape.melspectrogram import MelSpectrogram
+import pytest
+import numpy as np
+
+
+@pytest.fixture()
+def float64_default(request):
+    opensoundscape.set_default_dtype(np.float64)
+
+    def fin():
+        opensoundscape.set_default_dtype(np.float32)
+
+    request.addfinalizer(fin)
+
+
+@pytest.fixture()
+def veryshort_wav_str():
+    return "tests/veryshort.wav"
+
+
+def test_default_dtype_is_float32():
+    assert opensoundscape.get_default_dtype() == np.float32
+
+
+def test_set_default_dtype_rejects_integers():
+    with pytest.raises(ValueError):
+        opensoundscape.set_default_dtype(np.int16)
+
+
+def test_pipeline_is_float32_by_default(veryshort_wav_str):
+    audio = Audio.from_file(veryshort_wav_str, sample_rate=22050)
+    assert audio.samples.dtype == np.float32
+    assert audio.bandpass(100, 5000, 9).samples.dtype == np.float32
+    assert Spectrogram.from_audio(audio).spectrogram.dtype == np.float32
+    assert MelSpectrogram.from_audio(audio).S.dtype == np.float32
+    clips, _ = audio.split_samples(0.05)
+    assert SpectrogramBatch.from_samples(clips, 22050).spectrograms.dtype == np.float32
+
+
+def test_pipeline_honours_default_dtype(float64_default, veryshort_wav_str):
+    audio = Audio.from_file(veryshort_wav_str, sample_rate=22050)
+    assert audio.samples.dtype == np.float64
+    assert Spectrogram.from_audio(audio).spectrogram.dtype == np.float64
+    assert MelSpectrogram.from_audio(audio).S.dtype == np.float64
+
+
+def test_per_call_dtype_overrides_default(veryshort_wav_str):
+    audio = Audio.from_file(veryshort_wav_str, dtype=np.float64)
+    assert audio.samples.dtype == np.float64
+    spec = Spectrogram.from_audio(audio, dtype=np.float32)
+    assert spec.spectrogram.dtype == np.float32
+    filtered = bandpass_filter(audio.samples, 100, 5000, 44100, dtype="float64")
+    assert filtered.dtype == np.float64
+
+
+def test_float32_spectrogram_close_to_float64(veryshort_wav_str):
+    audio = Audio.from_file(veryshort_wav_str, dtype=np.float64)
+    spec32 = Spectrogram.from_audio(audio, dtype=np.float32)
+    spec64 = Spectrogram.from_audio(audio, dtype=np.float64)
+    np.testing.assert_allclose(spec32.spectrogram, spec64.spectrogram, rtol=1e-4)
@@ -5,6 +5,8 @@ from opensoundscape import ribbit
 import pytest
 import numpy as np
 import pandas as pd
+from pathlib import Path
+import shutil
 
 
 @pytest.fixture()
@@ -12,6 +14,34 @@ def gpt_path():
     return "tests/great_plains_toad.wav"
 
 
+@pytest.fixture()
+def ribbit_tmp_dir(request):
+    path = Path("tests/_tmp_ribbit")
+    path.mkdir()
+
+    def fin():
+        shutil.rmtree(path)
+
+    request.addfinalizer(fin)
+    return path
+
+
+@pytest.fixture()
+def species_df():
+    return pd.DataFrame(
+        {
+            "species": ["sp1", "sp2"],
+            "pulse_rate_low": [5, 10],
+            "pulse_rate_high": [10, 15],
+            "low_f": [1000, 1000],
+            "high_f": [2000, 2000],
+            "reject_low": [0, 0],
+            "reject_high": [500, 500],
+            "window_length": [1.0, 1.0],
+        }
+    )
+
+
 def test_calculate_pulse_score():
     sr = 100
     t = np.linspace(0, 1, sr)
@@ -39,6 +69,49 @@ def test_calculate_pulse_score_zero_len_input():
         )
 
 
+def test_calculate_pulse_scores_matches_single_window():
+    sr = 100
+    t = np.linspace(0, 3, 3 * sr)
+    windows = np.stack(
+        [np.sin(t * 2 * np.pi * rate) for rate in [5, 12, 20]]
+    ) + np.linspace(0, 1, 3 * sr)
+    scores = ribbit.calculate_pulse_scores(
+        windows, amplitude_sample_rate=sr, pulse_rate_range=[10, 15]
+    )
+    expected = [
+        ribbit.calculate_pulse_score(
+            w, amplitude_sample_rate=sr, pulse_rate_range=[10, 15]
+        )
+        for w in windows
+    ]
+    assert np.allclose(scores, expected)
+    assert np.argmax(scores) == 1
+
+
+def test_calculate_pulse_scores_no_frequencies_in_range():
+    windows = np.ones((2, 100))
+    scores = ribbit.calculate_pulse_scores(
+        windows, amplitude_sample_rate=100, pulse_rate_range=[60, 70]
+    )
+    assert np.array_equal(scores, [0, 0])
+
+
+def test_ribbit_returns_arrays(gpt_path):
+    audio = Audio.from_file(gpt_path, sample_rate=32000)
+    spec = Spectrogram.from_audio(audio)
+    scores, times = ribbit.ribbit(
+        spec,
+        pulse_rate_range=[5, 10],
+        signal_band=[1000, 2000],
+        window_len=1.0,
+        noise_bands=[[0, 500]],
+    )
+    assert isinstance(scores, np.ndarray)
+    assert isinstance(times, np.ndarray)
+    assert len(scores) == len(times) == 44
+    assert np.allclose(np.diff(times), times[1])
+
+
 def test_ribbit():
     path = "./tests/silence_10s.mp3"
     audio = Audio.from_file(path, sample_rate=22050)
@@ -99,3 +172,253 @@ def test_summarize_top_scores(gpt_path):
     df = ribbit.pulse_finder_species_set(spec, df)
 
     ribbit.summarize_top_scores(["1", "2"], [df, df], scale_factor=10.0)
+
+
+def test_band_amplitudes_match_spectrogram(gpt_path):
+    audio = Audio.from_file(gpt_path, sample_rate=32000)
+    spec = Spectrogram.from_audio(audio)
+    band_amplitudes = ribbit.BandAmplitudes(spec)
+    # spectrograms are float32, the cumulative sum is float64
+    assert np.allclose(
+        band_amplitudes.amplitude([1000, 2000]),
+        spec.amplitude([1000, 2000]),
+        rtol=1e-5,
+        atol=1e-3,
+    )
+    assert np.allclose(
+        band_amplitudes.net_amplitude([1000, 2000], [[0, 500], [5000, 6000]]),
+        spec.net_amplitude([1000, 2000], [[0, 500], [5000, 6000]]),
+        rtol=1e-5,
+        atol=1e-5,
+    )
+
+
+def test_pulsefinder_species_set_matches_ribbit(gpt_path):
+    df = pd.DataFrame(
+        {
+            "species": ["sp1", "sp2", "sp3", "sp4"],
+            "pulse_rate_low": [5, 10, 0, 10],
+            "pulse_rate_high": [10, 15, 10, 20],
+            "low_f": [1000, 1000, 1000, 2000],
+            "high_f": [2000, 2000, 2000, 3000],
+            "reject_low": [0, np.nan, 0, 0],
+            "reject_high": [500, np.nan, 500, 500],
+            "window_length": [1.0, 2.0, 1.0, 1.0],
+        }
+    )
+    audio = Audio.from_file(gpt_path, sample_rate=32000)
+    spec = Spectrogram.from_audio(audio, overlap_samples=256)
+
+    results = ribbit.pulse_finder_species_set(spec, df)
+
+    assert list(results.index) == ["sp1", "sp2", "sp3", "sp4"]
+    # pulse rate of 0 can't be analyzed
+    assert len(results.at["sp3", "score"]) == 0
+    assert np.isnan(results.at["sp3", "max_score"])
+    for species, signal_band, pulse_rate_range, window_len, noise_bands in [
+        ("sp1", [1000, 2000], [5, 10], 1.0, [[0, 500]]),
+        ("sp2", [1000, 2000], [10, 15], 2.0, None),
+        ("sp4", [2000, 3000], [10, 20], 1.0, [[0, 500]]),
+    ]:
+        scores, times = ribbit.ribbit(
+            spec, signal_band, pulse_rate_range, window_len, noise_bands
+        )
+        assert np.allclose(results.at[species, "score"], scores)
+        assert np.allclose(results.at[species, "t"], times)
+        assert np.isclose(results.at[species, "max_score"], max(scores))
+        assert results.at[species, "time_of_max_score"] == times[np.argmax(scores)]
+
+
+def test_summarize_top_scores_values(species_df):
+    results_1 = species_df.assign(max_score=[1.0, 2.0])
+    results_2 = species_df.assign(max_score=[3.0, np.nan]).iloc[::-1]
+    summary = ribbit.summarize_top_scores(
+        ["1", "2"], [results_1, results_2], scale_factor=10.0
+    )
+    assert list(summary.index) == ["1", "2"]
+    assert list(summary.columns) == ["sp1", "sp2"]
+    assert np.array_equal(summary.values, [[10, 20], [30, np.nan]], equal_nan=True)
+
+
+def test_ribbit_batch(ribbit_tmp_dir, species_df, gpt_path):
+    files = [gpt_path, "tests/silence_10s.mp3"]
+    output_path = ribbit_tmp_dir / "results.csv"
+    summary = ribbit.ribbit_batch(
+        files,
+        species_df,
+        output_path,
+        num_workers=2,
+        audio_kwargs={"sample_rate": 32000},
+    )
+    assert list(summary.index) == files
+    assert list(summary.columns) == ["sp1", "sp2"]
+
+    spec = Spectrogram.from_audio(Audio.from_file(gpt_path, sample_rate=32000))
+    expected = ribbit.pulse_finder_species_set(spec, species_df)
+    assert np.allclose(summary.loc[gpt_path].values, expected["max_score"].values)
+
+    results = pd.read_csv(output_path)
+    assert list(results.columns) == [
+        "file",
+        "species",
+        "max_score",
+        "time_of_max_score",
+    ]
+    assert len(results) == 4
+
+
+def test_ribbit_batch_resumes(ribbit_tmp_dir, species_df, gpt_path):
+    files = [gpt_path, "tests/silence_10s.mp3"]
+    output_path = ribbit_tmp_dir / "results.csv"
+    # one complete file and one incompletely written file
+    pd.DataFrame(
+        {
+            "file": [gpt_path, gpt_path, "tests/silence_10s.mp3"],
+            "species": ["sp1", "sp2", "sp1"],
+            "max_score": [1.0, 2.0, 3.0],
+            "time_of_max_score": [0.0, 0.0, 0.0],
+        }
+    ).to_csv(output_path, index=False)
+
+    summary = ribbit.ribbit_batch(
+        files, species_df, output_path, audio_kwargs={"sample_rate": 32000}
+    )
+
+    assert np.array_equal(summary.loc[gpt_path].values, [1.0, 2.0])
+    results = pd.read_csv(output_path)
+    assert len(results) == 4
+    assert (results["file"] == "tests/silence_10s.mp3").sum() == 2
+
+
+def test_ribbit_batch_directory(ribbit_tmp_dir, species_df, gpt_path):
+    shutil.copy(gpt_path, ribbit_tmp_dir / "a.wav")
+    summary = ribbit.ribbit_batch(
+        ribbit_tmp_dir, species_df, ribbit_tmp_dir / "results.csv", resume=False
+    )
+    assert list(summary.index) == [str(ribbit_tmp_dir / "a.wav")]
+
+
+def test_ribbit_window_hop(gpt_path):
+    audio = Audio.from_file(gpt_path, sample_rate=32000)
+    spec = Spectrogram.from_audio(audio)
+    kwargs = dict(
+        signal_band=[1000, 2000], pulse_rate_range=[5, 10], noise_bands=[[0, 500]]
+    )
+    # 125 spectrogram columns per second: windows of 125 columns, hops of 25
+    scores, times = ribbit.ribbit(spec, window_len=1.0, **kwargs)
+    hop_scores, hop_times = ribbit.ribbit(
+        spec, window_len=1.0, window_hop=0.2, **kwargs
+    )
+    assert len(hop_scores) == len(hop_times) >= 5 * len(scores) - 4
+    # every fifth overlapping window is one of the non-overlapping windows
+    assert np.allclose(hop_scores[::5][: len(scores)], scores)
+    assert np.allclose(hop_times[::5][: len(times)], times)
+    assert np.allclose(np.diff(hop_times), 0.2)
+
+
+def test_ribbit_final_window(gpt_path):
+    audio = Audio.from_file(gpt_path, sample_rate=32000)
+    spec = Spectrogram.from_audio(audio)
+    sample_rate = (len(spec.times) - 1) / (spec.times[-1] - spec.times[0])
+    n_samples = int(3.0 * sample_rate)
+    signal_len = len(spec.times)
+    assert signal_len % n_samples != 0
+    kwargs = dict(signal_band=[1000, 2000], pulse_rate_range=[5, 10], window_len=3.0)
+
+    drop_scores, drop_times = ribbit.ribbit(spec, **kwargs)
+    pad_scores, pad_times = ribbit.ribbit(spec, final_window="pad", **kwargs)
+    shift_scores, shift_times = ribbit.ribbit(spec, final_window="shift", **kwargs)
+
+    assert len(drop_times) == signal_len // n_samples
+    assert len(pad_times) == len(shift_times) == len(drop_times) + 1
+    assert np.allclose(pad_scores[:-1], drop_scores)
+    assert np.allclose(shift_scores[:-1], drop_scores)
+    assert np.isclose(pad_times[-1], len(drop_times) * n_samples / sample_rate)
+    assert np.isclose(shift_times[-1], (signal_len - n_samples) / sample_rate)
+
+    with pytest.raises(ValueError):
+        ribbit.ribbit(spec, final_window="bad", **kwargs)
+
+
+def test_overlapping_windows_are_views():
+    amplitude = np.arange(100.0)
+    windows, start_samples = ribbit._windows(amplitude, 10, 3, "drop")
+    assert np.shares_memory(windows, amplitude)
+    assert np.array_equal(start_samples, np.arange(0, 91, 3))
+    assert np.array_equal(windows[5], amplitude[15:25])
+
+
+def test_pulsefinder_species_set_window_hop(gpt_path, species_df):
+    audio = Audio.from_file(gpt_path, sample_rate=32000)
+    spec = Spectrogram.from_audio(audio)
+    results = ribbit.pulse_finder_species_set(
+        spec, species_df, window_hop=0.25, final_window="shift"
+    )
+    scores, times = ribbit.ribbit(
+        spec,
+        [1000, 2000],
+        [5, 10],
+        1.0,
+        [[0, 500]],
+        window_hop=0.25,
+        final_window="shift",
+    )
+    assert np.allclose(results.at["sp1", "score"], scores)
+    assert np.allclose(results.at["sp1", "t"], times)
+
+
+@pytest.mark.parametrize(
+    "window_len,window_hop,final_window",
+    [(1.0, None, "drop"), (1.0, 0.3, "pad"), (3.0, None, "shift")],
+)
+def test_ribbit_stream_matches_ribbit(gpt_path, window_len, window_hop, final_window):
+    audio = Audio.from_file(gpt_path, sample_rate=32000)
+    kwargs = dict(
+        signal_band=[1000, 2000],
+        pulse_rate_range=[5, 10],
+        window_len=window_len,
+        noise_bands=[[0, 500]],
+        window_hop=window_hop,
+        final_window=final_window,
+    )
+    expected_scores, expected_times = ribbit.ribbit(
+        Spectrogram.from_audio(audio), **kwargs
+    )
+
+    stream = ribbit.RibbitStream(32000, **kwargs)
+    scores = []
+    times = []
+    chunk_sizes = np.random.RandomState(0).randint(100, 40000, len(audio.samples))
+    chunk_starts = np.cumsum(np.append(0, chunk_sizes))
+    for start, end in zip(chunk_starts, chunk_starts[1:]):
+        if start >= len(audio.samples):
+            break
+        chunk_scores, chunk_times = stream.push(audio.samples[start:end])
+        scores.append(chunk_scores)
+        times.append(chunk_times)
+        # only the amplitude needed for the next window is kept
+        assert len(stream._amplitude) <= stream.n_samples_per_window
+    chunk_scores, chunk_times = stream.flush()
+    scores.append(chunk_scores)
+    times.append(chunk_times)
+
+    assert np.allclose(np.concatenate(scores), expected_scores, rtol=1e-4)
+    assert np.allclose(np.concatenate(times), expected_times)
+
+
+def test_ribbit_stream_file(gpt_path):
+    audio = Audio.from_file(gpt_path, sample_rate=32000)
+    expected_scores, expected_times = ribbit.ribbit(
+        Spectrogram.from_audio(audio), [1000, 2000], [5, 10], 1.0, [[0, 500]]
+    )
+    scores, times = ribbit.ribbit_stream(
+        gpt_path,
+        [1000, 2000],
+        [5, 10],
+        1.0,
+        [[0, 500]],
+        chunk_duration=7,
+        sample_rate=32000,
+    )
+    assert np.allclose(scores, expected_scores, rtol=1e-4)
+    assert np.allclose(times, expected_times)
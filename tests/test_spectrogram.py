@@ -1,8 +1,9 @@
 #!/usr/bin/env python3
 from opensoundscape.audio import Audio
-from opensoundscape.spectrogram import Spectrogram
+from opensoundscape.spectrogram import Spectrogram, SpectrogramBatch
 import pytest
 import numpy as np
+import torch
 
 
 @pytest.fixture()
@@ -116,3 +117,58 @@ def test_to_image():
         ).to_image(),
         Image,
     )
+
+
+def test_to_tensor_matches_to_image():
+    spec = Spectrogram(
+        np.random.RandomState(0).uniform(-110, -10, size=(50, 80)),
+        np.linspace(0, 100, 50),
+        np.linspace(0, 10, 80),
+    )
+    expected = np.array(spec.to_image(shape=(40, 30), mode="L")) / 255
+    tensor = spec.to_tensor(shape=(40, 30))
+    assert tensor.shape == (1, 30, 40)
+    assert np.abs(tensor[0].numpy() - expected).max() <= 2 / 255
+
+
+def test_to_tensor_without_antialias_matches_to_image(monkeypatch):
+    import opensoundscape.spectrogram
+
+    monkeypatch.setattr(
+        opensoundscape.spectrogram, "_interpolate_supports_antialias", lambda: False
+    )
+    spec = Spectrogram(
+        np.random.RandomState(0).uniform(-110, -10, size=(50, 80)),
+        np.linspace(0, 100, 50),
+        np.linspace(0, 10, 80),
+    )
+    expected = np.array(spec.to_image(shape=(40, 30), mode="L")) / 255
+    tensor = spec.to_tensor(shape=(40, 30))
+    assert tensor.shape == (1, 30, 40)
+    assert tensor.dtype == torch.float32
+    assert np.abs(tensor[0].numpy() - expected).max() <= 2 / 255
+
+
+def test_spectrogram_batch_matches_from_audio():
+    audio = Audio.from_file("tests/1min.wav", sample_rate=22050)
+    clips, times = audio.split_samples(5.0, 1.0)
+    batch = SpectrogramBatch.from_samples(clips, audio.sample_rate)
+    assert len(batch) == len(clips)
+    for i in [0, len(clips) - 1]:
+        spec = Spectrogram.from_audio(Audio(clips[i], audio.sample_rate))
+        assert isinstance(batch[i], Spectrogram)
+        np.testing.assert_allclose(batch[i].spectrogram, spec.spectrogram, atol=1e-4)
+        np.testing.assert_array_equal(batch[i].times, spec.times)
+        np.testing.assert_array_equal(batch[i].frequencies, spec.frequencies)
+
+
+def test_spectrogram_batch_raises_on_1d_samples():
+    with pytest.raises(TypeError):
+        SpectrogramBatch.from_samples(np.zeros(1000), 22050)
+
+
+def test_spectrogram_decibel_limits():
+    audio = Audio(np.random.normal(0, 1, 22050), 22050)
+    spec = Spectrogram.from_audio(audio, decibel_limits=(-50, -30))
+    assert spec.spectrogram.min() >= -50
+    assert spec.spectrogram.max() <= -30
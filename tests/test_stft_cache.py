@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+from opensoundscape.audio import Audio
+from opensoundscape.spectrogram import Spectrogram
+from opensoundscape.melspectrogram import MelSpectrogram
+from opensoundscape import stft_cache
+import pytest
+import numpy as np
+from scipy import signal
+
+
+@pytest.fixture()
+def empty_cache(request):
+    stft_cache.clear_cache()
+    request.addfinalizer(stft_cache.clear_cache)
+
+
+def test_get_window_matches_scipy(empty_cache):
+    np.testing.assert_array_equal(
+        stft_cache.get_window("hann", 512), signal.get_window("hann", 512)
+    )
+
+
+def test_get_window_passes_arrays_through(empty_cache):
+    window = np.ones(10)
+    assert stft_cache.get_window(window, 10) is window
+
+
+def test_cached_arrays_are_read_only(empty_cache):
+    with pytest.raises(ValueError):
+        stft_cache.get_window("hann", 512)[0] = 1
+    with pytest.raises(ValueError):
+        stft_cache.get_frequencies(22050, 512)[0] = 1
+
+
+def test_spectrogram_uses_cache(empty_cache):
+    audio = Audio(np.random.uniform(-1, 1, 22050), 22050)
+    for _ in range(3):
+        Spectrogram.from_audio(audio)
+    info = stft_cache.cache_info()
+    assert info["window"].misses == 1
+    assert info["window"].hits == 2
+    assert info["frequencies"].hits == 2
+
+
+def test_melspectrogram_uses_cache(empty_cache):
+    audio = Audio(np.random.uniform(-1, 1, 22050), 22050)
+    for _ in range(3):
+        MelSpectrogram.from_audio(audio)
+    info = stft_cache.cache_info()
+    assert info["mel_filterbank"].misses == 1
+    assert info["mel_filterbank"].hits == 2
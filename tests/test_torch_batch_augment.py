@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+from opensoundscape.torch.batch_augment import BatchAugment
+from opensoundscape.datasets import SingleTargetAudioDataset
+import pytest
+import torch
+import pandas as pd
+
+
+@pytest.fixture()
+def batch():
+    generator = torch.Generator().manual_seed(0)
+    X = torch.rand(6, 1, 16, 20, generator=generator)
+    labels = torch.tensor([0, 1, 0, 1, 0, 2])
+    return X, labels
+
+
+def test_eval_only_normalizes(batch):
+    X, labels = batch
+    augment = BatchAugment(max_overlay_num=1, overlay_prob=1, add_noise=True)
+    augment.eval()
+    out = augment(X, labels)
+    assert out.shape == (6, 3, 16, 20)
+    assert torch.allclose(out[:, 1], (X[:, 0] - 0.5) / 0.5)
+
+
+def test_overlay_blends_samples_with_different_labels(batch):
+    X, labels = batch
+    X = labels.view(-1, 1, 1, 1).float().expand(-1, 1, 16, 20) / 2
+    augment = BatchAugment(max_overlay_num=1, overlay_prob=1, overlay_weight=0.5)
+    torch.manual_seed(0)
+    out = augment.overlay(X, labels)
+    # each sample is the mean of itself and a constant sample of another label
+    for i in range(len(labels)):
+        partner = out[i, 0, 0, 0] * 2 - X[i, 0, 0, 0]
+        assert torch.allclose(out[i], out[i, 0, 0, 0].expand(1, 16, 20), atol=1e-6)
+        assert not torch.isclose(partner, X[i, 0, 0, 0])
+
+
+def test_overlay_skips_samples_without_partners():
+    X = torch.rand(3, 1, 8, 8)
+    augment = BatchAugment(max_overlay_num=2, overlay_prob=1)
+    out = augment.overlay(X, torch.tensor([1, 1, 1]))
+    assert torch.equal(out, X)
+
+
+def test_noise_keeps_values_in_range(batch):
+    X, _ = batch
+    out = BatchAugment(add_noise=True).noise(X)
+    assert out.shape == X.shape
+    assert (out >= 0).all() and (out <= 1).all()
+
+
+def test_split_time_rotates_samples(batch):
+    X, _ = batch
+    out = BatchAugment(time_split=True).split_time(X)
+    for i in range(len(X)):
+        # a rotation in time of the original sample
+        matches = [
+            torch.equal(out[i], torch.roll(X[i], -shift, dims=-1))
+            for shift in range(X.shape[-1])
+        ]
+        assert any(matches)
+
+
+def test_dataset_with_batch_augment():
+    df = pd.DataFrame(
+        {"Destination": ["tests/great_plains_toad.wav"], "NumericLabels": [1]}
+    )
+    dataset = SingleTargetAudioDataset(
+        df,
+        label_dict=None,
+        label_column="NumericLabels",
+        height=32,
+        width=48,
+        batch_augment=True,
+    )
+    item = dataset[0]
+    assert item["X"].shape == (1, 32, 48)
+    assert (item["X"] >= 0).all() and (item["X"] <= 1).all()
+    out = BatchAugment()(item["X"][None], item["y"])
+    assert out.shape == (1, 3, 32, 48)
@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+from opensoundscape.torch.export import (
+    export_model,
+    load_checkpoint_model,
+    load_exported_model,
+)
+from opensoundscape.torch.predict import predict
+from opensoundscape.datasets import SplitAudioDataset
+import pytest
+import numpy as np
+import torch
+import yaml
+from pathlib import Path
+from torchvision.models import resnet18
+
+
+@pytest.fixture()
+def checkpoint(request):
+    path = Path("tests/_tmp_epoch-0.tar")
+    torch.manual_seed(0)
+    model = resnet18(pretrained=False)
+    model.fc = torch.nn.Linear(in_features=model.fc.in_features, out_features=2)
+    torch.save(
+        {
+            "model_state_dict": model.state_dict(),
+            "labels_yaml": yaml.dump({0: "absent", 1: "present"}),
+        },
+        path,
+    )
+
+    def fin():
+        path.unlink()
+
+    request.addfinalizer(fin)
+    return path
+
+
+@pytest.fixture()
+def exported_path(request):
+    paths = []
+
+    def make(suffix):
+        path = Path(f"tests/_tmp_exported_model{suffix}")
+        paths.append(path)
+        return path
+
+    def fin():
+        for path in paths:
+            if path.exists():
+                path.unlink()
+
+    request.addfinalizer(fin)
+    return make
+
+
+def test_load_checkpoint_model(checkpoint):
+    model, label_dict = load_checkpoint_model(checkpoint)
+    assert label_dict == {0: "absent", 1: "present"}
+    assert model.fc.out_features == 2
+
+
+def test_export_torchscript(checkpoint, exported_path):
+    path = exported_path(".pt")
+    export_model(checkpoint, path, height=64, width=64)
+    exported, metadata = load_exported_model(path)
+    assert metadata["height"] == 64
+    assert metadata["mean"] == [0.5, 0.5, 0.5]
+    assert metadata["label_dict"] == {0: "absent", 1: "present"}
+    assert metadata["frozen"] == hasattr(torch.jit, "freeze")
+
+    model, _ = load_checkpoint_model(checkpoint)
+    X = torch.rand(3, 3, 64, 64)
+    with torch.no_grad():
+        assert torch.allclose(exported(X), model(X), atol=1e-4)
+
+
+def test_export_torchscript_without_freeze_warns(
+    checkpoint, exported_path, monkeypatch
+):
+    monkeypatch.delattr(torch.jit, "freeze", raising=False)
+    path = exported_path(".pt")
+    with pytest.warns(UserWarning):
+        export_model(checkpoint, path, height=64, width=64)
+    _, metadata = load_exported_model(path)
+    assert not metadata["frozen"]
+
+
+def test_export_torchscript_quantized(checkpoint, exported_path):
+    path = exported_path(".pt")
+    export_model(checkpoint, path, quantize=True, height=64, width=64)
+    exported, metadata = load_exported_model(path)
+    assert metadata["quantized"]
+
+    model, _ = load_checkpoint_model(checkpoint)
+    X = torch.rand(3, 3, 64, 64)
+    with torch.no_grad():
+        assert torch.allclose(exported(X), model(X), atol=0.1)
+
+
+def test_export_raises_on_bad_format(checkpoint, exported_path):
+    with pytest.raises(ValueError):
+        export_model(checkpoint, exported_path(".pt"), format="tflite")
+
+
+def test_predict_from_exported_model(checkpoint, exported_path):
+    path = exported_path(".pt")
+    export_model(checkpoint, path, height=32, width=32)
+    dataset = SplitAudioDataset(
+        ["tests/silence_10s.mp3"], clip_duration=5, height=32, width=32
+    )
+    pred_df = predict(path, dataset, num_workers=0)
+    assert list(pred_df.columns) == ["absent", "present"]
+
+    model, _ = load_checkpoint_model(checkpoint)
+    expected = predict(model, dataset, num_workers=0)
+    assert np.allclose(pred_df.values, expected.values, atol=1e-4)
+
+
+def test_export_onnx(checkpoint, exported_path):
+    pytest.importorskip("onnx")
+    pytest.importorskip("onnxruntime")
+    path = exported_path(".onnx")
+    export_model(checkpoint, path, format="onnx", height=64, width=64)
+    exported, metadata = load_exported_model(path)
+    assert metadata["format"] == "onnx"
+
+    model, _ = load_checkpoint_model(checkpoint)
+    X = torch.rand(3, 3, 64, 64)
+    with torch.no_grad():
+        assert np.allclose(exported(X).numpy(), model(X).numpy(), atol=1e-4)
+
+
+def test_predict_module_does_not_import_torchvision():
+    import subprocess
+    import sys
+
+    code = (
+        "import sys; import opensoundscape.torch.predict; "
+        "assert 'torchvision' not in sys.modules"
+    )
+    subprocess.run([sys.executable, "-c", code], check=True)
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+from opensoundscape.torch.predict import predict, predict_parallel, shard
+from opensoundscape.datasets import SingleTargetAudioDataset, SplitAudioDataset
+import pytest
+import numpy as np
+import pandas as pd
+import torch
+from pathlib import Path
+
+
+@pytest.fixture()
+def prediction_dataset():
+    df = pd.DataFrame(
+        {"Destination": ["tests/veryshort.wav", "tests/silence_10s.mp3"] * 3}
+    )
+    return SingleTargetAudioDataset(df, label_dict=None, height=32, width=32)
+
+
+@pytest.fixture()
+def model():
+    torch.manual_seed(0)
+    return torch.nn.Sequential(
+        torch.nn.AdaptiveAvgPool2d(1), torch.nn.Flatten(), torch.nn.Linear(3, 2)
+    )
+
+
+@pytest.fixture()
+def predictions_csv(request):
+    path = Path("tests/_tmp_predictions.csv")
+
+    def fin():
+        path.unlink()
+
+    request.addfinalizer(fin)
+    return path
+
+
+def test_predict(prediction_dataset, model):
+    pred_df = predict(model, prediction_dataset, batch_size=4, num_workers=0)
+    assert pred_df.shape == (6, 2)
+    assert list(pred_df.index) == list(prediction_dataset.df["Destination"])
+
+    X = torch.stack([prediction_dataset[i]["X"] for i in range(6)])
+    with torch.no_grad():
+        expected = model(X).numpy()
+    assert np.allclose(pred_df.values, expected, atol=1e-6)
+
+
+def test_predict_ignores_unsupported_prefetch_factor(
+    prediction_dataset, model, monkeypatch
+):
+    import opensoundscape.torch.predict
+
+    expected = predict(model, prediction_dataset, batch_size=4, num_workers=0)
+    with pytest.warns(UserWarning):
+        pred_df = predict(
+            model, prediction_dataset, batch_size=4, num_workers=0, prefetch_factor=4
+        )
+    assert np.allclose(pred_df.values, expected.values)
+
+    monkeypatch.setattr(
+        opensoundscape.torch.predict,
+        "_dataloader_supports_prefetch_factor",
+        lambda: False,
+    )
+    with pytest.warns(UserWarning):
+        pred_df = predict(
+            model, prediction_dataset, batch_size=4, num_workers=1, prefetch_factor=4
+        )
+    assert np.allclose(pred_df.values, expected.values)
+
+
+def test_predict_softmax_and_labels(prediction_dataset, model):
+    pred_df = predict(
+        model,
+        prediction_dataset,
+        batch_size=4,
+        num_workers=0,
+        apply_softmax=True,
+        label_dict={0: "absent", 1: "present"},
+    )
+    assert list(pred_df.columns) == ["absent", "present"]
+    assert np.allclose(pred_df.sum(axis=1), 1)
+
+
+def test_predict_to_csv(prediction_dataset, model, predictions_csv):
+    pred_df = predict(
+        model,
+        prediction_dataset,
+        batch_size=4,
+        num_workers=2,
+        output_path=predictions_csv,
+    )
+    written = pd.read_csv(predictions_csv, index_col=0)
+    assert written.shape == (6, 2)
+    assert np.allclose(written.values, pred_df.values)
+
+
+def test_predict_split_audio_dataset(model, predictions_csv):
+    dataset = SplitAudioDataset(
+        ["tests/silence_10s.mp3", "tests/great_plains_toad.wav"],
+        clip_duration=2,
+        height=32,
+        width=32,
+    )
+    pred_df = predict(
+        model, dataset, batch_size=4, num_workers=0, output_path=predictions_csv
+    )
+    assert list(pred_df.index.names) == ["source", "begin_time", "end_time"]
+    assert pred_df.loc["tests/silence_10s.mp3"].shape == (5, 2)
+    assert list(pred_df.loc["tests/silence_10s.mp3"].index) == [
+        (0.0, 2.0),
+        (2.0, 4.0),
+        (4.0, 6.0),
+        (6.0, 8.0),
+        (8.0, 10.0),
+    ]
+
+    written = pd.read_csv(predictions_csv, index_col=[0, 1, 2])
+    assert np.allclose(written.values, pred_df.values)
+
+
+def test_shard():
+    items = list(range(10))
+    shards = [shard(items, k, 3) for k in range(3)]
+    assert [len(s) for s in shards] == [3, 3, 4]
+    assert sum(shards, []) == items
+    assert shard([1], 1, 2) == [1]
+    assert shard([1], 0, 2) == []
+
+
+def test_shard_raises_on_bad_index():
+    with pytest.raises(ValueError):
+        shard([1, 2], 2, 2)
+
+
+def test_predict_parallel_matches_predict(model):
+    files = ["tests/silence_10s.mp3", "tests/great_plains_toad.wav"] * 2
+    dataset_kwargs = {"clip_duration": 2, "height": 32, "width": 32}
+    expected = predict(model, SplitAudioDataset(files, **dataset_kwargs), num_workers=0)
+    pred_df = predict_parallel(
+        model, files, num_processes=3, batch_size=4, **dataset_kwargs
+    )
+    assert pred_df.index.equals(expected.index)
+    assert np.allclose(pred_df.values, expected.values, atol=1e-6)
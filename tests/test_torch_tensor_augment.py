@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+import opensoundscape.torch.tensor_augment as tensaug
+import pytest
+import torch
+
+
+@pytest.fixture()
+def spec():
+    generator = torch.Generator().manual_seed(0)
+    return torch.rand(8, 1, 20, 30, generator=generator)
+
+
+def test_random_masks_bounds():
+    masks = tensaug.random_masks(16, 30, 5, 3, torch.Generator().manual_seed(0))
+    assert masks.dtype == torch.bool
+    assert 1 <= masks.shape[0] <= 3
+    assert masks.shape[1:] == (16, 30)
+    assert (masks.sum(dim=2) <= 5).all()
+
+
+def test_masks_are_reproducible_with_generator(spec):
+    a = tensaug.time_mask(spec, T=10, generator=torch.Generator().manual_seed(1))
+    b = tensaug.time_mask(spec, T=10, generator=torch.Generator().manual_seed(1))
+    assert torch.equal(a, b)
+
+
+def test_freq_mask_replaces_rows_with_zero(spec):
+    masked = tensaug.freq_mask(spec, F=10, max_masks=1, replace_with_zero=True)
+    changed = (masked != spec).any(dim=3)
+    # whole rows are masked, and only with zeros
+    assert torch.equal(changed, (masked == 0).all(dim=3))
+
+
+def test_time_mask_uses_sample_mean(spec):
+    masked = tensaug.time_mask(spec, T=10, max_masks=1)
+    for sample, original in zip(masked, spec):
+        changed = (sample != original).any(dim=1)[0]
+        assert torch.allclose(sample[..., changed], original.mean())
+
+
+def test_mask_inplace(spec):
+    copy = spec.clone()
+    generator = torch.Generator().manual_seed(2)
+    masked = tensaug.freq_mask(copy, F=10, inplace=True, generator=generator)
+    assert masked is copy
+    generator = torch.Generator().manual_seed(2)
+    assert torch.equal(masked, tensaug.freq_mask(spec, F=10, generator=generator))
+
+
+def test_time_warp_shape(spec):
+    warped = tensaug.time_warp(spec, W=5, generator=torch.Generator().manual_seed(0))
+    assert warped.shape == spec.shape
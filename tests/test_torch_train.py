@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+from opensoundscape.torch.train import train
+import pytest
+import torch
+from pathlib import Path
+import shutil
+
+
+class RandomImageDataset(torch.utils.data.Dataset):
+    def __init__(self, n=8):
+        generator = torch.Generator().manual_seed(0)
+        self.X = torch.rand(n, 3, 32, 32, generator=generator)
+        self.y = torch.arange(n).remainder(2).unsqueeze(1)
+        self.label_dict = {0: "absent", 1: "present"}
+
+    def __len__(self):
+        return len(self.X)
+
+    def __getitem__(self, idx):
+        return {"X": self.X[idx], "y": self.y[idx]}
+
+
+@pytest.fixture()
+def save_dir(request):
+    path = Path("tests/_tmp_train")
+    path.mkdir(exist_ok=True)
+
+    def fin():
+        shutil.rmtree(path)
+
+    request.addfinalizer(fin)
+    return path
+
+
+def small_model():
+    torch.manual_seed(0)
+    return torch.nn.Sequential(
+        torch.nn.Conv2d(3, 4, 3),
+        torch.nn.AdaptiveAvgPool2d(1),
+        torch.nn.Flatten(),
+        torch.nn.Linear(4, 2),
+    )
+
+
+def train_small_model(save_dir, batch_size, **kwargs):
+    model = small_model()
+    train(
+        save_dir,
+        model,
+        RandomImageDataset(),
+        RandomImageDataset(),
+        torch.optim.SGD(model.parameters(), lr=0.1),
+        torch.nn.CrossEntropyLoss(),
+        epochs=1,
+        batch_size=batch_size,
+        print_logging=False,
+        **kwargs,
+    )
+    return model
+
+
+def test_train_writes_epoch(save_dir):
+    train_small_model(save_dir, batch_size=4)
+    assert (save_dir / "epoch-0.tar").exists()
+    assert (save_dir / "metadata.txt").exists()
+
+
+def test_train_gradient_accumulation_matches_larger_batch(save_dir):
+    large_batch = train_small_model(save_dir, batch_size=8)
+    accumulated = train_small_model(save_dir, batch_size=4, accumulation_steps=2)
+    for a, b in zip(large_batch.parameters(), accumulated.parameters()):
+        assert torch.allclose(a, b, atol=1e-6)
+
+
+def test_train_channels_last(save_dir):
+    model = train_small_model(save_dir, batch_size=4, channels_last=True)
+    assert model[0].weight.is_contiguous(memory_format=torch.channels_last)
+
+
+def test_train_with_batch_augment(save_dir):
+    from opensoundscape.torch.batch_augment import BatchAugment
+
+    class OneChannelDataset(RandomImageDataset):
+        batch_augment = True
+
+        def __getitem__(self, idx):
+            return {"X": self.X[idx, :1], "y": self.y[idx]}
+
+    model = small_model()
+    train(
+        save_dir,
+        model,
+        OneChannelDataset(),
+        OneChannelDataset(),
+        torch.optim.SGD(model.parameters(), lr=0.1),
+        torch.nn.CrossEntropyLoss(),
+        epochs=1,
+        batch_size=4,
+        print_logging=False,
+        batch_augment=BatchAugment(max_overlay_num=1, overlay_prob=1, add_noise=True),
+    )
+    assert (save_dir / "epoch-0.tar").exists()